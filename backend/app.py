@@ -3,7 +3,6 @@ from config import Config
 from extensions import db, login_manager, bcrypt, migrate
 from routes.auth_routes import auth_bp
 from routes.dashboard_routes import dashboard_bp
-from models.user import User
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -18,9 +17,9 @@ def create_app(config_class=Config):
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'info'
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return db.session.get(User, int(user_id))
+    # current_user from a per-worker cache (see services/user_cache.py)
+    from services.user_cache import register_user_cache
+    register_user_cache(app, login_manager)
 
     # Register Blueprints
     app.register_blueprint(auth_bp)
@@ -35,6 +34,8 @@ def create_app(config_class=Config):
     app.register_blueprint(inventory_bp)
     from routes.audit_routes import audit_bp
     app.register_blueprint(audit_bp)
+    from routes.data_routes import data_bp
+    app.register_blueprint(data_bp)
 
     # Register Audit Listeners
     # Move import inside to avoid circular deps if any, or top level if clean
@@ -42,6 +43,53 @@ def create_app(config_class=Config):
     with app.app_context():
         register_audit_listeners()
 
+    # Incrementally maintained dashboard counters
+    from services.metrics_service import register_metrics_listeners, seed_metrics
+    with app.app_context():
+        register_metrics_listeners()
+        seed_metrics()
+
+    # Per-view SQL statement budgets (see services/query_budget.py)
+    from services.query_budget import register_query_budget
+    register_query_budget(app)
+
+    # Server-Timing header and the admin perf page (see services/request_timing.py)
+    from services.request_timing import register_request_timing
+    register_request_timing(app)
+
+    # Per-statement SQL stats and slow-query plans (see services/query_stats.py)
+    from services.query_stats import register_query_stats
+    register_query_stats(app)
+
+    # Inventory facet counts
+    from services.facet_service import register_facet_listeners
+    with app.app_context():
+        register_facet_listeners()
+
+    # Inventory.quantity as the sum of per-colour stock
+    from services.color_stock_service import register_color_stock_listeners
+    register_color_stock_listeners()
+
+    # Prescription OCR: where the model lives, and the background job pool
+    from services.ocr_service import configure as configure_ocr
+    configure_ocr(app)
+    from services.ocr_cache import configure as configure_ocr_cache
+    configure_ocr_cache(app)
+    from services.ocr_jobs import init_ocr_jobs
+    init_ocr_jobs(app)
+
+    # Content-addressed prescription image store
+    from services.image_store import configure as configure_image_store
+    configure_image_store(app)
+
+    # Password hashing pool and bcrypt cost
+    from services.password_hashing import configure as configure_password_hashing
+    configure_password_hashing(app)
+
+    # CLI commands (flask rebuild-metrics, ...)
+    from commands import register_commands
+    register_commands(app)
+
     # 5. Ensure DB session cleanup on teardown
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -0,0 +1,385 @@
+import click
+from extensions import db
+
+
+def register_commands(app):
+
+    @app.cli.command('rebuild-metrics')
+    def rebuild_metrics_command():
+        """Recompute dashboard counters from the source tables (fixes drift)."""
+        from services.metrics_service import rebuild_metrics
+        drift = rebuild_metrics()
+        if not drift:
+            click.echo('Dashboard metrics are in sync.')
+            return
+        for name, (stored, actual) in drift.items():
+            click.echo(f'{name}: {stored} -> {actual}')
+        click.echo(f'Rebuilt {len(drift)} drifted metric(s).')
+
+    @app.cli.command('check-query-budgets')
+    def check_query_budgets_command():
+        """Render every budgeted page against the current DB and fail if any goes over its query budget."""
+        from flask import g
+        from models.user import User
+        from models.customer import Customer
+        from models.order import Order
+        from models.prescription import Prescription
+
+        admin = User.query.filter_by(role='admin').first()
+        if admin is None:
+            raise click.ClickException('Need at least one admin user to log in with.')
+
+        # Use the most recent rows so pages actually have relationships to load
+        customer = Customer.query.order_by(Customer.id.desc()).first()
+        order = Order.query.order_by(Order.id.desc()).first()
+        prescription = Prescription.query.order_by(Prescription.id.desc()).first()
+
+        urls = ['/dashboard', '/orders/', '/customers/', '/inventory/', '/inventory/reorder', '/audit/', '/users']
+        if customer:
+            urls.append(f'/prescriptions/history/{customer.id}')
+        if order:
+            urls.append(f'/orders/{order.id}')
+        if prescription:
+            urls.append(f'/prescriptions/view/{prescription.id}')
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+            sess['_fresh'] = True
+
+        failures = 0
+        for url in urls:
+            # Fresh app context per request: new session and no cached login user
+            with app.app_context():
+                response = client.get(url)
+                count = g.get('query_count', 0)
+            view = app.view_functions.get(app.url_map.bind('').match(url)[0])
+            limit = getattr(view, 'query_budget', None)
+            ok = response.status_code == 200 and (limit is None or count <= limit)
+            failures += not ok
+            click.echo(f"{'OK  ' if ok else 'FAIL'} {url:<32} {count} queries (budget {limit}) [{response.status_code}]")
+
+        if failures:
+            raise click.ClickException(f'{failures} route(s) over budget or failing.')
+
+    @app.cli.command('compact-audit-logs')
+    @click.option('--batch-size', default=5000, show_default=True)
+    def compact_audit_logs_command(batch_size):
+        """Fold legacy one-row-per-field UPDATE audit logs into changeset rows."""
+        from services.audit_service import compact_legacy_logs
+        written, removed = compact_legacy_logs(batch_size=batch_size)
+        click.echo(f'Wrote {written} changeset row(s), removed {removed} legacy row(s).')
+
+    @app.cli.command('partition-audit-logs')
+    def partition_audit_logs_command():
+        """Convert audit_logs into a monthly-partitioned table (PostgreSQL only)."""
+        from services.audit_retention import convert_to_partitioned, ensure_partitions
+        if db.engine.dialect.name != 'postgresql':
+            raise click.ClickException('Native partitioning needs PostgreSQL; SQLite archives by timestamp range.')
+        if convert_to_partitioned():
+            click.echo('audit_logs is now partitioned by month.')
+        else:
+            created = ensure_partitions()
+            click.echo(f"Already partitioned. Created: {', '.join(created) or 'nothing'}")
+
+    @app.cli.command('archive-audit-logs')
+    @click.option('--months', type=int, default=None, help='Months to keep (default AUDIT_RETENTION_MONTHS).')
+    def archive_audit_logs_command(months):
+        """Move audit logs older than the retention window into gzipped JSONL archives."""
+        from services.audit_retention import run_retention
+        archived = run_retention(months)
+        for month, path, count in archived:
+            click.echo(f'{month:%Y-%m}: {count} row(s) -> {path}')
+        click.echo(f'Archived {len(archived)} month(s).')
+
+    @app.cli.command('setup-customer-search')
+    def setup_customer_search_command():
+        """Create the customer search indexes (pg_trgm / FTS5) and backfill phone_normalized."""
+        from services.customer_search import setup_search_indexes
+        backfilled = setup_search_indexes()
+        click.echo(f'Customer search ready on {db.engine.dialect.name} ({backfilled} phone(s) normalised).')
+
+    @app.cli.command('rebuild-inventory-facets')
+    def rebuild_inventory_facets_command():
+        """Recompute inventory facet counts (brand / type / branch / price band)."""
+        from services.facet_service import rebuild_facets
+        combos = rebuild_facets()
+        click.echo(f'Rebuilt inventory facets: {combos} combination(s).')
+
+    @app.cli.command('migrate-color-stock')
+    @click.option('--batch-size', default=200, show_default=True)
+    def migrate_color_stock_command(batch_size):
+        """Move the free-text color_stock field into per-colour inventory_colors rows."""
+        from services.color_stock_service import migrate_color_stock
+        migrated, adjusted, failed = migrate_color_stock(batch_size=batch_size)
+        for item_id, model_name, before, after in adjusted:
+            click.echo(f'#{item_id} {model_name}: quantity {before} -> {after} (sum of colours)')
+        for item_id, model_name, error in failed:
+            click.echo(f'#{item_id} {model_name}: skipped, {error}', err=True)
+        click.echo(f'Migrated {migrated} item(s); {len(adjusted)} quantity change(s), {len(failed)} left to fix by hand.')
+
+    @app.cli.command('refresh-low-stock')
+    def refresh_low_stock_command():
+        """Recompute the stored inventory.is_low_stock flag from quantity and threshold."""
+        from services.reorder_service import refresh_low_stock_flags
+        changed = refresh_low_stock_flags()
+        click.echo(f'Updated is_low_stock on {changed} item(s).')
+        if changed:
+            click.echo('Run `flask rebuild-metrics` to bring the low-stock counter in line.')
+
+    @app.cli.command('stock-load-test')
+    @click.option('--mode', type=click.Choice(['atomic', 'optimistic', 'naive']), default='atomic', show_default=True)
+    @click.option('--workers', default=8, show_default=True)
+    @click.option('--sales', default=25, show_default=True, help='Sale attempts per worker.')
+    @click.option('--stock', default=100, show_default=True, help='Starting quantity of the test item.')
+    def stock_load_test_command(mode, workers, sales, stock):
+        """Sell one throwaway item from parallel workers and check no stock update was lost."""
+        from services.stock_load_test import run_stock_load_test
+        result = run_stock_load_test(app, mode=mode, workers=workers, sales=sales, stock=stock)
+        click.echo(f"{result['mode']}: {workers} workers x {sales} sales in {result['seconds']}s")
+        click.echo(f"  sold {result['sold']} in {result['sales_ok']} sale(s), "
+                   f"{result['out_of_stock']} out of stock, {result['errors']} gave up after retries")
+        click.echo(f"  stock left {result['final']}, expected {result['expected']}")
+        if not result['ok']:
+            raise click.ClickException(f"Lost updates: {result['final'] - result['expected']} unit(s) unaccounted for.")
+        click.echo('OK: no lost updates.')
+
+    @app.cli.command('import-data')
+    @click.argument('entity', type=click.Choice(['customers', 'inventory', 'orders']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=1000, show_default=True)
+    def import_data_command(entity, path, batch_size):
+        """Bulk import customers, inventory or orders from a CSV or XLSX file."""
+        from services.bulk_io import import_rows, read_rows
+        with open(path, 'rb') as f:
+            try:
+                result = import_rows(entity, read_rows(f, path), batch_size=batch_size)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        for line_no, message in result['errors']:
+            click.echo(f'line {line_no}: {message}', err=True)
+        click.echo(f"Imported {result['imported']} {entity} in {result['batches']} batch(es), "
+                   f"{result['rejected']} row(s) rejected.")
+
+    @app.cli.command('ocr-server')
+    def ocr_server_command():
+        """Run the dedicated OCR process used when OCR_MODE=service (loads the model once)."""
+        from services.ocr_service import run_ocr_server, settings
+        click.echo(f"Loading OCR model, then listening on {settings['socket']} ...")
+        try:
+            run_ocr_server(ready=lambda: click.echo('OCR server ready.'))
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('ocr-model-report')
+    @click.option('--mode', 'modes', multiple=True, type=click.Choice(['lazy', 'preload', 'service']),
+                  help='Only these modes (default: all).')
+    def ocr_model_report_command(modes):
+        """Compare worker startup time and memory across the OCR_MODE options."""
+        from services.ocr_report import ocr_model_report
+        report = ocr_model_report(modes or ('lazy', 'preload', 'service'))
+        for mode, result in report.items():
+            click.echo(f'{mode}:')
+            for key, value in result.items():
+                if isinstance(value, dict):
+                    value = ', '.join(f'{k}={v}' for k, v in value.items())
+                click.echo(f'  {key}: {value}')
+
+    @app.cli.command('clear-ocr-cache')
+    def clear_ocr_cache_command():
+        """Drop every cached OCR result (workers' in-memory caches empty on restart)."""
+        from services.ocr_cache import clear
+        removed = clear()
+        db.session.commit()
+        click.echo(f'Removed {removed} cached OCR result(s).')
+
+    @app.cli.command('ocr-benchmark')
+    @click.argument('sample_dir', type=click.Path(exists=True, file_okay=False))
+    @click.option('--repeat', default=1, show_default=True, help='OCR passes per image.')
+    def ocr_benchmark_command(sample_dir, repeat):
+        """Latency and extraction accuracy of the old vs new OCR preprocessing over a folder of scans."""
+        from services.ocr_service import OCR_AVAILABLE
+        if not OCR_AVAILABLE:
+            raise click.ClickException('easyocr / opencv are not installed.')
+        from services.ocr_benchmark import run_ocr_benchmark
+        try:
+            report = run_ocr_benchmark(sample_dir, repeat=repeat)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for name, result in report.items():
+            click.echo(f"{name}: {result['images']} image(s), {result['failed']} unreadable")
+            for key in ('preprocess_ms', 'ocr_ms', 'total_ms'):
+                if result[key]:
+                    click.echo(f"  {key:<14} " + '  '.join(f'{k} {v}' for k, v in result[key].items()))
+            if result['fields_total']:
+                share = 100 * result['fields_correct'] / result['fields_total']
+                click.echo(f"  accuracy       {result['fields_correct']}/{result['fields_total']} fields ({share:.0f}%)")
+
+    @app.cli.command('cleanup-prescription-images')
+    @click.option('--grace-hours', default=1, show_default=True, help='Keep files newer than this (uploads still being saved).')
+    @click.option('--dry-run', is_flag=True, help='List orphans without deleting them.')
+    def cleanup_prescription_images_command(grace_hours, dry_run):
+        """Delete stored prescription images no prescription points at."""
+        from models.prescription import Prescription
+        from services.image_store import cleanup_orphans
+        referenced = {h for (h,) in db.session.query(Prescription.image_hash).filter(Prescription.image_hash.isnot(None)).distinct()}
+        orphans = cleanup_orphans(referenced, grace_seconds=grace_hours * 3600, dry_run=dry_run)
+        for digest in orphans:
+            click.echo(digest)
+        click.echo(f"{'Would remove' if dry_run else 'Removed'} {len(orphans)} orphaned image(s).")
+
+    @app.cli.command('migrate-prescription-images')
+    def migrate_prescription_images_command():
+        """Move images saved under static/uploads into the content-addressed store."""
+        import os
+        from models.prescription import Prescription
+        from services.image_store import save_image
+        moved, missing, old_files = 0, 0, []
+        for rx in Prescription.query.filter(Prescription.image_path.isnot(None), Prescription.image_hash.is_(None)):
+            path = rx.image_path.replace('backend/', '', 1) if rx.image_path.startswith('backend/') else rx.image_path
+            if not os.path.exists(path):
+                missing += 1
+                click.echo(f'#{rx.id}: {rx.image_path} not found, left as is', err=True)
+                continue
+            with open(path, 'rb') as f:
+                rx.image_hash = save_image(f.read())
+            rx.image_path = None
+            old_files.append(path)
+            moved += 1
+        db.session.commit()
+        for path in set(old_files):
+            if os.path.exists(path):
+                os.remove(path)
+        click.echo(f'Moved {moved} image(s) into the store; {missing} file(s) missing.')
+
+    @app.cli.command('seed-synthetic')
+    @click.option('--scale', default=1.0, show_default=True, help='Multiplies every default volume (0.01 for a quick run).')
+    @click.option('--customers', type=int, help='Default 100,000 x scale.')
+    @click.option('--prescriptions', type=int, help='Default 300,000 x scale.')
+    @click.option('--inventory', type=int, help='Default 2,000 x scale.')
+    @click.option('--orders', type=int, help='Default 500,000 x scale.')
+    @click.option('--audit-logs', type=int, help='Default 2,000,000 x scale.')
+    @click.option('--seed', default=42, show_default=True)
+    @click.option('--batch-size', default=5000, show_default=True)
+    def seed_synthetic_command(scale, seed, batch_size, **counts):
+        """Fill the database with production-sized synthetic data for benchmarking."""
+        import time
+        from services.synthetic_data import DEFAULT_VOLUMES, seed_synthetic
+        volumes = {name: counts[name] if counts[name] is not None else int(default * scale)
+                   for name, default in DEFAULT_VOLUMES.items()}
+        click.echo('Seeding ' + ', '.join(f'{n:,} {name}' for name, n in volumes.items()))
+        started = time.perf_counter()
+        shown = {}
+
+        def progress(name, done):
+            # One line per table every ~10%
+            total = volumes.get(name) or done
+            if done >= total or done - shown.get(name, 0) >= max(total // 10, 1):
+                shown[name] = done
+                click.echo(f'  {name}: {done:,}')
+
+        inserted = seed_synthetic(volumes, seed=seed, batch_size=batch_size, progress=progress)
+        click.echo(f'Inserted {sum(inserted.values()):,} row(s) in {time.perf_counter() - started:.0f}s: '
+                   + ', '.join(f'{n:,} {name}' for name, n in inserted.items()))
+
+    @app.cli.command('benchmark')
+    @click.option('--requests', default=50, show_default=True, help='Timed requests per scenario.')
+    @click.option('--concurrency', default=1, show_default=True, help='Parallel clients.')
+    @click.option('--only', multiple=True, help='Scenario name(s) to run (default: all).')
+    @click.option('--out', default=None, help='Results directory (default: instance/benchmarks).')
+    @click.option('--compare', 'baseline', default=None, help="Results file to compare p95s with, or 'last'.")
+    @click.option('--sql-stats', type=click.Path(dir_okay=False, writable=True),
+                  help='Also write per-statement SQL stats of the run to this JSON file.')
+    def benchmark_command(requests, concurrency, only, out, baseline, sql_stats):
+        """Time every page and count its queries; saves the run and compares it with an earlier one."""
+        import os
+        from services.benchmark import SCENARIOS, compare, latest_results, run_benchmark, save_results
+        unknown = set(only) - set(SCENARIOS)
+        if unknown:
+            raise click.ClickException(f"Unknown scenario(s): {', '.join(sorted(unknown))}. "
+                                       f"Choose from: {', '.join(SCENARIOS)}")
+        out = out or os.path.join(app.instance_path, 'benchmarks')
+        if sql_stats:
+            from services import query_stats
+            # Seeded data, so the file can keep bind values for index-advisor
+            query_stats.settings['parameters'] = True
+        try:
+            results = run_benchmark(app, requests=requests, concurrency=concurrency, only=only)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        meta = results['meta']
+        click.echo(f"{meta['dialect']} @ {meta['commit'] or 'unknown commit'}, "
+                   + ', '.join(f'{n:,} {table}' for table, n in meta['rows'].items()))
+        click.echo(f"{'scenario':<26}{'p50':>8}{'p95':>8}{'p99':>8}{'mean':>8}{'queries':>9}{'errors':>8}{'req/s':>8}")
+        for name, r in results['scenarios'].items():
+            click.echo(f"{name:<26}{r['p50_ms']:>8}{r['p95_ms']:>8}{r['p99_ms']:>8}{r['mean_ms']:>8}"
+                       f"{r['queries']:>9}{r['errors']:>8}{r['rps']:>8}")
+        click.echo(f"Throughput {results['throughput_rps']} req/s overall (latencies in ms)")
+
+        path = save_results(results, out)
+        click.echo(f'Saved {path}')
+        if baseline == 'last':
+            baseline = latest_results(out, exclude=path)
+            if baseline is None:
+                click.echo('No earlier run to compare with.')
+        if baseline:
+            click.echo(f'p95 vs {baseline}:')
+            for name, (before, after, change) in compare(results, baseline).items():
+                click.echo(f'  {name:<26}{before:>8} -> {after:<8} {change:+.1f}%')
+        if sql_stats:
+            with open(sql_stats, 'w') as f:
+                query_stats.dump(f)
+            click.echo(f'SQL statement stats written to {sql_stats}')
+
+    @app.cli.command('backfill-sort-keys')
+    def backfill_sort_keys_command():
+        """Fill NULL list sort keys and store SQLite datetimes in one format (see services/pagination.py)."""
+        from services.pagination import backfill_sort_keys
+        changed = backfill_sort_keys()
+        for column, count in changed.items():
+            click.echo(f'{column}: {count} row(s)')
+        click.echo('Sort keys are consistent.' if not changed else f'Updated {len(changed)} column(s).')
+
+    @app.cli.command('create-indexes')
+    @click.option('--dry-run', is_flag=True, help='Print the CREATE INDEX statements without running them.')
+    def create_indexes_command(dry_run):
+        """Create the indexes the models declare but this database lacks (CONCURRENTLY on Postgres)."""
+        from services.index_advisor import create_missing_indexes
+        statements = create_missing_indexes(dry_run=dry_run)
+        for sql in statements:
+            click.echo(sql.strip() + ';')
+        click.echo(f"{'Would create' if dry_run else 'Created'} {len(statements)} index(es).")
+
+    @app.cli.command('index-advisor')
+    @click.argument('workload', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--repeat', default=3, show_default=True, help='Runs per statement (best one counts).')
+    @click.option('--min-gain', default=10, show_default=True, help='Smallest speed-up (%) worth reporting.')
+    @click.option('--plans', is_flag=True, help='Also print the current plan of every replayed statement.')
+    def index_advisor_command(workload, repeat, min_gain, plans):
+        """Replay a captured SQL workload and report which indexes would help and which go unused."""
+        from services.index_advisor import advise, load_workload
+        statements = load_workload(workload)
+        if not statements:
+            raise click.ClickException('No replayable SELECT statements (with parameters) in that file. '
+                                       'Capture it with `flask benchmark --sql-stats` or SQL_STATS_PARAMETERS=1.')
+        click.echo(f'Replaying {len(statements)} statement(s) on {db.engine.dialect.name} ...')
+        report = advise(statements, repeat=repeat, min_gain_pct=min_gain)
+
+        if plans:
+            for s in report['statements']:
+                click.echo(f"\n{s['ms']} ms x {s['calls']} call(s): {s['fingerprint'][:200]}")
+                for line in s['plan'] or []:
+                    click.echo(f'    {line}')
+
+        click.echo('\nIndexes that would help:' if report['helpful'] else '\nNo candidate index helped.')
+        for candidate in report['helpful']:
+            click.echo(f"  {candidate['name']} ON {candidate['table']} ({', '.join(candidate['columns'])}): "
+                       f"saves ~{candidate['saved_ms']} ms over the captured calls")
+            for s in candidate['statements']:
+                click.echo(f"    {s['before_ms']} -> {s['after_ms']} ms (-{s['gain_pct']}%)  {s['fingerprint'][:120]}")
+
+        click.echo('\nIndexes no replayed statement used:' if report['unused'] else '\nEvery index was used.')
+        for index in report['unused']:
+            scans = f", {index['scans']} scan(s) since stats reset" if index['scans'] is not None else ''
+            click.echo(f"  {index['name']} ON {index['table']} ({', '.join(index['columns'])}){scans}")
@@ -22,6 +22,79 @@ class Config:
         } if 'sqlite' not in SQLALCHEMY_DATABASE_URI else {}
     }
 
+    # Raise instead of logging when a view exceeds its @query_budget
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+
+    # Audit log writes: 'sync' = one multi-row INSERT at commit,
+    # 'background' = bounded queue drained by a writer thread after commit
+    AUDIT_WRITE_MODE = os.environ.get('AUDIT_WRITE_MODE', 'sync')
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+
+    # Audit retention: months kept in the database before `flask archive-audit-logs`
+    # moves them to gzipped JSONL files (default: instance/audit_archive)
+    AUDIT_RETENTION_MONTHS = int(os.environ.get('AUDIT_RETENTION_MONTHS', 12))
+    AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR')
+
+    # List page totals: 'approximate' (planner estimate / capped count), 'exact' or 'none'
+    PAGINATION_COUNT = os.environ.get('PAGINATION_COUNT', 'approximate')
+
+    # A colour of a frame counts as low stock at or below this many pieces
+    COLOR_LOW_STOCK_THRESHOLD = int(os.environ.get('COLOR_LOW_STOCK_THRESHOLD', 2))
+
+    # Reorder report: top low-stock items up to max(multiplier x threshold,
+    # units sold in the lookback window)
+    REORDER_TARGET_MULTIPLIER = int(os.environ.get('REORDER_TARGET_MULTIPLIER', 2))
+    REORDER_LOOKBACK_DAYS = int(os.environ.get('REORDER_LOOKBACK_DAYS', 30))
+
+    # Prescription OCR jobs: scans running at once / accepted (running + waiting)
+    # per gunicorn worker, CPU threads per scan, seconds a running job may take before it counts as lost
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 1))
+    OCR_MAX_PENDING = int(os.environ.get('OCR_MAX_PENDING', 4))
+    OCR_THREADS = int(os.environ.get('OCR_THREADS', 1))
+    OCR_JOB_TIMEOUT = int(os.environ.get('OCR_JOB_TIMEOUT', 300))
+    # Where the EasyOCR model is loaded: 'lazy', 'preload' or 'service' (see services/ocr_service.py)
+    OCR_MODE = os.environ.get('OCR_MODE', 'lazy')
+    OCR_SOCKET = os.environ.get('OCR_SOCKET', '/tmp/everest-ocr.sock')
+    # Images per batch scan, and the largest image accepted (MB) for scans and uploads
+    OCR_BATCH_MAX = int(os.environ.get('OCR_BATCH_MAX', 4))
+    OCR_MAX_IMAGE_MB = int(os.environ.get('OCR_MAX_IMAGE_MB', 15))
+    # OCR result cache: results kept in memory per worker, and MB of results kept in the database
+    OCR_CACHE_ENTRIES = int(os.environ.get('OCR_CACHE_ENTRIES', 256))
+    OCR_CACHE_MAX_MB = int(os.environ.get('OCR_CACHE_MAX_MB', 50))
+
+    # Content-addressed prescription images (originals + web/thumbnail copies)
+    PRESCRIPTION_IMAGE_DIR = os.environ.get('PRESCRIPTION_IMAGE_DIR', 'uploads/prescriptions')
+
+    # Per-request timings: Server-Timing header on admins' responses (off by
+    # default), and how many recent requests each worker keeps for the admin
+    # perf page
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', '0') == '1'
+    PERF_BUFFER_SIZE = int(os.environ.get('PERF_BUFFER_SIZE', 2000))
+
+    # In-process SQL statement stats (services/query_stats.py): statements at or
+    # over SLOW_QUERY_MS are logged and EXPLAINed; at most SQL_STATS_MAX fingerprints
+    SQL_STATS = os.environ.get('SQL_STATS', '1') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 100))
+    SQL_STATS_MAX = int(os.environ.get('SQL_STATS_MAX', 1000))
+    # Keep bind values for index-advisor replays (off: they hold hashes and OTPs)
+    SQL_STATS_PARAMETERS = os.environ.get('SQL_STATS_PARAMETERS', '0') == '1'
+
+    # Logged-in staff snapshots cached per worker (admins never are): seconds before
+    # a re-read (0 = off), max users, and seconds between checks of users.auth_version,
+    # which is how long a change can take to reach other workers
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_CHECK = int(os.environ.get('USER_CACHE_CHECK', 2))
+
+    # Password hashing (services/password_hashing.py): bcrypt cost for new hashes
+    # (older costs are rehashed at login), hashes running at once / accepted per
+    # gunicorn worker (keep the latter below GUNICORN_THREADS), and seconds a
+    # request waits for one
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None  # default: half the CPUs / workers
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 4))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
     # Resend Email API
     RESEND_API_KEY = os.environ.get('RESEND_API_KEY')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'Optical ERP <onboarding@resend.dev>')
@@ -2,8 +2,17 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
+from sqlalchemy.dialects import sqlite
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 migrate = Migrate()
+
+# DateTime for columns defaulting to now(). SQLite keeps datetimes as text and
+# CURRENT_TIMESTAMP writes 'YYYY-MM-DD HH:MM:SS', so the ORM writes the same
+# format there instead of its own '.ffffff' one: every value of a column then
+# compares and sorts as text (keyset pagination on the bare, indexed column
+# relies on it). Postgres keeps native timestamps.
+SQLITE_TIMESTAMP = '%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d'
+Timestamp = db.DateTime().with_variant(sqlite.DATETIME(storage_format=SQLITE_TIMESTAMP), 'sqlite')
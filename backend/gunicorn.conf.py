@@ -0,0 +1,23 @@
+import os
+
+# Read by gunicorn from the working directory (render.yaml: rootDir backend).
+#
+# Threaded workers: a request waiting on bcrypt, OCR or the database holds a
+# thread, not the whole worker, so other requests keep being served. The
+# worker count comes from WEB_CONCURRENCY (gunicorn's default, 1 if unset);
+# password hashing sizes its per-worker pool from the same variable so all
+# workers together stay within half the host's cores.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 120
+
+# With OCR_MODE=preload the app is imported once in the master and the OCR
+# model loaded there, so the workers forked from it share one copy.
+preload_app = os.environ.get('OCR_MODE') == 'preload'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before any worker is forked
+    if preload_app:
+        from services.ocr_service import preload_model
+        preload_model()
@@ -1,20 +1,50 @@
-from extensions import db
+from extensions import Timestamp, db
+from sqlalchemy.dialects.postgresql import JSONB
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        # Audit list filtered by table, newest first (keyset on timestamp, id)
+        db.Index('ix_audit_logs_table_timestamp', 'table_name', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     action = db.Column(db.String(10), nullable=False) # INSERT, UPDATE, DELETE
     table_name = db.Column(db.String(50), nullable=False)
     record_id = db.Column(db.Integer, nullable=False)
+    # Changeset: one row per INSERT/UPDATE/DELETE.
+    #   UPDATE -> {"field": [old, new], ...}
+    #   INSERT -> {"field": value, ...} (new record), DELETE -> same (removed record)
+    changes = db.Column(db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql'))
+    # Legacy one-row-per-field format (pre-changeset rows, see `flask compact-audit-logs`)
     field_name = db.Column(db.String(50))
     old_value = db.Column(db.Text)
     new_value = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, server_default=db.func.now())
+    timestamp = db.Column(Timestamp, nullable=False, server_default=db.func.now(), index=True)
 
     # Relationship
     user = db.relationship('User')
 
     def __repr__(self):
         return f'<AuditLog {self.action} {self.table_name}:{self.record_id}>'
+
+    @property
+    def field_changes(self):
+        """List of (field, old, new) for display, from either storage format."""
+        if self.changes is None:
+            if self.field_name:
+                return [(self.field_name, self.old_value, self.new_value)]
+            return [('-', self.old_value, self.new_value)]
+
+        if self.action == 'UPDATE':
+            return [(field, values[0], values[1]) for field, values in self.changes.items()]
+        if self.action == 'DELETE':
+            return [(field, value, None) for field, value in self.changes.items()]
+        return [(field, None, value) for field, value in self.changes.items()]
+
+    @property
+    def changed_fields(self):
+        if self.changes is None:
+            return [self.field_name] if self.field_name else []
+        return list(self.changes.keys()) if self.action == 'UPDATE' else []
@@ -1,14 +1,39 @@
-from extensions import db
+import re
+from sqlalchemy.orm import validates
+from extensions import Timestamp, db
+
+def normalize_phone(phone):
+    """
+    Digits only, without the +91 / 0 trunk prefix, so '+91 98765 43210',
+    '098765-43210' and '9876543210' all normalise to '9876543210'.
+    """
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        # Customer list: recently updated first (keyset on updated_at, id)
+        db.Index('ix_customers_updated', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     care_of = db.Column(db.String(100))
     phone = db.Column(db.String(20), nullable=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Search key kept in sync with `phone` (see normalize_phone)
+    phone_normalized = db.Column(db.String(20), index=True)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+
+    @validates('phone')
+    def _sync_phone_normalized(self, key, phone):
+        self.phone_normalized = normalize_phone(phone)
+        return phone
 
     def __repr__(self):
         return f'<Customer {self.name}>'
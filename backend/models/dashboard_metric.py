@@ -0,0 +1,12 @@
+from extensions import Timestamp, db
+
+class DashboardMetric(db.Model):
+    __tablename__ = 'dashboard_metrics'
+
+    # One row per counter (total_customers, total_orders, pending_orders, ...)
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
+
+    def __repr__(self):
+        return f'<DashboardMetric {self.name}={self.value}>'
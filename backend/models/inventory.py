@@ -1,27 +1,95 @@
-from extensions import db
+from decimal import Decimal
+from sqlalchemy import event
+from sqlalchemy.orm import validates
+from extensions import Timestamp, db
+from models.inventory_color import InventoryColor, format_color_stock
+
+# Selling-price bands used for inventory facets: (key, label, lower bound inclusive)
+PRICE_BANDS = [
+    ('0-999', 'Under Rs. 1,000', Decimal('0')),
+    ('1000-2499', 'Rs. 1,000 - 2,499', Decimal('1000')),
+    ('2500-4999', 'Rs. 2,500 - 4,999', Decimal('2500')),
+    ('5000+', 'Rs. 5,000 and above', Decimal('5000')),
+]
+
+def price_band_for(price):
+    if price is None:
+        return None
+    price = Decimal(str(price))
+    band = PRICE_BANDS[0][0]
+    for key, label, lower in PRICE_BANDS:
+        if price >= lower:
+            band = key
+    return band
+
+def is_low(quantity, threshold):
+    # Mirrors SQL `quantity <= low_stock_threshold` (NULL never counts)
+    return quantity is not None and threshold is not None and quantity <= threshold
 
 class Inventory(db.Model):
     __tablename__ = 'inventory'
 
     id = db.Column(db.Integer, primary_key=True)
-    model_name = db.Column(db.String(100), nullable=False)
-    brand = db.Column(db.String(50))
-    frame_type = db.Column(db.String(50))
-    quantity = db.Column(db.Integer, default=0)
-    location = db.Column(db.String(100), nullable=False) # Rack/Drawer/Shelf
-    shop_branch = db.Column(db.String(100))
+    model_name = db.Column(db.String(100), nullable=False, index=True)
+    brand = db.Column(db.String(50), index=True)
+    frame_type = db.Column(db.String(50), index=True)
+    # Sum of the colour rows when the item has any (see services.color_stock)
+    quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    location = db.Column(db.String(100), nullable=False, index=True) # Rack/Drawer/Shelf
+    shop_branch = db.Column(db.String(100), index=True)
     
     cost_price = db.Column(db.Numeric(10, 2), nullable=False)
     selling_price = db.Column(db.Numeric(10, 2), nullable=False)
+    # Facet key derived from selling_price (see PRICE_BANDS)
+    price_band = db.Column(db.String(20), index=True)
     low_stock_threshold = db.Column(db.Integer, default=5)
-    color_stock = db.Column(db.Text, nullable=True)  # e.g. "black-10, white-15, grey-5"
+    # Stored `quantity <= low_stock_threshold`, kept in sync by _sync_low_stock
+    # below; comparing two columns can't use an index, a flag can
+    is_low_stock = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Legacy free text ("black-10, white-15"); moved into inventory_colors by
+    # `flask migrate-color-stock`, only unparsed leftovers remain here
+    color_stock = db.Column(db.Text, nullable=True)
     
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
+    # Bumped by every write, including the SQL-side stock reservations, so an
+    # edit made from a stale form fails instead of overwriting newer stock
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+    colors = db.relationship('InventoryColor', back_populates='inventory', order_by=InventoryColor.color,
+                             cascade='all, delete-orphan')
+
+    @validates('selling_price')
+    def _sync_price_band(self, key, price):
+        self.price_band = price_band_for(price)
+        return price
 
     def __repr__(self):
         return f'<Inventory {self.model_name}>'
 
     @property
-    def is_low_stock(self):
-        return self.quantity <= self.low_stock_threshold
+    def color_stock_text(self):
+        # Editable "black-10, white-15" form of the colour rows
+        return format_color_stock(self.colors) or self.color_stock or ''
+
+# Partial index: only low-stock rows, so the count and the reorder report read
+# a handful of entries instead of scanning inventory
+db.Index('ix_inventory_low_stock', Inventory.brand, Inventory.shop_branch,
+         postgresql_where=Inventory.is_low_stock.is_(True),
+         sqlite_where=Inventory.is_low_stock.is_(True))
+
+def _value_or_default(target, key):
+    # Column defaults are only applied by the INSERT, after before_insert runs
+    value = getattr(target, key)
+    if value is None and Inventory.__table__.c[key].default is not None:
+        value = Inventory.__table__.c[key].default.arg
+    return value
+
+@event.listens_for(Inventory, 'before_insert')
+@event.listens_for(Inventory, 'before_update')
+def _sync_low_stock(mapper, connection, target):
+    low = is_low(_value_or_default(target, 'quantity'), _value_or_default(target, 'low_stock_threshold'))
+    if target.is_low_stock != low:
+        target.is_low_stock = low
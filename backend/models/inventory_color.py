@@ -0,0 +1,51 @@
+import re
+from sqlalchemy.orm import validates
+from extensions import db
+
+COLOR_ENTRY = re.compile(r'^(.+?)\s*[-:=]?\s*(\d+)$')
+
+def normalize_color(color):
+    return ' '.join((color or '').split()).lower()
+
+def parse_color_stock(text):
+    """
+    Parses the free-text colour stock format ("black-10, white-15, grey-5";
+    also "black: 10" or "black 10") into {color: qty}. Repeated colours are
+    added up. Raises ValueError naming the entry it can't read.
+    """
+    stock = {}
+    for entry in (text or '').replace(';', ',').replace('\n', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = COLOR_ENTRY.match(entry)
+        color = normalize_color(match.group(1)) if match else ''
+        if not color:
+            raise ValueError(f'Cannot read colour stock entry "{entry}" (expected e.g. black-10).')
+        stock[color] = stock.get(color, 0) + int(match.group(2))
+    return stock
+
+def format_color_stock(colors):
+    return ', '.join(f'{c.color}-{c.quantity}' for c in colors)
+
+class InventoryColor(db.Model):
+    __tablename__ = 'inventory_colors'
+    __table_args__ = (
+        db.UniqueConstraint('inventory_id', 'color', name='uq_inventory_colors_item_color'),
+        # "Which models have black in stock" / per-colour low stock
+        db.Index('ix_inventory_colors_color_quantity', 'color', 'quantity'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventory.id', ondelete='CASCADE'), nullable=False)
+    color = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    inventory = db.relationship('Inventory', back_populates='colors')
+
+    @validates('color')
+    def _normalize_color(self, key, color):
+        return normalize_color(color)
+
+    def __repr__(self):
+        return f'<InventoryColor {self.inventory_id} {self.color}={self.quantity}>'
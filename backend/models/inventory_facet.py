@@ -0,0 +1,16 @@
+from extensions import db
+
+class InventoryFacetCount(db.Model):
+    __tablename__ = 'inventory_facet_counts'
+
+    # Number of inventory rows per combination of facet values. A few hundred
+    # combinations stand in for the whole inventory table when counting facets.
+    # NULL facet values are stored as '' so they can be part of the key.
+    brand = db.Column(db.String(50), primary_key=True, default='')
+    frame_type = db.Column(db.String(50), primary_key=True, default='')
+    shop_branch = db.Column(db.String(100), primary_key=True, default='')
+    price_band = db.Column(db.String(20), primary_key=True, default='')
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<InventoryFacetCount {self.brand}/{self.frame_type}/{self.shop_branch}: {self.item_count}>'
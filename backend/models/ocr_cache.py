@@ -0,0 +1,16 @@
+from extensions import Timestamp, db
+
+class OcrCacheEntry(db.Model):
+    """OCR result of one image (by content hash) under one pipeline version; see services/ocr_cache.py."""
+    __tablename__ = 'ocr_cache'
+
+    image_hash = db.Column(db.String(64), primary_key=True)  # sha256 of the image bytes
+    pipeline_version = db.Column(db.String(20), primary_key=True)
+    result = db.Column(db.JSON, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # bytes of the stored result, for eviction
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    last_used_at = db.Column(Timestamp, server_default=db.func.now(), index=True)
+
+    def __repr__(self):
+        return f'<OcrCacheEntry {self.image_hash[:12]} v{self.pipeline_version}>'
@@ -0,0 +1,33 @@
+from extensions import Timestamp, db
+
+class OcrJob(db.Model):
+    """A prescription scan queued for background OCR (see services/ocr_jobs.py)."""
+    __tablename__ = 'ocr_jobs'
+
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    # Random hex id, so job ids can't be guessed from the order of scans
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(10), nullable=False, default=QUEUED, index=True)
+    image_hash = db.Column(db.String(64))  # sha256 of the upload(s), the OCR cache key
+    result = db.Column(db.JSON)   # the extracted re_/le_ values
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status}
+        if self.status == self.DONE:
+            data['result'] = self.result or {}
+        elif self.status == self.FAILED:
+            data['error'] = self.error
+        return data
+
+    def __repr__(self):
+        return f'<OcrJob {self.id} {self.status}>'
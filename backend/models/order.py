@@ -1,8 +1,16 @@
-from extensions import db
+from extensions import Timestamp, db
 from datetime import datetime
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Order list / dashboard (newest first, keyset on created_at, id)
+        db.Index('ix_orders_created', 'created_at', 'id'),
+        # A customer's orders, newest first
+        db.Index('ix_orders_customer_created', 'customer_id', 'created_at'),
+        # Pending / status counts and filters
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     order_no = db.Column(db.String(50), unique=True, nullable=False)
@@ -21,8 +29,8 @@ class Order(db.Model):
     # SQLAlchemy doesn't always play nice with GENERATED ALWAYS AS, so we can calculate it in python for display
     
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+    updated_at = db.Column(Timestamp, server_default=db.func.now(), onupdate=db.func.now())
 
     # Relationships
     customer = db.relationship('Customer', backref=db.backref('orders', lazy=True, order_by='Order.created_at.desc()'))
@@ -45,11 +53,14 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
 
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    inventory_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    # Reorder report: units sold per inventory item
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=True, index=True)
 
     description = db.Column(db.String(255), nullable=True)   # Item name / description
     quantity = db.Column(db.Integer, nullable=False, default=1)
+    # Colour taken from stock, for inventory items tracked per colour
+    color = db.Column(db.String(50), nullable=True)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
 
     inventory = db.relationship('Inventory', lazy=True)
@@ -63,6 +74,6 @@ class OrderItem(db.Model):
         if self.description:
             return self.description
         if self.inventory:
-            return self.inventory.name
+            return self.inventory.model_name
         return 'Item'
 
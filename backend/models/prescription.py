@@ -1,7 +1,11 @@
-from extensions import db
+from extensions import Timestamp, db
 
 class Prescription(db.Model):
     __tablename__ = 'prescriptions'
+    __table_args__ = (
+        # A customer's prescriptions, newest first (history page, new order form)
+        db.Index('ix_prescriptions_customer_created', 'customer_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
@@ -19,11 +23,12 @@ class Prescription(db.Model):
     # Addition (reading add / near vision)
     addition = db.Column(db.Numeric(5, 2))
 
-    image_path = db.Column(db.String(255)) # Path to uploaded image
+    image_path = db.Column(db.String(255)) # Path to uploaded image (legacy, under static/)
+    image_hash = db.Column(db.String(64), index=True)  # Image in the content-addressed store (services/image_store.py)
     
     notes = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    created_at = db.Column(Timestamp, server_default=db.func.now())
 
     # Relationships
     customer = db.relationship('Customer', backref=db.backref('prescriptions', lazy=True, order_by='Prescription.created_at.desc()'))
@@ -1,5 +1,5 @@
 from flask_login import UserMixin
-from extensions import db
+from extensions import Timestamp, db
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -12,7 +12,10 @@ class User(UserMixin, db.Model):
     # OTP-based password reset
     otp = db.Column(db.String(10), nullable=True)
     otp_expiry = db.Column(db.DateTime, nullable=True)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    created_at = db.Column(Timestamp, nullable=False, server_default=db.func.now())
+    # Goes up with every change to the row; workers drop cached logins that
+    # fall behind it (see services/user_cache.py)
+    auth_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @property
     def is_admin(self):
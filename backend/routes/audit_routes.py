@@ -1,24 +1,130 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import io
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
 from flask_login import login_required, current_user
+from datetime import datetime
 from models.audit_log import AuditLog
+from models.user import User
+from services.loading_policy import with_loading_policy
+from services.query_budget import query_budget
+from services.pagination import keyset_paginate
+from services.audit_service import audit_queue_stats
+from services.audit_retention import archived_months, search_archive
+from services.request_timing import settings as timing_settings, slowest_by_endpoint
+from services import query_stats
 
 audit_bp = Blueprint('audit', __name__, url_prefix='/audit')
 
 @audit_bp.route('/')
 @login_required
+@query_budget(3)
 def index():
     if not current_user.is_admin:
         flash('Access denied. Audit logs are for admins only.', 'danger')
         return redirect(url_for('dashboard.index'))
 
-    page = request.args.get('page', 1, type=int)
     table_filter = request.args.get('table_name', '')
     
-    query = AuditLog.query
+    query = with_loading_policy(AuditLog.query, 'audit.index')
     
     if table_filter:
         query = query.filter(AuditLog.table_name == table_filter)
         
-    logs = query.order_by(AuditLog.timestamp.desc()).paginate(page=page, per_page=20)
+    logs = keyset_paginate(query, [AuditLog.timestamp, AuditLog.id], descending=True,
+                           cursor=request.args.get('cursor'), per_page=20)
     
     return render_template('audit/list.html', logs=logs, table_filter=table_filter)
+
+@audit_bp.route('/queue')
+@login_required
+def queue_status():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admins only'}), 403
+
+    stats = audit_queue_stats()
+    if stats is None:
+        return jsonify({'mode': 'sync'})
+    return jsonify({'mode': 'background', **stats})
+
+@audit_bp.route('/perf')
+@login_required
+def perf():
+    if not current_user.is_admin:
+        flash('Access denied. Performance data is for admins only.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+    report, total = slowest_by_endpoint(per_endpoint=request.args.get('per', 5, type=int))
+    return render_template('audit/perf.html', report=report, total=total,
+                           buffer_size=timing_settings['buffer'])
+
+QUERY_SORTS = {'total_ms': 'Total time', 'mean_ms': 'Mean time', 'max_ms': 'Max time', 'calls': 'Calls', 'rows': 'Rows'}
+
+@audit_bp.route('/queries')
+@login_required
+def queries():
+    if not current_user.is_admin:
+        flash('Access denied. Performance data is for admins only.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+    order_by = request.args.get('sort', 'total_ms')
+    if order_by not in QUERY_SORTS:
+        order_by = 'total_ms'
+    stats = query_stats.snapshot(order_by, limit=100)
+    return render_template('audit/queries.html', stats=stats, order_by=order_by, sorts=QUERY_SORTS,
+                           enabled=query_stats.settings['enabled'])
+
+@audit_bp.route('/queries.json')
+@login_required
+def queries_json():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admins only'}), 403
+
+    order_by = request.args.get('sort', 'total_ms')
+    stream = io.StringIO()
+    query_stats.dump(stream, order_by if order_by in QUERY_SORTS else 'total_ms')
+    filename = f"sql-stats-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    return Response(stream.getvalue(), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@audit_bp.route('/queries/reset', methods=['POST'])
+@login_required
+def reset_queries():
+    if not current_user.is_admin:
+        flash('Access denied. Performance data is for admins only.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+    query_stats.reset()
+    flash('SQL statement stats cleared for this worker.', 'success')
+    return redirect(url_for('audit.queries'))
+
+@audit_bp.route('/archive')
+@login_required
+def archive():
+    if not current_user.is_admin:
+        flash('Access denied. Audit logs are for admins only.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+    months = archived_months()
+    month_str = request.args.get('month', '')
+    table_filter = request.args.get('table_name', '')
+    record_id = request.args.get('record_id', type=int)
+    search = request.args.get('q', '').strip()
+
+    # Archive files are only scanned when the admin actually submits a search
+    logs = None
+    usernames = {}
+    if request.args.get('search'):
+        month = None
+        if month_str:
+            try:
+                month = datetime.strptime(month_str, '%Y-%m').date()
+            except ValueError:
+                flash(f'"{month_str}" is not a month (YYYY-MM); searching all months.', 'warning')
+                month_str = ''
+        logs = search_archive(month=month, table_name=table_filter or None,
+                              record_id=record_id, text_query=search or None)
+        user_ids = {log.user_id for log in logs if log.user_id}
+        if user_ids:
+            usernames = dict(User.query.with_entities(User.id, User.username).filter(User.id.in_(user_ids)).all())
+
+    return render_template('audit/archive.html', logs=logs, months=months, usernames=usernames,
+                           month=month_str, table_filter=table_filter, record_id=record_id, q=search)
@@ -2,13 +2,25 @@ import random
 from datetime import datetime, timedelta
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
-from extensions import db, bcrypt
+from extensions import db
 from models.user import User
+from services.query_budget import query_budget
+from services.pagination import keyset_paginate
+from services.request_timing import timed
+from services.password_hashing import HashingBusy, check_password, hash_password, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
+@auth_bp.errorhandler(HashingBusy)
+def hashing_busy(error):
+    # Too many password hashes in flight (see services/password_hashing.py)
+    flash('The server is busy signing people in. Please try again in a few seconds.', 'warning')
+    if request.endpoint == 'auth.login':
+        return render_template('auth/login.html'), 503, {'Retry-After': '5'}
+    return redirect(request.referrer or url_for('auth.login'))
+
 def _admin_required():
     if not current_user.is_admin:
         flash('Access denied. Admin rights required.', 'danger')
@@ -41,7 +53,8 @@ def _send_otp_email(user_email, otp, username):
             "html": html_body
         }
         
-        email = resend.Emails.send(params)
+        with timed('email'):
+            email = resend.Emails.send(params)
         print(f"Resend accepted email: {email}")
         return True
         
@@ -67,7 +80,14 @@ def login():
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
         user = User.query.filter_by(username=username).first()
-        if user and bcrypt.check_password_hash(user.password_hash, password):
+        if user and check_password(user.password_hash, password):
+            if needs_rehash(user.password_hash):
+                # Made at another cost than BCRYPT_LOG_ROUNDS: store one at the current cost
+                try:
+                    user.password_hash = hash_password(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass  # next login, then
             login_user(user)
             flash('Login successful!', 'success')
             return redirect(request.args.get('next') or url_for('dashboard.index'))
@@ -173,7 +193,7 @@ def verify_otp():
             return render_template('auth/verify_otp.html', username=username)
 
         # All good — update password
-        user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        user.password_hash = hash_password(new_password)
         user.otp = None
         user.otp_expiry = None
         db.session.commit()
@@ -191,11 +211,12 @@ def verify_otp():
 
 @auth_bp.route('/users')
 @login_required
+@query_budget(3)
 def manage_users():
     if not _admin_required():
         return redirect(url_for('dashboard.index'))
-    page = request.args.get('page', 1, type=int)
-    users = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=20)
+    users = keyset_paginate(User.query, [User.created_at, User.id], descending=True,
+                            cursor=request.args.get('cursor'), per_page=20)
     return render_template('auth/manage_users.html', users=users)
 
 
@@ -218,7 +239,7 @@ def add_user():
         flash('Email already registered.', 'warning')
         return redirect(url_for('auth.manage_users'))
 
-    hashed = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed = hash_password(password)
     new_user = User(username=username, email=email, password_hash=hashed, role=role)
     db.session.add(new_user)
     db.session.commit()
@@ -259,7 +280,7 @@ def edit_user(id):
         if len(new_password) < 6:
             flash('Password must be at least 6 characters.', 'warning')
             return redirect(url_for('auth.manage_users'))
-        user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        user.password_hash = hash_password(new_password)
 
     db.session.commit()
     flash(f'User "{user.username}" updated successfully!', 'success')
@@ -1,31 +1,41 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from extensions import db
 from models.customer import Customer
+from services.query_budget import query_budget
+from services.pagination import keyset_paginate
+from services.customer_search import search_filter, typeahead
 
 customer_bp = Blueprint('customer', __name__, url_prefix='/customers')
 
 @customer_bp.route('/')
 @login_required
+@query_budget(4)
 def index():
-    page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '')
     
     query = Customer.query
 
     if search_query:
-        search_filter = f"%{search_query}%"
-        query = query.filter(
-            (Customer.name.ilike(search_filter)) | 
-            (Customer.phone.ilike(search_filter)) |
-            (Customer.care_of.ilike(search_filter))
-        )
+        query = query.filter(search_filter(search_query))
     
     # Order by most recently updated/created
-    customers = query.order_by(Customer.updated_at.desc()).paginate(page=page, per_page=10)
+    customers = keyset_paginate(query, [Customer.updated_at, Customer.id], descending=True,
+                                cursor=request.args.get('cursor'), per_page=10)
     
     return render_template('customers/list.html', customers=customers, search_query=search_query)
 
+@customer_bp.route('/typeahead')
+@login_required
+@query_budget(4)
+def typeahead_search():
+    q = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    return jsonify([
+        {'id': c.id, 'name': c.name, 'care_of': c.care_of, 'phone': c.phone}
+        for c in typeahead(q, limit)
+    ])
+
 @customer_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add():
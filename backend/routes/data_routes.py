@@ -0,0 +1,62 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, stream_with_context, abort
+from flask_login import login_required, current_user
+from datetime import datetime
+from extensions import db
+from services.bulk_io import IMPORTERS, XLSX_AVAILABLE, export_csv, import_rows, read_rows
+
+data_bp = Blueprint('data', __name__, url_prefix='/data')
+
+def _admin_only():
+    if not current_user.is_admin:
+        flash('Access denied. Import and export are for admins only.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+@data_bp.route('/')
+@login_required
+def index():
+    denied = _admin_only()
+    if denied:
+        return denied
+    return render_template('data/index.html', importers=IMPORTERS, xlsx=XLSX_AVAILABLE, result=None)
+
+@data_bp.route('/import', methods=['POST'])
+@login_required
+def import_file():
+    denied = _admin_only()
+    if denied:
+        return denied
+
+    entity = request.form.get('entity')
+    upload = request.files.get('file')
+    if entity not in IMPORTERS or not upload or not upload.filename:
+        flash('Choose what to import and a file.', 'warning')
+        return redirect(url_for('data.index'))
+
+    try:
+        # The upload is read row by row from its spooled temp file
+        result = import_rows(entity, read_rows(upload.stream, upload.filename), user_id=current_user.id)
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'warning')
+        return redirect(url_for('data.index'))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Import stopped: {str(e)}', 'danger')
+        return redirect(url_for('data.index'))
+
+    category = 'success' if not result['rejected'] else 'warning'
+    flash(f"Imported {result['imported']} {entity}, {result['rejected']} row(s) rejected.", category)
+    return render_template('data/index.html', importers=IMPORTERS, xlsx=XLSX_AVAILABLE, result=result)
+
+@data_bp.route('/export/<entity>.csv')
+@login_required
+def export(entity):
+    denied = _admin_only()
+    if denied:
+        return denied
+    if entity not in IMPORTERS:
+        abort(404)
+
+    filename = f"{entity}-{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    return Response(stream_with_context(export_csv(entity)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
@@ -1,17 +1,27 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm.exc import StaleDataError
 from extensions import db
 from models.inventory import Inventory
+from models.inventory_color import parse_color_stock
+from services.query_budget import query_budget
+from services.pagination import keyset_paginate
+from services.facet_service import FACETS, FACET_LABELS, facet_counts, filter_inventory
+from services.color_stock_service import colors_in_stock, set_item_colors
+from services.loading_policy import with_loading_policy
+from services.reorder_service import reorder_report
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 
 @inventory_bp.route('/')
 @login_required
+@query_budget(5)
 def index():
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
+    # Facet filters: ?brand=Ray-Ban&frame_type=Full-rim&shop_branch=Branch 2
+    selected = {facet: request.args[facet] for facet in FACETS if request.args.get(facet)}
     
-    query = Inventory.query
+    query = filter_inventory(with_loading_policy(Inventory.query, 'inventory.index'), selected)
     
     if search:
         query = query.filter(
@@ -23,9 +33,13 @@ def index():
     # Sort by low stock first, then name
     # We can't easily sort by property 'is_low_stock' in SQL, so we'll just sort by updated_at for now
     # or we can do quantity ASC to show low stock first.
-    items = query.order_by(Inventory.quantity.asc()).paginate(page=page, per_page=15)
+    items = keyset_paginate(query, [Inventory.quantity, Inventory.id],
+                            cursor=request.args.get('cursor'), per_page=15)
     
-    return render_template('inventory/list.html', items=items, search=search)
+    facets = facet_counts(selected)
+    
+    return render_template('inventory/list.html', items=items, search=search,
+                           facets=facets, facet_labels=FACET_LABELS, selected=selected)
 
 @inventory_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -41,9 +55,10 @@ def add():
                 shop_branch=request.form.get('shop_branch'),
                 cost_price=float(request.form.get('cost_price', 0)),
                 selling_price=float(request.form.get('selling_price', 0)),
-                low_stock_threshold=int(request.form.get('low_stock_threshold', 5)),
-                color_stock=request.form.get('color_stock') or None
+                low_stock_threshold=int(request.form.get('low_stock_threshold', 5))
             )
+            # Per-colour rows; quantity becomes their sum when any are given
+            set_item_colors(new_item, parse_color_stock(request.form.get('color_stock')))
             db.session.add(new_item)
             db.session.commit()
             flash('Item added to inventory!', 'success')
@@ -60,7 +75,17 @@ def edit(id):
     item = Inventory.query.get_or_404(id)
     
     if request.method == 'POST':
+        # Orders take stock while the form is open; don't write back stale numbers
+        form_version = request.form.get('version', type=int)
+        if form_version is not None and form_version != item.version:
+            flash('This item changed while you were editing it (e.g. an order took stock). '
+                  'Check the current values below and save again.', 'warning')
+            return render_template('inventory/edit.html', item=item)
+
         try:
+            # Colours first: loading item.colors would otherwise autoflush the other fields early
+            set_item_colors(item, parse_color_stock(request.form.get('color_stock')))
+            item.color_stock = None
             item.model_name = request.form.get('model_name')
             item.brand = request.form.get('brand')
             item.frame_type = request.form.get('frame_type')
@@ -70,13 +95,55 @@ def edit(id):
             item.cost_price = float(request.form.get('cost_price', 0))
             item.selling_price = float(request.form.get('selling_price', 0))
             item.low_stock_threshold = int(request.form.get('low_stock_threshold', 5))
-            item.color_stock = request.form.get('color_stock') or None
             
             db.session.commit()
             flash('Inventory updated!', 'success')
             return redirect(url_for('inventory.index'))
+        except StaleDataError:
+            # Changed between loading it above and this UPDATE (version mismatch)
+            db.session.rollback()
+            flash('This item changed while you were editing it. Check the current values and save again.', 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating item: {str(e)}', 'danger')
 
     return render_template('inventory/edit.html', item=item)
+
+@inventory_bp.route('/lookup')
+@login_required
+@query_budget(3)
+def lookup():
+    """Inventory picker for order lines: /inventory/lookup?q=aviator"""
+    q = request.args.get('q', '').strip()
+    if len(q) < 2:
+        return jsonify([])
+    items = (with_loading_policy(Inventory.query, 'inventory.lookup')
+             .filter((Inventory.model_name.ilike(f'%{q}%')) | (Inventory.brand.ilike(f'%{q}%')))
+             .order_by(Inventory.model_name, Inventory.id)
+             .limit(10)
+             .all())
+    return jsonify([{
+        'id': item.id,
+        'name': ' '.join(part for part in [item.brand, item.model_name] if part),
+        'shop_branch': item.shop_branch,
+        'selling_price': str(item.selling_price),
+        'quantity': item.quantity or 0,
+        'colors': [{'color': c.color, 'quantity': c.quantity} for c in item.colors],
+    } for item in items])
+
+@inventory_bp.route('/colors')
+@login_required
+def colors():
+    """Colours of a model in stock: /inventory/colors?model=RB3025&branch=Branch 1"""
+    model_name = request.args.get('model', '').strip()
+    if not model_name:
+        return jsonify([])
+    rows = colors_in_stock(model_name, shop_branch=request.args.get('branch') or None)
+    return jsonify([{'color': color, 'quantity': int(quantity)} for color, quantity in rows])
+
+@inventory_bp.route('/reorder')
+@login_required
+@query_budget(6)
+def reorder():
+    page, groups = reorder_report(cursor=request.args.get('cursor'))
+    return render_template('inventory/reorder.html', page=page, groups=groups)
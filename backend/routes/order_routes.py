@@ -4,16 +4,28 @@ from extensions import db
 from models.order import Order, OrderItem
 from models.customer import Customer
 from models.prescription import Prescription
+from services.loading_policy import with_loading_policy
+from services.query_budget import query_budget
+from services.pagination import keyset_paginate
+from services.stock_service import OutOfStock, held_stock, sync_reservations, with_retry
 import uuid
 from datetime import datetime
 
 order_bp = Blueprint('order', __name__, url_prefix='/orders')
 
+def _line_value(values, i):
+    # inventory_id[] / color[] may be shorter than item_desc[] on older forms
+    return (values[i] if i < len(values) else '').strip() or None
+
 @order_bp.route('/')
 @login_required
+@query_budget(3)
 def index():
-    page = request.args.get('page', 1, type=int)
-    orders = Order.query.order_by(Order.created_at.desc()).paginate(page=page, per_page=10)
+    orders = keyset_paginate(
+        with_loading_policy(Order.query, 'order.index'),
+        [Order.created_at, Order.id], descending=True,
+        cursor=request.args.get('cursor'), per_page=10
+    )
     return render_template('orders/list.html', orders=orders)
 
 @order_bp.route('/new/<int:customer_id>', methods=['GET', 'POST'])
@@ -36,6 +48,8 @@ def new(customer_id):
             descriptions = request.form.getlist('item_desc[]')
             quantities = request.form.getlist('quantity[]')
             prices = request.form.getlist('unit_price[]')
+            inventory_ids = request.form.getlist('inventory_id[]')
+            colors = request.form.getlist('color[]')
             
             total_amount = 0
             items_to_add = []
@@ -46,10 +60,13 @@ def new(customer_id):
                     price = float(prices[i])
                     total_amount += (qty * price)
                     
+                    inventory_id = _line_value(inventory_ids, i)
                     items_to_add.append({
                         'desc': descriptions[i],
                         'qty': qty,
-                        'price': price
+                        'price': price,
+                        'inventory_id': int(inventory_id) if inventory_id else None,
+                        'color': _line_value(colors, i)
                     })
             
             # Generate Order No
@@ -57,33 +74,46 @@ def new(customer_id):
             
             delivery_date = datetime.strptime(delivery_date_str, '%Y-%m-%d').date() if delivery_date_str else None
 
-            new_order = Order(
-                order_no=order_no,
-                customer_id=customer_id,
-                prescription_id=prescription_id,
-                status=status,
-                delivery_date=delivery_date,
-                advance_amount=advance_amount,
-                total_amount=total_amount,
-                created_by=current_user.id
-            )
-            
-            db.session.add(new_order)
-            db.session.flush() # Get ID
-            
-            for item in items_to_add:
-                order_item = OrderItem(
-                    order_id=new_order.id,
-                    description=item['desc'],
-                    quantity=item['qty'],
-                    unit_price=item['price']
+            def save():
+                new_order = Order(
+                    order_no=order_no,
+                    customer_id=customer_id,
+                    prescription_id=prescription_id,
+                    status=status,
+                    delivery_date=delivery_date,
+                    advance_amount=advance_amount,
+                    total_amount=total_amount,
+                    created_by=current_user.id
                 )
-                db.session.add(order_item)
                 
-            db.session.commit()
+                db.session.add(new_order)
+                db.session.flush() # Get ID
+                
+                order_items = []
+                for item in items_to_add:
+                    order_item = OrderItem(
+                        order_id=new_order.id,
+                        inventory_id=item['inventory_id'],
+                        color=item['color'],
+                        description=item['desc'],
+                        quantity=item['qty'],
+                        unit_price=item['price']
+                    )
+                    db.session.add(order_item)
+                    order_items.append(order_item)
+                
+                # Take linked frames out of stock in the same transaction
+                sync_reservations(db.session, {}, held_stock(order_items, status))
+                db.session.commit()
+                return new_order
+
+            new_order = with_retry(save)
             flash('Order created successfully!', 'success')
             return redirect(url_for('order.view', id=new_order.id))
             
+        except OutOfStock as e:
+            db.session.rollback()
+            flash(f'Order not saved: {e}', 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating order: {str(e)}', 'danger')
@@ -92,17 +122,21 @@ def new(customer_id):
 
 @order_bp.route('/<int:id>')
 @login_required
+@query_budget(3)
 def view(id):
-    order = Order.query.get_or_404(id)
+    order = with_loading_policy(Order.query, 'order.view').get_or_404(id)
     return render_template('orders/view.html', order=order)
 
 @order_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit(id):
-    order = Order.query.get_or_404(id)
+    order = with_loading_policy(Order.query, 'order.edit').get_or_404(id)
     
     if request.method == 'POST':
-        try:
+        def save():
+            # Stock this order holds right now (nothing if it was Cancelled)
+            before = held_stock(order.items, order.status)
+
             # 1. Update Basic Fields
             order.status = request.form.get('status')
             order.delivery_mode = request.form.get('delivery_mode')
@@ -113,40 +147,64 @@ def edit(id):
             if date_str:
                 order.delivery_date = datetime.strptime(date_str, '%Y-%m-%d').date()
 
-            # 2. Re-create Line Items (Delete Old -> Add New)
-            # Remove existing items properly
-            OrderItem.query.filter_by(order_id=order.id).delete()
-            
-            # Parse new items
+            # 2. Line Items: match submitted lines to existing items by item_id[]
+            # and only insert / update / delete what actually changed, so item
+            # ids stay stable and an untouched line writes nothing
             descriptions = request.form.getlist('item_desc[]')
             quantities = request.form.getlist('quantity[]')
             prices = request.form.getlist('unit_price[]')
+            item_ids = request.form.getlist('item_id[]')
+            inventory_ids = request.form.getlist('inventory_id[]')
+            colors = request.form.getlist('color[]')
             
+            existing = {item.id: item for item in order.items}
             subtotal = 0
+            new_items = []
             
             for i in range(len(descriptions)):
                 if descriptions[i]:
                     qty = int(quantities[i])
                     price = float(prices[i])
                     subtotal += (qty * price)
+                    item_id = _line_value(item_ids, i)
+                    inventory_id = _line_value(inventory_ids, i)
 
-                    new_item = OrderItem(
-                        order_id=order.id,
-                        description=descriptions[i],
-                        quantity=qty,
-                        unit_price=price
-                    )
-                    db.session.add(new_item)
+                    # Unknown or repeated ids (e.g. a copied row) become new lines
+                    item = existing.pop(int(item_id), None) if item_id and item_id.isdigit() else None
+                    if item is None:
+                        item = OrderItem()
+                        order.items.append(item)
+                    # Equal values are no-ops for the ORM, so unchanged lines issue no UPDATE
+                    item.inventory_id = int(inventory_id) if inventory_id else None
+                    item.color = _line_value(colors, i)
+                    item.description = descriptions[i]
+                    item.quantity = qty
+                    item.unit_price = price
+                    new_items.append(item)
+
+            # Lines no longer on the form (delete-orphan issues the DELETE)
+            for item in existing.values():
+                order.items.remove(item)
 
             # 3. Recalculate Total
             total_amount = subtotal - order.discount
             if total_amount < 0: total_amount = 0
             order.total_amount = total_amount
+
+            # 4. Stock: take what the order now needs on top of what it held,
+            # give back the rest (all of it when the order is being cancelled)
+            sync_reservations(db.session, before, held_stock(new_items, order.status))
             
             db.session.commit()
+
+        try:
+            with_retry(save)
             flash('Order updated successfully!', 'success')
             return redirect(url_for('order.view', id=order.id))
             
+        except OutOfStock as e:
+            db.session.rollback()
+            flash(f'Order not saved: {e}', 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating order: {str(e)}', 'danger')
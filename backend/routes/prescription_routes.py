@@ -1,18 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, send_file, abort
 from flask_login import login_required, current_user
 from extensions import db
 from models.prescription import Prescription
 from models.customer import Customer
-from services.ocr_service import process_prescription_image, allowed_file
+from services.ocr_service import allowed_file, ocr_available
+from services.ocr_jobs import OcrBusy, get_job, submit_scan
+from services.image_store import VARIANTS, mimetype, path_for, save_image
+from services.loading_policy import with_loading_policy
+from services.query_budget import query_budget
 import os
-import uuid
-from werkzeug.utils import secure_filename
+import re
 
 prescription_bp = Blueprint('prescription', __name__, url_prefix='/prescriptions')
 
-# Configure Upload Folder (Basic setup)
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def _max_image_bytes():
+    return current_app.config.get('OCR_MAX_IMAGE_MB', 15) * 1024 * 1024
 
 @prescription_bp.route('/add/<int:customer_id>', methods=['GET', 'POST'])
 @login_required
@@ -30,16 +34,16 @@ def add(customer_id):
             addition = request.form.get('addition') or None
             notes = request.form.get('notes')
             
-            image_path = None
+            image_hash = None
             if 'prescription_image' in request.files:
                 file = request.files['prescription_image']
                 if file and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(f"presc_{customer_id}_{uuid.uuid4().hex[:8]}.{file.filename.rsplit('.', 1)[1].lower()}")
-                    save_dir = os.path.join('static', 'uploads')
-                    os.makedirs(save_dir, exist_ok=True)
-                    filepath = os.path.join(save_dir, filename)
-                    file.save(filepath)
-                    image_path = filepath.replace('\\', '/')
+                    max_bytes = _max_image_bytes()
+                    image = file.read(max_bytes + 1)
+                    if len(image) > max_bytes:
+                        flash(f'Image too large (limit {max_bytes // (1024 * 1024)} MB).', 'danger')
+                        return render_template('prescriptions/add.html', customer=customer)
+                    image_hash = save_image(image)
 
             new_prescription = Prescription(
                 customer_id=customer_id,
@@ -47,7 +51,7 @@ def add(customer_id):
                 le_sph=le_sph, le_cyl=le_cyl, le_axis=le_axis,
                 addition=addition,
                 notes=notes,
-                image_path=image_path,
+                image_hash=image_hash,
                 created_by=current_user.id
             )
             
@@ -64,16 +68,18 @@ def add(customer_id):
 
 @prescription_bp.route('/history/<int:customer_id>')
 @login_required
+@query_budget(4)
 def history(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     page = request.args.get('page', 1, type=int)
-    prescriptions = Prescription.query.filter_by(customer_id=customer_id).order_by(Prescription.created_at.desc()).paginate(page=page, per_page=20)
+    prescriptions = with_loading_policy(Prescription.query, 'prescription.history').filter_by(customer_id=customer_id).order_by(Prescription.created_at.desc()).paginate(page=page, per_page=20)
     return render_template('prescriptions/history.html', customer=customer, prescriptions=prescriptions)
 
 @prescription_bp.route('/view/<int:id>')
 @login_required
+@query_budget(2)
 def view(id):
-    prescription = Prescription.query.get_or_404(id)
+    prescription = with_loading_policy(Prescription.query, 'prescription.view').get_or_404(id)
     return render_template('prescriptions/view.html', prescription=prescription)
 
 @prescription_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
@@ -113,12 +119,51 @@ def delete(id):
     try:
         db.session.delete(prescription)
         db.session.commit()
+        # The image file stays: another request may be attaching the same photo
+        # right now. `flask cleanup-prescription-images` removes it once orphaned.
         flash('Prescription deleted permanently.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error deleting: {str(e)}', 'danger')
     return redirect(url_for('prescription.history', customer_id=customer_id))
 
+@prescription_bp.route('/image/<image_hash>/<variant>')
+@login_required
+def image(image_hash, variant):
+    if variant not in VARIANTS or not re.fullmatch(r'[0-9a-f]{64}', image_hash):
+        abort(404)
+    path = path_for(image_hash, variant)
+    if not os.path.exists(path):
+        abort(404)
+    # Content never changes under a hash: strong ETag, cached for a year;
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(os.path.abspath(path), mimetype=mimetype(path), conditional=True,
+                         etag=f'{image_hash}-{variant}', max_age=IMMUTABLE_MAX_AGE)
+    # Patient data: browsers may keep it, shared caches may not
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+def _queue_scan(files):
+    # OCR runs in the background (services/ocr_jobs.py); the form polls for the result
+    if not ocr_available():
+        return jsonify({'error': 'OCR not available on this server. Please enter prescription details manually.'}), 400
+    if not all(allowed_file(file.filename) for file in files):
+        return jsonify({'error': 'Invalid file type'}), 400
+    max_bytes = _max_image_bytes()
+    images = [file.read(max_bytes + 1) for file in files]
+    if any(len(image) > max_bytes for image in images):
+        return jsonify({'error': 'Image too large'}), 413
+    try:
+        job = submit_scan(images, current_user.id)
+    except OcrBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    return jsonify({**job.to_dict(), 'poll_url': url_for('prescription.ocr_job', job_id=job.id)}), 202
+
 @prescription_bp.route('/ocr_scan', methods=['POST'])
 @login_required
 def ocr_scan():
@@ -127,16 +172,24 @@ def ocr_scan():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
-    
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        try:
-            data = process_prescription_image(filepath)
-            os.remove(filepath)
-            return jsonify(data)
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
-            
-    return jsonify({'error': 'Invalid file type'}), 400
+    return _queue_scan([file])
+
+@prescription_bp.route('/ocr_scan_batch', methods=['POST'])
+@login_required
+def ocr_scan_batch():
+    """Several photos of one prescription (pages, front/back), read together and merged."""
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No selected file'}), 400
+    limit = current_app.config.get('OCR_BATCH_MAX', 4)
+    if len(files) > limit:
+        return jsonify({'error': f'At most {limit} images per scan'}), 400
+    return _queue_scan(files)
+
+@prescription_bp.route('/ocr_jobs/<job_id>')
+@login_required
+def ocr_job(job_id):
+    job = get_job(job_id, current_app.config.get('OCR_JOB_TIMEOUT', 300))
+    if job is None or (job.created_by != current_user.id and not current_user.is_admin):
+        return jsonify({'error': 'Scan not found'}), 404
+    return jsonify(job.to_dict())
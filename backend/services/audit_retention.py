@@ -0,0 +1,248 @@
+import glob
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import text
+from extensions import db
+from models.audit_log import AuditLog
+
+# Monthly partitions for audit_logs.
+#   Postgres: native RANGE partitions on "timestamp" (audit_logs_pYYYYMM),
+#             created by `flask partition-audit-logs`, one per month.
+#   SQLite (and unconverted Postgres): a month is the timestamp range of the
+#             single audit_logs table, served by the timestamp index.
+# `flask archive-audit-logs` moves months older than AUDIT_RETENTION_MONTHS
+# into gzipped JSONL files under AUDIT_ARCHIVE_DIR and drops them.
+
+audit_table = AuditLog.__table__
+PARTITION_RE = re.compile(r'^audit_logs_p(\d{4})(\d{2})$')
+ARCHIVE_RE = re.compile(r'^audit_logs_(\d{4})_(\d{2})(?:\.\d+)?\.jsonl\.gz$')
+
+
+# ── Month helpers ──────────────────────────────────────────────────────────────
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def add_months(month, n):
+    index = month.year * 12 + (month.month - 1) + n
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f'audit_logs_p{month.year:04d}{month.month:02d}'
+
+def archive_dir():
+    path = current_app.config.get('AUDIT_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'audit_archive')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# ── Postgres native partitions ─────────────────────────────────────────────────
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    kind = db.session.execute(text("SELECT relkind FROM pg_class WHERE relname = 'audit_logs'")).scalar()
+    return kind == 'p'
+
+def list_partitions():
+    """{month: partition table} for the monthly partitions attached to audit_logs."""
+    rows = db.session.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'audit_logs'
+    """)).scalars()
+    partitions = {}
+    for name in rows:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def _create_partition(month):
+    db.session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+def ensure_partitions(months_ahead=2):
+    """Creates this month's and the next `months_ahead` partitions (no-op when not partitioned)."""
+    if not is_partitioned():
+        return []
+    existing = list_partitions()
+    this_month = month_start(datetime.utcnow())
+    created = []
+    for n in range(months_ahead + 1):
+        month = add_months(this_month, n)
+        if month not in existing:
+            _create_partition(month)
+            created.append(partition_name(month))
+    db.session.commit()
+    return created
+
+def convert_to_partitioned(months_ahead=2):
+    """
+    One-time conversion of a plain Postgres audit_logs table into a table
+    partitioned by month. Copies existing rows and keeps the id sequence.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError('Native partitioning is only available on PostgreSQL.')
+    if is_partitioned():
+        return False
+
+    db.session.execute(text('ALTER TABLE audit_logs RENAME TO audit_logs_legacy'))
+    db.session.execute(text('UPDATE audit_logs_legacy SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+    # Index names are per schema: free them for the new table (the legacy one is dropped below)
+    db.session.execute(text('DROP INDEX IF EXISTS ix_audit_logs_timestamp'))
+    db.session.execute(text('DROP INDEX IF EXISTS ix_audit_logs_table_timestamp'))
+    db.session.execute(text(
+        'CREATE TABLE audit_logs (LIKE audit_logs_legacy INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+    ))
+    db.session.execute(text('ALTER TABLE audit_logs ALTER COLUMN "timestamp" SET NOT NULL'))
+    # The partition key has to be part of the primary key
+    db.session.execute(text('ALTER TABLE audit_logs ADD PRIMARY KEY (id, "timestamp")'))
+    db.session.execute(text('ALTER TABLE audit_logs ADD FOREIGN KEY (user_id) REFERENCES users (id)'))
+    db.session.execute(text('ALTER SEQUENCE IF EXISTS audit_logs_id_seq OWNED BY audit_logs.id'))
+    db.session.execute(text('CREATE INDEX ix_audit_logs_timestamp ON audit_logs ("timestamp")'))
+    db.session.execute(text('CREATE INDEX ix_audit_logs_table_timestamp ON audit_logs (table_name, "timestamp", id)'))
+
+    oldest = db.session.execute(text('SELECT min("timestamp") FROM audit_logs_legacy')).scalar()
+    this_month = month_start(datetime.utcnow())
+    month = month_start(oldest) if oldest else this_month
+    while month <= add_months(this_month, months_ahead):
+        _create_partition(month)
+        month = add_months(month, 1)
+    # Catches rows outside the prepared months (e.g. clock skew) instead of failing the insert
+    db.session.execute(text('CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT'))
+
+    db.session.execute(text('INSERT INTO audit_logs SELECT * FROM audit_logs_legacy'))
+    db.session.execute(text('DROP TABLE audit_logs_legacy'))
+    db.session.commit()
+    return True
+
+
+# ── Archive ────────────────────────────────────────────────────────────────────
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+def _archive_path(month):
+    base = os.path.join(archive_dir(), f'audit_logs_{month.year:04d}_{month.month:02d}')
+    path, n = f'{base}.jsonl.gz', 1
+    # A month archived twice (late rows) gets a numbered second file
+    while os.path.exists(path):
+        path, n = f'{base}.{n}.jsonl.gz', n + 1
+    return path
+
+def _export(result, month):
+    """Streams result rows to a temp gzipped JSONL file. Returns (final path, temp path, row count)."""
+    path = _archive_path(month)
+    tmp_path = path + '.tmp'
+    count = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+        for row in result.mappings():
+            fh.write(json.dumps(dict(row), default=_json_default, separators=(',', ':'), ensure_ascii=False))
+            fh.write('\n')
+            count += 1
+    return path, tmp_path, count
+
+def archive_month(month):
+    """Moves one month of audit logs to the archive. Returns (path, rows) or None when empty."""
+    start, end = month, add_months(month, 1)
+
+    if is_partitioned() and month in list_partitions():
+        name = partition_name(month)
+        db.session.execute(text(f'ALTER TABLE audit_logs DETACH PARTITION {name}'))
+        result = db.session.connection().execution_options(yield_per=1000).execute(
+            text(f'SELECT * FROM {name} ORDER BY id')
+        )
+        path, tmp_path, count = _export(result, month)
+        db.session.execute(text(f'DROP TABLE {name}'))
+    else:
+        in_month = (audit_table.c.timestamp >= start) & (audit_table.c.timestamp < end)
+        result = db.session.connection().execution_options(yield_per=1000).execute(
+            audit_table.select().where(in_month).order_by(audit_table.c.id)
+        )
+        path, tmp_path, count = _export(result, month)
+        db.session.execute(audit_table.delete().where(in_month))
+
+    if count == 0:
+        db.session.commit()
+        os.remove(tmp_path)
+        return None
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return path, count
+
+def months_to_archive(retention_months):
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    if is_partitioned():
+        return sorted(m for m in list_partitions() if m < cutoff)
+
+    oldest = db.session.query(db.func.min(AuditLog.timestamp)).scalar()
+    months = []
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def run_retention(retention_months=None):
+    """Archives every month older than the retention window. Returns [(month, path, rows)]."""
+    if retention_months is None:
+        retention_months = current_app.config.get('AUDIT_RETENTION_MONTHS', 12)
+    archived = []
+    for month in months_to_archive(retention_months):
+        result = archive_month(month)
+        if result:
+            archived.append((month, *result))
+    ensure_partitions()
+    return archived
+
+
+# ── Archive search ─────────────────────────────────────────────────────────────
+def archived_months():
+    months = set()
+    for path in glob.glob(os.path.join(archive_dir(), 'audit_logs_*.jsonl.gz')):
+        match = ARCHIVE_RE.match(os.path.basename(path))
+        if match:
+            months.add(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+def search_archive(month=None, table_name=None, record_id=None, text_query=None, limit=200):
+    """
+    Linear scan over the archive files (newest month first), returning up to
+    `limit` matching rows as transient AuditLog objects. Only run on request.
+    """
+    months = [month] if month else archived_months()
+    needle = text_query.lower() if text_query else None
+    results = []
+
+    for m in months:
+        pattern = os.path.join(archive_dir(), f'audit_logs_{m.year:04d}_{m.month:02d}*.jsonl.gz')
+        for path in sorted(glob.glob(pattern)):
+            with gzip.open(path, 'rt', encoding='utf-8') as fh:
+                for line in fh:
+                    # Cheap substring test before paying for json.loads
+                    if needle and needle not in line.lower():
+                        continue
+                    row = json.loads(line)
+                    if table_name and row.get('table_name') != table_name:
+                        continue
+                    if record_id is not None and row.get('record_id') != record_id:
+                        continue
+                    if row.get('timestamp'):
+                        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                    results.append(AuditLog(**row))
+                    if len(results) >= limit:
+                        return results
+    return results
@@ -1,20 +1,54 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from flask import current_app
 from flask_login import current_user
-from sqlalchemy import event, inspect
+from sqlalchemy import event, inspect, Date, DateTime, Integer, Numeric
+from sqlalchemy.orm import Session
 from extensions import db
 from models.audit_log import AuditLog
 from models.customer import Customer
 from models.inventory import Inventory
+from models.inventory_color import InventoryColor
 from models.prescription import Prescription
 from models.order import Order, OrderItem
+from services.audit_writer import AuditWriter
+
+# Audit rows are collected in session.info while the flush runs and written
+# once per commit: one multi-row INSERT inside the transaction ('sync'), or
+# handed to a background writer thread after the commit ('background').
+PENDING_KEY = 'audit_pending'
+COMMITTING_KEY = 'audit_committing'
+INSERT_CHUNK = 500
+SKIP_FIELDS = {'updated_at', 'created_at'}
+
+audit_table = AuditLog.__table__
+audit_writer = None
 
 def register_audit_listeners():
-    models_to_audit = [Customer, Inventory, Prescription, Order, OrderItem]
-    
+    global audit_writer
+    models_to_audit = [Customer, Inventory, InventoryColor, Prescription, Order, OrderItem]
+
+    # create_app() may run more than once per process (seed_admin.py imports app)
+    if event.contains(Session, 'before_commit', write_pending_logs):
+        return
+
     for model in models_to_audit:
         event.listen(model, 'after_insert', log_insert)
         event.listen(model, 'after_update', log_update)
         event.listen(model, 'after_delete', log_delete)
 
+    event.listen(Session, 'before_commit', write_pending_logs)
+    event.listen(Session, 'after_commit', hand_off_committed_logs)
+    event.listen(Session, 'after_rollback', discard_pending_logs)
+
+    if current_app.config.get('AUDIT_WRITE_MODE') == 'background' and audit_writer is None:
+        audit_writer = AuditWriter(
+            db.engine,
+            write_audit_rows,
+            maxsize=current_app.config.get('AUDIT_QUEUE_SIZE', 10000),
+            batch_size=INSERT_CHUNK
+        )
+
 def get_current_user_id():
     # Helper to safely get user ID even if outside request context (though unlikely in this app)
     try:
@@ -24,57 +58,171 @@ def get_current_user_id():
     except:
         return None
 
+def _queue_row(session, table_name, record_id, **fields):
+    # Every row carries the same keys so the batch can go out as one multi-row INSERT
+    row = {
+        'user_id': get_current_user_id(),
+        'table_name': table_name,
+        'record_id': record_id,
+        'changes': None,
+        'field_name': None,
+        'old_value': None,
+        'new_value': None,
+        'timestamp': datetime.utcnow(),
+    }
+    row.update(fields)
+    session.info.setdefault(PENDING_KEY, []).append(row)
+
+def _queue_log(target, **fields):
+    _queue_row(Session.object_session(target), target.__tablename__, target.id, **fields)
+
+def queue_audit(session, table_name, record_id, action, changes):
+    """Audit row for a change made with a Core UPDATE, which the mapper events never see."""
+    _queue_row(session, table_name, record_id, action=action, changes=changes)
+
+def json_value(column, value):
+    # Typed JSON: ints stay ints, Numeric keeps its scale as a string ("10.00"
+    # whether the route assigned 10, 10.0, '10' or Decimal('10.00')), dates as ISO.
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(column.type, Numeric) and isinstance(value, (int, float, Decimal, str)):
+        try:
+            value = Decimal(str(value))
+        except InvalidOperation:
+            return value
+        if column.type.scale is not None:
+            value = value.quantize(Decimal(1).scaleb(-column.type.scale))
+        return str(value)
+    if isinstance(column.type, Integer) and isinstance(value, str) and value.lstrip('-').isdigit():
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, datetime) and isinstance(column.type, Date) and not isinstance(column.type, DateTime):
+        return value.date().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+def _snapshot(mapper, target):
+    # Non-null column values of the record (relationships are covered by their FK
+    # columns, the primary key by record_id)
+    values = {}
+    for prop in mapper.column_attrs:
+        if prop.key in SKIP_FIELDS or prop.columns[0].primary_key:
+            continue
+        value = getattr(target, prop.key)
+        if value is not None:
+            values[prop.key] = json_value(prop.columns[0], value)
+    return values
+
 def log_insert(mapper, connection, target):
-    table_name = target.__tablename__
-    user_id = get_current_user_id()
-    
-    # For INSERT, we can just log the whole record or key fields
-    # Here we log generic "Record Created"
-    log = AuditLog(
-        user_id=user_id,
-        action='INSERT',
-        table_name=table_name,
-        record_id=target.id,
-        new_value=str(target) # Simple string representation
-    )
-    db.session.add(log)
+    _queue_log(target, action='INSERT', changes=_snapshot(mapper, target))
 
 def log_update(mapper, connection, target):
-    table_name = target.__tablename__
-    user_id = get_current_user_id()
-    
     state = inspect(target)
-    
-    for attr in state.attrs:
-        # Check if history has changes
-        if attr.history.has_changes():
-            old_val = attr.history.deleted[0] if attr.history.deleted else None
-            new_val = attr.history.added[0] if attr.history.added else None
-            
-            # Skip irrelevant fields or internal timestamps if desired
-            if attr.key in ['updated_at', 'created_at']:
-                continue
-
-            log = AuditLog(
-                user_id=user_id,
-                action='UPDATE',
-                table_name=table_name,
-                record_id=target.id,
-                field_name=attr.key,
-                old_value=str(old_val),
-                new_value=str(new_val)
-            )
-            db.session.add(log)
+    changes = {}
+
+    for prop in mapper.column_attrs:
+        # Skip irrelevant fields or internal timestamps
+        if prop.key in SKIP_FIELDS:
+            continue
+        history = state.attrs[prop.key].history
+        if not history.has_changes():
+            continue
+
+        column = prop.columns[0]
+        old_val = json_value(column, history.deleted[0] if history.deleted else None)
+        new_val = json_value(column, history.added[0] if history.added else None)
+        # Re-assigning an equal value (e.g. 10.0 over Decimal('10.00')) is not a change
+        if old_val != new_val:
+            changes[prop.key] = [old_val, new_val]
+
+    if changes:
+        _queue_log(target, action='UPDATE', changes=changes)
 
 def log_delete(mapper, connection, target):
-    table_name = target.__tablename__
-    user_id = get_current_user_id()
-    
-    log = AuditLog(
-        user_id=user_id,
-        action='DELETE',
-        table_name=table_name,
-        record_id=target.id,
-        old_value=str(target)
-    )
-    db.session.add(log)
+    _queue_log(target, action='DELETE', changes=_snapshot(mapper, target))
+
+def write_audit_rows(connection, rows):
+    for i in range(0, len(rows), INSERT_CHUNK):
+        connection.execute(audit_table.insert().values(rows[i:i + INSERT_CHUNK]))
+
+def write_pending_logs(session):
+    # Flush first so the final changes of this commit fire their mapper events
+    session.flush()
+    rows = session.info.pop(PENDING_KEY, None)
+    if not rows:
+        return
+    if audit_writer is not None:
+        # Only hand rows to the writer once the transaction has really committed
+        session.info[COMMITTING_KEY] = rows
+    else:
+        write_audit_rows(session.connection(), rows)
+
+def hand_off_committed_logs(session):
+    rows = session.info.pop(COMMITTING_KEY, None)
+    if rows and audit_writer is not None:
+        audit_writer.submit(rows)
+
+def discard_pending_logs(session):
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(COMMITTING_KEY, None)
+
+def audit_queue_stats():
+    """Backlog of the background writer (None when audit logs are written inline)."""
+    return audit_writer.stats() if audit_writer is not None else None
+
+def _legacy_value(value):
+    # Legacy rows stored str(value); str(None) became 'None'
+    return None if value in (None, 'None') else value
+
+def compact_legacy_logs(batch_size=5000, window_seconds=2):
+    """
+    Folds legacy one-row-per-field UPDATE logs into changeset rows.
+    Consecutive rows for the same record/user within `window_seconds` (the
+    fields of one flush) become a single row with {"field": [old, new]};
+    the other rows are deleted. Streams in id order, one commit per batch.
+    Returns (changesets written, rows removed).
+    """
+    last_id = 0
+    leader = None
+    written = removed = 0
+
+    while True:
+        rows = (AuditLog.query
+                .filter(AuditLog.id > last_id,
+                        AuditLog.action == 'UPDATE',
+                        AuditLog.changes.is_(None),
+                        AuditLog.field_name.isnot(None))
+                .order_by(AuditLog.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+
+        for row in rows:
+            change = [_legacy_value(row.old_value), _legacy_value(row.new_value)]
+            same_group = (
+                leader is not None
+                and row.table_name == leader.table_name
+                and row.record_id == leader.record_id
+                and row.user_id == leader.user_id
+                and row.field_name not in leader.changes
+                and row.timestamp is not None and leader.timestamp is not None
+                and abs((row.timestamp - leader.timestamp).total_seconds()) <= window_seconds
+            )
+            if same_group:
+                # Reassign (not mutate) so the JSON column is flagged dirty
+                leader.changes = {**leader.changes, row.field_name: change}
+                db.session.delete(row)
+                removed += 1
+            else:
+                leader = row
+                leader.changes = {row.field_name: change}
+                leader.field_name = leader.old_value = leader.new_value = None
+                written += 1
+
+        last_id = rows[-1].id
+        db.session.commit()
+
+    return written, removed
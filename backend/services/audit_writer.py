@@ -0,0 +1,110 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Bounded queue of committed audit rows drained by one daemon thread.
+    Rows are written in batches on their own connection, outside the
+    user's transaction. Used when AUDIT_WRITE_MODE = 'background'.
+    """
+
+    def __init__(self, engine, write_rows, maxsize=10000, batch_size=500, put_timeout=1.0):
+        self.engine = engine
+        self.write_rows = write_rows
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.written = 0
+        self.failed = 0
+        self.overflowed = 0
+        self.max_backlog = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # Threads don't survive fork (gunicorn --preload), so (re)start per process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, rows):
+        self._ensure_started()
+        for i, row in enumerate(rows):
+            try:
+                self.queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                # Writer can't keep up — write the rest inline rather than lose them
+                self.overflowed += len(rows) - i
+                self._write(rows[i:])
+                break
+        self.max_backlog = max(self.max_backlog, self.queue.qsize())
+
+    def _run(self):
+        while True:
+            row = self.queue.get()
+            if row is _STOP:
+                self.queue.task_done()
+                return
+            batch = [row]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+
+            self._write(batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, rows):
+        try:
+            with self.engine.begin() as connection:
+                self.write_rows(connection, rows)
+            self.written += len(rows)
+        except Exception:
+            self.failed += len(rows)
+            log.exception('Audit writer failed to write %d row(s)', len(rows))
+
+    def flush(self):
+        """Blocks until every queued row has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def shutdown(self, timeout=10):
+        """Drains the queue and stops the writer thread (registered with atexit)."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'backlog': self.queue.qsize(),
+            'max_backlog': self.max_backlog,
+            'capacity': self.queue.maxsize,
+            'written': self.written,
+            'failed': self.failed,
+            'overflowed': self.overflowed,
+            'running': self._thread is not None and self._thread.is_alive(),
+        }
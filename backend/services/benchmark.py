@@ -0,0 +1,218 @@
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime
+from flask import g
+from sqlalchemy import func, select
+from extensions import db
+from models.audit_log import AuditLog
+from models.customer import Customer
+from models.inventory import Inventory
+from models.order import Order
+from models.prescription import Prescription
+from models.user import User
+from services import query_stats
+
+# Benchmark suite behind `flask benchmark`. Drives every blueprint through
+# the Flask test client (no network, no server) against whatever database the
+# app points at (seed it with `flask seed-synthetic` first) and reports per
+# scenario p50/p95/p99 latency, SQL statements per request and errors, plus
+# overall throughput. Results are saved as JSON named by time and git commit;
+# --compare prints the change in p95 against an earlier run.
+#
+# With --concurrency N, N threads each run their own logged-in client.
+# Write scenarios (order create/edit, prescription add) add rows to the
+# database they run against.
+
+PERCENTILES = (50, 95, 99)
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class Fixtures:
+    """Ids and search terms sampled from the database, so requests hit real rows."""
+
+    def __init__(self, rng, sample=200):
+        self.rng = rng
+        self.admin_id = db.session.scalar(select(User.id).where(User.role == 'admin').limit(1))
+        self.customer_ids = self._ids(Customer, sample)
+        self.order_ids = self._ids(Order, sample)
+        self.prescription_ids = self._ids(Prescription, sample)
+        self.inventory_ids = self._ids(Inventory, sample)
+        self.names = [n.split()[0] for n in db.session.scalars(select(Customer.name).limit(sample)) if n]
+        self.phones = [p[-4:] for p in db.session.scalars(select(Customer.phone).limit(sample)) if p]
+        self.brands = [b for b in db.session.scalars(select(Inventory.brand).distinct().limit(20)) if b]
+        self.counts = {model.__tablename__: db.session.scalar(select(func.count()).select_from(model))
+                       for model in (Customer, Prescription, Inventory, Order, AuditLog)}
+
+    def _ids(self, model, sample):
+        # Spread over the whole id range, not just the first rows
+        low, high = db.session.execute(select(func.min(model.id), func.max(model.id))).one()
+        if low is None:
+            return []
+        step = max((high - low) // sample, 1)
+        return db.session.scalars(select(model.id).where((model.id - low) % step == 0).limit(sample)).all()
+
+    def pick(self, values, default=None):
+        return self.rng.choice(values) if values else default
+
+
+def _order_form(fx):
+    return {'status': 'Pending', 'delivery_mode': 'Self', 'advance_amount': '500', 'discount': '0',
+            'delivery_date': '', 'item_desc[]': ['Single Vision Lens'], 'quantity[]': ['1'],
+            'unit_price[]': ['800'], 'inventory_id[]': [''], 'color[]': ['']}
+
+def _edit_order_form(fx):
+    # No item_id[]: the order's lines are replaced by this one
+    return {**_order_form(fx), 'advance_amount': str(fx.rng.randint(0, 500))}
+
+def _prescription_form(fx):
+    return {'re_sph': '-1.25', 're_cyl': '-0.50', 're_axis': '180', 'le_sph': '-1.00', 'le_cyl': '',
+            'le_axis': '', 'addition': '', 'notes': 'benchmark'}
+
+
+# name: (method, url(fx), form(fx) or None). Ids are drawn per request.
+SCENARIOS = {
+    'dashboard': ('GET', lambda fx: '/dashboard', None),
+    'customers.list': ('GET', lambda fx: '/customers/', None),
+    'customers.search': ('GET', lambda fx: f"/customers/?search={fx.pick(fx.names, 'a')}", None),
+    'customers.search_phone': ('GET', lambda fx: f"/customers/?search={fx.pick(fx.phones, '98')}", None),
+    'customers.typeahead': ('GET', lambda fx: f"/customers/typeahead?q={fx.pick(fx.names, 'a')[:3]}", None),
+    'inventory.list': ('GET', lambda fx: '/inventory/', None),
+    'inventory.facet': ('GET', lambda fx: f"/inventory/?brand={fx.pick(fx.brands, '')}", None),
+    'inventory.lookup': ('GET', lambda fx: '/inventory/lookup?q=RB', None),
+    'inventory.reorder': ('GET', lambda fx: '/inventory/reorder', None),
+    'orders.list': ('GET', lambda fx: '/orders/', None),
+    'orders.view': ('GET', lambda fx: f'/orders/{fx.pick(fx.order_ids, 1)}', None),
+    'orders.create': ('POST', lambda fx: f'/orders/new/{fx.pick(fx.customer_ids, 1)}', _order_form),
+    'orders.edit': ('POST', lambda fx: f'/orders/edit/{fx.pick(fx.order_ids, 1)}', _edit_order_form),
+    'prescriptions.history': ('GET', lambda fx: f'/prescriptions/history/{fx.pick(fx.customer_ids, 1)}', None),
+    'prescriptions.view': ('GET', lambda fx: f'/prescriptions/view/{fx.pick(fx.prescription_ids, 1)}', None),
+    'prescriptions.add': ('POST', lambda fx: f'/prescriptions/add/{fx.pick(fx.customer_ids, 1)}', _prescription_form),
+    'audit.list': ('GET', lambda fx: '/audit/', None),
+}
+
+
+def _client(app, admin_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _request(app, client, fx, name):
+    method, url, form = SCENARIOS[name]
+    url, data = url(fx), form(fx) if form else None
+    # Own app context per request: fresh session, and g.query_count to read back
+    with app.app_context():
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        elapsed = time.perf_counter() - started
+        queries = g.get('query_count', 0)
+    ok = response.status_code < 400
+    return elapsed, queries, ok
+
+
+def run_benchmark(app, requests=50, concurrency=1, only=None, seed=1, warmup=2):
+    """Runs each scenario `requests` times; returns the results dict (see save_results)."""
+    names = [name for name in SCENARIOS if not only or name in only]
+    with app.app_context():
+        fx = Fixtures(random.Random(seed))
+        if fx.admin_id is None:
+            raise ValueError('Need at least one admin user to log in with.')
+        counts = fx.counts
+        dialect = db.engine.dialect.name
+    # SQL stats (--sql-stats) cover the requests, not the fixture queries above
+    query_stats.reset()
+
+    results = {}
+    began = time.perf_counter()
+    total = 0
+    for name in names:
+        samples = []
+        lock = threading.Lock()
+        per_thread = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+        def worker(n, thread_seed):
+            client = _client(app, fx.admin_id)
+            local = Fixtures.__new__(Fixtures)
+            local.__dict__.update(fx.__dict__, rng=random.Random(thread_seed))
+            for _ in range(warmup):
+                _request(app, client, local, name)
+            mine = [_request(app, client, local, name) for _ in range(n)]
+            with lock:
+                samples.extend(mine)
+
+        scenario_began = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(n, seed + i)) for i, n in enumerate(per_thread) if n]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - scenario_began
+
+        times = [elapsed * 1000 for elapsed, _, _ in samples]
+        results[name] = {
+            'requests': len(samples),
+            'errors': sum(not ok for _, _, ok in samples),
+            **{f'p{p}_ms': round(_percentile(times, p), 2) for p in PERCENTILES},
+            'mean_ms': round(sum(times) / len(times), 2),
+            'queries': round(sum(q for _, q, _ in samples) / len(samples), 1),
+            'max_queries': max(q for _, q, _ in samples),
+            'rps': round(len(samples) / wall, 1),
+        }
+        total += len(samples)
+
+    return {
+        'meta': {'started_at': datetime.utcnow().isoformat(timespec='seconds'), 'commit': _git_commit(),
+                 'dialect': dialect, 'rows': counts, 'requests': requests, 'concurrency': concurrency},
+        'throughput_rps': round(total / (time.perf_counter() - began), 1),
+        'scenarios': results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(results, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(out_dir, f"{stamp}-{results['meta']['commit'] or 'nogit'}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def latest_results(out_dir, exclude=None):
+    """Path of the newest saved run in out_dir (other than `exclude`), or None."""
+    if not os.path.isdir(out_dir):
+        return None
+    runs = sorted(name for name in os.listdir(out_dir) if name.endswith('.json'))
+    runs = [os.path.join(out_dir, name) for name in runs]
+    runs = [path for path in runs if path != exclude]
+    return runs[-1] if runs else None
+
+
+def compare(results, baseline_path):
+    """{scenario: (baseline p95, current p95, % change)} for scenarios in both runs."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    changes = {}
+    for name, current in results['scenarios'].items():
+        before = baseline.get(name)
+        if before and before['p95_ms']:
+            changes[name] = (before['p95_ms'], current['p95_ms'],
+                             round(100 * (current['p95_ms'] - before['p95_ms']) / before['p95_ms'], 1))
+    return changes
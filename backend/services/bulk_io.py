@@ -0,0 +1,456 @@
+import csv
+import io
+import json
+import re
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import String, cast, func, select, text
+from extensions import db
+from models.customer import Customer, normalize_phone
+from models.inventory import Inventory, is_low, price_band_for
+from models.inventory_color import InventoryColor, parse_color_stock
+from models.order import Order, OrderItem
+
+# Bulk CSV/XLSX import and streaming CSV export for customers, inventory and
+# orders.
+#
+# Import reads the upload one row at a time, validates each row, and inserts
+# valid rows BATCH_SIZE at a time with Core (COPY FROM STDIN on Postgres,
+# executemany elsewhere), committing per batch. Bad rows are reported with
+# their line number and skipped. Core inserts skip the mapper events, so the
+# derived data (dashboard metrics, inventory facets) is rebuilt once at the end
+# and no per-row audit logs are written.
+#
+# Export streams rows from a server-side cursor straight into the response, so
+# memory stays flat whatever the table size. The CSV headers are the import
+# headers, so an export can be edited and imported elsewhere. Text cells that
+# a spreadsheet would run as a formula (=, +, -, @ first) are exported with a
+# leading ', which import takes off again.
+
+# openpyxl is optional; without it only CSV uploads are accepted
+try:
+    import openpyxl
+    XLSX_AVAILABLE = True
+except ImportError:
+    openpyxl = None
+    XLSX_AVAILABLE = False
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500  # all rejected rows are counted, only this many listed
+EXPORT_CHUNK = 500
+FORMULA_START = ('=', '+', '-', '@', '\t', '\r')
+ORDER_STATUSES = ['Pending', 'In Progress', 'Ready', 'Delivered', 'Cancelled']
+
+# Alternative spellings seen in branch spreadsheets
+HEADER_ALIASES = {
+    'mobile': 'phone', 'phone_no': 'phone', 'contact': 'phone',
+    'c_o': 'care_of', 'co': 'care_of', 'guardian': 'care_of',
+    'model': 'model_name', 'type': 'frame_type', 'branch': 'shop_branch',
+    'qty': 'quantity', 'cost': 'cost_price', 'price': 'selling_price', 'mrp': 'selling_price',
+    'colors': 'color_stock', 'colours': 'color_stock', 'colour_stock': 'color_stock',
+}
+
+
+# ── Reading uploads ────────────────────────────────────────────────────────────
+def _header_key(name):
+    key = re.sub(r'[^a-z0-9]+', '_', str(name or '').strip().lower()).strip('_')
+    return HEADER_ALIASES.get(key, key)
+
+def _cell(value):
+    # XLSX cells arrive typed; bring them to the text the validators expect
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    value = str(value).strip()
+    # Our own exports quote formula-like text (see _export_cell)
+    if value.startswith("'") and value[1:].startswith(FORMULA_START):
+        return value[1:]
+    return value
+
+def _rows(header, records):
+    keys = [_header_key(h) for h in header]
+    for line_no, values in records:
+        values = [_cell(v) for v in values]
+        if any(values):
+            yield line_no, dict(zip(keys, values))
+
+def _csv_rows(stream):
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = next(reader, None)
+    if not header:
+        return
+    yield from _rows(header, enumerate(reader, start=2))
+
+def _xlsx_rows(stream):
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        records = workbook.active.iter_rows(values_only=True)
+        header = next(records, None)
+        if not header:
+            return
+        yield from _rows(header, enumerate(records, start=2))
+    finally:
+        workbook.close()
+
+def read_rows(stream, filename):
+    """Yields (line number, {column: text}) from a CSV or XLSX file, one row at a time."""
+    filename = (filename or '').lower()
+    if filename.endswith('.xlsx'):
+        if not XLSX_AVAILABLE:
+            raise ValueError('XLSX import needs openpyxl on the server; upload a CSV instead.')
+        return _xlsx_rows(stream)
+    if filename.endswith('.csv'):
+        return _csv_rows(stream)
+    raise ValueError('Upload a .csv or .xlsx file.')
+
+
+# ── Field validation ───────────────────────────────────────────────────────────
+def _text(row, key, max_length, required=False):
+    value = (row.get(key) or '').strip()
+    if not value:
+        if required:
+            raise ValueError(f'{key} is required')
+        return None
+    if len(value) > max_length:
+        raise ValueError(f'{key} is longer than {max_length} characters')
+    return value
+
+def _int(row, key, default=None, minimum=0):
+    value = (row.get(key) or '').strip()
+    if not value:
+        return default
+    try:
+        number = int(Decimal(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'{key} "{value}" is not a whole number')
+    if number < minimum:
+        raise ValueError(f'{key} must be at least {minimum}')
+    return number
+
+def _money(row, key, required=False, default=None):
+    value = (row.get(key) or '').replace(',', '').replace('₹', '').strip()
+    if not value:
+        if required:
+            raise ValueError(f'{key} is required')
+        return default
+    try:
+        amount = Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'{key} "{value}" is not an amount')
+    if amount < 0:
+        raise ValueError(f'{key} cannot be negative')
+    return amount
+
+def _date(row, key):
+    value = (row.get(key) or '').strip()
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'{key} "{value}" is not a date (use YYYY-MM-DD or DD-MM-YYYY)')
+
+
+# ── Batched inserts ────────────────────────────────────────────────────────────
+def _copy_value(value):
+    if value is None:
+        return ''  # unquoted empty field is NULL in COPY's csv format
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)  # JSON / JSONB columns
+    return str(value)
+
+def _copy(connection, table, rows):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    # Same DBAPI connection, so COPY joins the session's transaction
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f'COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def bulk_insert(connection, table, rows, return_ids=False):
+    """Inserts rows (dicts with the same keys). Returns their new ids when asked."""
+    if not rows:
+        return []
+    if connection.dialect.name == 'postgresql':
+        ids = []
+        if return_ids:
+            # COPY can't return ids; take them from the sequence up front
+            ids = connection.execute(
+                text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :n)"),
+                {'table': table.name, 'n': len(rows)}
+            ).scalars().all()
+            rows = [{**row, 'id': new_id} for row, new_id in zip(rows, ids)]
+        _copy(connection, table, rows)
+        return ids
+    if return_ids:
+        result = connection.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows)
+        return [row.id for row in result]
+    connection.execute(table.insert(), rows)
+    return []
+
+
+# ── Customers ──────────────────────────────────────────────────────────────────
+def _parse_customer(lines):
+    line_no, row = lines[0]
+    phone = _text(row, 'phone', 20, required=True)
+    return {
+        'name': _text(row, 'name', 100, required=True),
+        'care_of': _text(row, 'care_of', 100),
+        'phone': phone,
+        # Core insert: @validates doesn't run, so derive the search key here
+        'phone_normalized': normalize_phone(phone),
+    }
+
+def _write_customers(connection, batch, result, user_id):
+    bulk_insert(connection, Customer.__table__, [parsed for line_no, parsed in batch])
+    result['imported'] += len(batch)
+
+
+# ── Inventory ──────────────────────────────────────────────────────────────────
+def _parse_inventory(lines):
+    line_no, row = lines[0]
+    colors = parse_color_stock(row.get('color_stock'))
+    threshold = _int(row, 'low_stock_threshold', default=5)
+    # Per-colour items: quantity is the sum of the colours, as in the edit form
+    quantity = sum(colors.values()) if colors else _int(row, 'quantity', default=0)
+    selling_price = _money(row, 'selling_price', required=True)
+    item = {
+        'model_name': _text(row, 'model_name', 100, required=True),
+        'brand': _text(row, 'brand', 50),
+        'frame_type': _text(row, 'frame_type', 50),
+        'location': _text(row, 'location', 100, required=True),
+        'shop_branch': _text(row, 'shop_branch', 100),
+        'cost_price': _money(row, 'cost_price', required=True),
+        'selling_price': selling_price,
+        'price_band': price_band_for(selling_price),
+        'quantity': quantity,
+        'low_stock_threshold': threshold,
+        'is_low_stock': is_low(quantity, threshold),
+        'version': 1,
+    }
+    return {'item': item, 'colors': colors}
+
+def _write_inventory(connection, batch, result, user_id):
+    parsed = [p for line_no, p in batch]
+    need_ids = any(p['colors'] for p in parsed)
+    ids = bulk_insert(connection, Inventory.__table__, [p['item'] for p in parsed], return_ids=need_ids)
+    if need_ids:
+        color_rows = [{'inventory_id': item_id, 'color': color, 'quantity': qty}
+                      for item_id, p in zip(ids, parsed) for color, qty in p['colors'].items()]
+        bulk_insert(connection, InventoryColor.__table__, color_rows)
+    result['imported'] += len(batch)
+
+
+# ── Orders (one CSV row per order line; consecutive rows share an order_no) ────
+def _group_orders(rows):
+    group, group_no = [], None
+    for line_no, row in rows:
+        order_no = (row.get('order_no') or '').strip()
+        if group and (not order_no or order_no != group_no):
+            yield group
+            group = []
+        group.append((line_no, row))
+        group_no = order_no
+    if group:
+        yield group
+
+def _parse_order(lines):
+    line_no, row = lines[0]
+    status = (row.get('status') or 'Pending').strip()
+    matched = [s for s in ORDER_STATUSES if s.lower() == status.lower()]
+    if not matched:
+        raise ValueError(f'status "{status}" is not one of {", ".join(ORDER_STATUSES)}')
+    discount = _money(row, 'discount', default=Decimal('0.00'))
+
+    items = []
+    for item_line, item_row in lines:
+        if not any(item_row.get(key) for key in ('item_description', 'item_quantity', 'item_unit_price')):
+            continue
+        try:
+            items.append({
+                'description': _text(item_row, 'item_description', 255, required=True),
+                'quantity': _int(item_row, 'item_quantity', default=1, minimum=1),
+                'unit_price': _money(item_row, 'item_unit_price', required=True),
+            })
+        except ValueError as e:
+            raise ValueError(f'line {item_line}: {e}')
+
+    subtotal = sum((item['quantity'] * item['unit_price'] for item in items), Decimal('0.00'))
+    order = {
+        'order_no': _text(row, 'order_no', 50) or f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}",
+        'status': matched[0],
+        'delivery_mode': _text(row, 'delivery_mode', 50) or 'Self',
+        'issue_date': _date(row, 'issue_date') or date.today(),
+        'delivery_date': _date(row, 'delivery_date'),
+        'advance_amount': _money(row, 'advance_amount', default=Decimal('0.00')),
+        'discount': discount,
+        'total_amount': _money(row, 'total_amount', default=max(subtotal - discount, Decimal('0.00'))),
+    }
+    phone = normalize_phone(_text(row, 'customer_phone', 20, required=True))
+    return {'order': order, 'items': items, 'phone': phone}
+
+def _write_orders(connection, batch, result, user_id):
+    phones = {p['phone'] for line_no, p in batch}
+    customers = dict(
+        db.session.query(Customer.phone_normalized, func.min(Customer.id))
+        .filter(Customer.phone_normalized.in_(phones))
+        .group_by(Customer.phone_normalized)
+    )
+    numbers = [p['order']['order_no'] for line_no, p in batch]
+    taken = set(db.session.scalars(select(Order.order_no).where(Order.order_no.in_(numbers))))
+
+    orders, items = [], []
+    for line_no, p in batch:
+        order_no = p['order']['order_no']
+        if p['phone'] not in customers:
+            _reject(result, line_no, f'no customer with phone {p["phone"]}; import customers first')
+            continue
+        if order_no in taken:
+            _reject(result, line_no, f'order {order_no} already exists')
+            continue
+        taken.add(order_no)
+        orders.append({**p['order'], 'customer_id': customers[p['phone']], 'created_by': user_id})
+        items.append(p['items'])
+
+    ids = bulk_insert(connection, Order.__table__, orders, return_ids=True)
+    item_rows = [{**item, 'order_id': order_id, 'inventory_id': None, 'color': None}
+                 for order_id, order_items in zip(ids, items) for item in order_items]
+    bulk_insert(connection, OrderItem.__table__, item_rows)
+    result['imported'] += len(orders)
+
+
+# ── Import driver ──────────────────────────────────────────────────────────────
+def _after_customers():
+    from services.metrics_service import rebuild_metrics
+    rebuild_metrics()
+
+def _after_inventory():
+    from services.facet_service import rebuild_facets
+    from services.metrics_service import rebuild_metrics
+    rebuild_facets()
+    rebuild_metrics()
+
+IMPORTERS = {
+    'customers': {'parse': _parse_customer, 'write': _write_customers, 'after': _after_customers,
+                  'columns': ['name', 'care_of', 'phone']},
+    'inventory': {'parse': _parse_inventory, 'write': _write_inventory, 'after': _after_inventory,
+                  'columns': ['model_name', 'brand', 'frame_type', 'location', 'shop_branch', 'quantity',
+                              'color_stock', 'cost_price', 'selling_price', 'low_stock_threshold']},
+    'orders': {'parse': _parse_order, 'write': _write_orders, 'after': _after_customers, 'group': _group_orders,
+               'columns': ['order_no', 'customer_phone', 'status', 'issue_date', 'delivery_date', 'delivery_mode',
+                           'discount', 'advance_amount', 'total_amount',
+                           'item_description', 'item_quantity', 'item_unit_price']},
+}
+
+def _reject(result, line_no, message):
+    result['rejected'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append((line_no, message))
+
+def _flush(importer, batch, result, user_id):
+    if not batch:
+        return
+    importer['write'](db.session.connection(), batch, result, user_id)
+    db.session.commit()
+    result['batches'] += 1
+
+def import_rows(entity, rows, user_id=None, batch_size=BATCH_SIZE):
+    """
+    Validates and inserts rows from read_rows(). Returns a dict with
+    imported / rejected counts and [(line number, error)] for rejected rows.
+    """
+    importer = IMPORTERS[entity]
+    result = {'entity': entity, 'imported': 0, 'rejected': 0, 'batches': 0, 'errors': []}
+    groups = importer['group'](rows) if 'group' in importer else ([line] for line in rows)
+
+    batch = []
+    try:
+        for lines in groups:
+            try:
+                batch.append((lines[0][0], importer['parse'](lines)))
+            except ValueError as e:
+                _reject(result, lines[0][0], str(e))
+                continue
+            if len(batch) >= batch_size:
+                _flush(importer, batch, result, user_id)
+                batch = []
+        _flush(importer, batch, result, user_id)
+    finally:
+        # Batches already committed stay, so rebuild even if a later one failed
+        if result['imported']:
+            db.session.rollback()
+            importer['after']()
+    return result
+
+
+# ── Export ─────────────────────────────────────────────────────────────────────
+def _color_stock_column():
+    color_text = InventoryColor.color + '-' + cast(InventoryColor.quantity, String)
+    if db.engine.dialect.name == 'postgresql':
+        joined = func.string_agg(color_text, ', ')
+    else:
+        joined = func.group_concat(color_text, ', ')
+    return select(joined).where(InventoryColor.inventory_id == Inventory.id).scalar_subquery()
+
+def _export_statement(entity):
+    if entity == 'customers':
+        return select(Customer.id, Customer.name, Customer.care_of, Customer.phone,
+                      Customer.created_at, Customer.updated_at).order_by(Customer.id)
+    if entity == 'inventory':
+        return select(
+            Inventory.id, Inventory.model_name, Inventory.brand, Inventory.frame_type, Inventory.location,
+            Inventory.shop_branch, Inventory.quantity,
+            func.coalesce(_color_stock_column(), Inventory.color_stock).label('color_stock'),
+            Inventory.cost_price, Inventory.selling_price, Inventory.low_stock_threshold,
+        ).order_by(Inventory.id)
+    if entity == 'orders':
+        return (select(
+            Order.order_no, Customer.name.label('customer_name'), Customer.phone.label('customer_phone'),
+            Order.status, Order.issue_date, Order.delivery_date, Order.delivery_mode,
+            Order.discount, Order.advance_amount, Order.total_amount,
+            OrderItem.description.label('item_description'), OrderItem.quantity.label('item_quantity'),
+            OrderItem.unit_price.label('item_unit_price'),
+        )
+            .join(Customer, Customer.id == Order.customer_id)
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .order_by(Order.id, OrderItem.id))
+    raise KeyError(entity)
+
+def _export_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_START):
+        return "'" + value  # shown as text, not run (CSV formula injection)
+    return value
+
+def export_csv(entity):
+    """Generator of CSV text chunks for the whole table, streamed from a server-side cursor."""
+    statement = _export_statement(entity)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_CHUNK))
+    writer.writerow(result.keys())
+    for rows in result.partitions():
+        writer.writerows([_export_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
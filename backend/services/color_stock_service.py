@@ -0,0 +1,118 @@
+from flask import current_app
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, contains_eager
+from extensions import db
+from models.inventory import Inventory
+from models.inventory_color import InventoryColor, parse_color_stock
+
+# Per-colour stock lives in inventory_colors (inventory_id, color, quantity).
+# For an item with colour rows, Inventory.quantity is their sum, recomputed in
+# before_flush whenever the rows change, so it can't drift from the colours
+# (and the metrics/facet/audit listeners see an ordinary quantity update).
+# Items without colour rows keep a hand-entered quantity.
+
+
+def register_color_stock_listeners():
+    # create_app() may run more than once per process
+    if event.contains(Session, 'before_flush', sync_inventory_quantity):
+        return
+    event.listen(Session, 'before_flush', sync_inventory_quantity)
+
+
+def sync_inventory_quantity(session, flush_context, instances):
+    items = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, InventoryColor) and obj.inventory is not None:
+            items.add(obj.inventory)
+        elif isinstance(obj, Inventory) and 'colors' in inspect(obj).dict:
+            # Only when the collection is already loaded; otherwise it can't have changed
+            items.add(obj)
+
+    for item in items:
+        if item in session.deleted:
+            continue
+        colors = [c for c in item.colors if c not in session.deleted]
+        if not colors:
+            continue
+        total = sum(c.quantity or 0 for c in colors)
+        if item.quantity != total:
+            item.quantity = total
+
+
+def set_item_colors(item, stock):
+    """Makes item.colors match {color: qty}, updating rows in place so ids stay stable."""
+    existing = {c.color: c for c in item.colors}
+    for color, quantity in stock.items():
+        if color in existing:
+            if existing[color].quantity != quantity:
+                existing[color].quantity = quantity
+        else:
+            item.colors.append(InventoryColor(color=color, quantity=quantity))
+    for color, row in existing.items():
+        if color not in stock:
+            item.colors.remove(row)
+
+
+# ── Lookups ────────────────────────────────────────────────────────────────────
+def colors_in_stock(model_name, shop_branch=None):
+    """[(color, qty)] of a model that are in stock, summed across matching inventory rows."""
+    query = (db.session.query(InventoryColor.color, func.sum(InventoryColor.quantity))
+             .join(Inventory, Inventory.id == InventoryColor.inventory_id)
+             .filter(Inventory.model_name == model_name, InventoryColor.quantity > 0))
+    if shop_branch:
+        query = query.filter(Inventory.shop_branch == shop_branch)
+    return query.group_by(InventoryColor.color).order_by(InventoryColor.color).all()
+
+def low_stock_colors(threshold=None, color=None, limit=100):
+    """Colour rows at or below `threshold` (COLOR_LOW_STOCK_THRESHOLD), lowest first."""
+    if threshold is None:
+        threshold = current_app.config.get('COLOR_LOW_STOCK_THRESHOLD', 2)
+    query = (InventoryColor.query
+             .join(Inventory, Inventory.id == InventoryColor.inventory_id)
+             .options(contains_eager(InventoryColor.inventory))
+             .filter(InventoryColor.quantity <= threshold))
+    if color:
+        query = query.filter(InventoryColor.color == color.strip().lower())
+    return query.order_by(InventoryColor.quantity, InventoryColor.color, InventoryColor.id).limit(limit).all()
+
+
+# ── Migration from the free-text column ────────────────────────────────────────
+def migrate_color_stock(batch_size=200):
+    """
+    Parses Inventory.color_stock into inventory_colors rows and clears the text.
+    Entries that can't be parsed are left in place and reported.
+    Returns (items migrated, [(id, model, old qty, new qty)], [(id, model, error)]).
+    """
+    migrated = 0
+    adjusted, failed = [], []
+    last_id = 0
+
+    while True:
+        items = (Inventory.query
+                 .filter(Inventory.id > last_id,
+                         Inventory.color_stock.isnot(None),
+                         ~Inventory.colors.any())
+                 .order_by(Inventory.id)
+                 .limit(batch_size)
+                 .all())
+        if not items:
+            break
+
+        for item in items:
+            try:
+                stock = parse_color_stock(item.color_stock)
+            except ValueError as e:
+                failed.append((item.id, item.model_name, str(e)))
+                continue
+            before = item.quantity
+            set_item_colors(item, stock)
+            item.color_stock = None
+            db.session.flush()
+            if stock and before != item.quantity:
+                adjusted.append((item.id, item.model_name, before, item.quantity))
+            migrated += 1
+
+        last_id = items[-1].id
+        db.session.commit()
+
+    return migrated, adjusted, failed
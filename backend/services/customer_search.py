@@ -0,0 +1,169 @@
+import re
+from sqlalchemy import bindparam, func, or_, text, Integer
+from extensions import db
+from models.customer import Customer, normalize_phone
+
+# Customer search backed by real indexes instead of ilike('%q%') scans.
+#   Postgres: pg_trgm GIN indexes on name / care_of / phone_normalized, which
+#             serve ILIKE '%q%' directly and give similarity() for ranking.
+#   SQLite:   an FTS5 external-content table (trigram tokenizer) kept in sync
+#             with customers by triggers.
+# `flask setup-customer-search` creates either and backfills phone_normalized.
+# Until it has run, searches fall back to the plain ilike filters.
+
+MIN_TERM = 3  # trigram indexes can't serve shorter terms
+PHONE_LIKE = re.compile(r'^[\d\s+()-]+$')
+
+_index_ready = False
+
+
+# ── Setup ──────────────────────────────────────────────────────────────────────
+POSTGRES_SETUP = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_customers_name_trgm ON customers USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_customers_care_of_trgm ON customers USING gin (care_of gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_customers_phone_trgm ON customers USING gin (phone_normalized gin_trgm_ops)',
+]
+
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+        name, care_of, phone_normalized,
+        content='customers', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts (rowid, name, care_of, phone_normalized)
+        VALUES (new.id, new.name, new.care_of, new.phone_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_fts (customers_fts, rowid, name, care_of, phone_normalized)
+        VALUES ('delete', old.id, old.name, old.care_of, old.phone_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE ON customers BEGIN
+        INSERT INTO customers_fts (customers_fts, rowid, name, care_of, phone_normalized)
+        VALUES ('delete', old.id, old.name, old.care_of, old.phone_normalized);
+        INSERT INTO customers_fts (rowid, name, care_of, phone_normalized)
+        VALUES (new.id, new.name, new.care_of, new.phone_normalized);
+    END""",
+]
+
+def backfill_phone_normalized(batch_size=1000):
+    """Fills phone_normalized for rows written before the column existed."""
+    updated = 0
+    while True:
+        rows = (db.session.query(Customer.id, Customer.phone)
+                .filter(Customer.phone_normalized.is_(None))
+                .limit(batch_size).all())
+        if not rows:
+            return updated
+        # Core UPDATE: a backfill shouldn't touch updated_at or write audit logs
+        db.session.execute(
+            Customer.__table__.update()
+            .where(Customer.__table__.c.id == bindparam('cid'))
+            .values(phone_normalized=bindparam('norm')),
+            [{'cid': cid, 'norm': normalize_phone(phone)} for cid, phone in rows]
+        )
+        db.session.commit()
+        updated += len(rows)
+
+def setup_search_indexes():
+    global _index_ready
+    backfilled = backfill_phone_normalized()
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        statements = POSTGRES_SETUP
+    elif dialect == 'sqlite':
+        statements = SQLITE_SETUP + ["INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')"]
+    else:
+        raise RuntimeError(f'No customer search index for {dialect}.')
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    _index_ready = True
+    return backfilled
+
+def index_ready():
+    # Only a positive answer is cached, so running setup doesn't need a restart
+    global _index_ready
+    if not _index_ready:
+        if db.engine.dialect.name == 'postgresql':
+            sql = "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        else:
+            sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'"
+        _index_ready = db.session.execute(text(sql)).scalar() is not None
+    return _index_ready
+
+
+# ── Query building ─────────────────────────────────────────────────────────────
+def _phone_digits(q):
+    digits = re.sub(r'\D', '', q)
+    # Partially typed '+91 98…' — drop the country code before it's complete
+    if q.strip().startswith('+91'):
+        return digits[2:]
+    return normalize_phone(digits)
+
+def _is_phone(q):
+    return bool(PHONE_LIKE.match(q)) and sum(c.isdigit() for c in q) >= MIN_TERM
+
+def _fts_expression(q):
+    """FTS5 MATCH expression, or None when a term is too short for the trigram index."""
+    if _is_phone(q):
+        digits = _phone_digits(q)
+        return f'phone_normalized : "{digits}"' if len(digits) >= MIN_TERM else None
+    terms = q.split()
+    if not terms or any(len(term) < MIN_TERM for term in terms):
+        return None
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def _like_filter(q):
+    digits = re.sub(r'\D', '', q)
+    if PHONE_LIKE.match(q) and digits:
+        # Phones match on phone_normalized only, short digit runs included
+        return Customer.phone_normalized.like(f'%{_phone_digits(q) if _is_phone(q) else digits}%')
+    # No phone term: a phone can't contain the letters, and an OR on the raw
+    # phone column would keep Postgres from combining the trigram indexes
+    pattern = f'%{q}%'
+    return or_(
+        Customer.name.ilike(pattern),
+        Customer.care_of.ilike(pattern),
+    )
+
+def _fts_ids(expression, limit=None):
+    sql = 'SELECT rowid FROM customers_fts WHERE customers_fts MATCH :q ORDER BY rank'
+    params = {'q': expression}
+    if limit:
+        sql += ' LIMIT :k'
+        params['k'] = limit
+    return text(sql).bindparams(**params)
+
+def search_filter(q):
+    """WHERE clause for the customer list search."""
+    q = q.strip()
+    if db.engine.dialect.name == 'sqlite' and index_ready():
+        expression = _fts_expression(q)
+        if expression:
+            return Customer.id.in_(_fts_ids(expression).columns(rowid=Integer))
+    # Postgres: the trigram GIN indexes serve these ILIKE / LIKE filters as-is
+    return _like_filter(q)
+
+def typeahead(q, limit=8):
+    """Top `limit` customers for a partially typed name, care-of or phone."""
+    q = q.strip()
+    if len(q) < 2:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and index_ready():
+        expression = _fts_expression(q)
+        if expression:
+            ids = [row[0] for row in db.session.execute(_fts_ids(expression, limit))]
+            by_id = {c.id: c for c in Customer.query.filter(Customer.id.in_(ids)).all()} if ids else {}
+            return [by_id[i] for i in ids if i in by_id]
+
+    query = Customer.query.filter(_like_filter(q))
+    if dialect == 'postgresql' and index_ready() and not _is_phone(q):
+        # Also catch typos ('Rajsh' finds 'Rajesh') and rank by closeness
+        query = Customer.query.filter(or_(_like_filter(q), Customer.name.op('%')(q)))
+        query = query.order_by(func.similarity(Customer.name, q).desc())
+    else:
+        query = query.order_by(Customer.updated_at.desc())
+    return query.limit(limit).all()
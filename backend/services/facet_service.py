@@ -0,0 +1,162 @@
+from sqlalchemy import bindparam, event, func, inspect, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models.inventory import Inventory, PRICE_BANDS, price_band_for
+from models.inventory_facet import InventoryFacetCount
+
+# Inventory facets (brand, frame type, branch, price band). Counts come from
+# inventory_facet_counts, one row per combination of facet values, kept up to
+# date by the Inventory mapper events below. Any facet's count under the other
+# selected filters is a GROUP BY over that small table, never over inventory
+# itself. `flask rebuild-inventory-facets` recomputes it.
+#
+# Only facets with few distinct values belong here: every extra facet
+# multiplies the combinations. Location (rack/drawer) has nearly one value per
+# item, so it is shown in the list but not offered as a facet.
+
+FACETS = ['brand', 'frame_type', 'shop_branch', 'price_band']
+FACET_LABELS = {
+    'brand': 'Brand',
+    'frame_type': 'Frame Type',
+    'shop_branch': 'Branch',
+    'price_band': 'Price',
+}
+PRICE_BAND_LABELS = {key: label for key, label, lower in PRICE_BANDS}
+PRICE_BAND_ORDER = [key for key, label, lower in PRICE_BANDS]
+
+facet_table = InventoryFacetCount.__table__
+
+
+def register_facet_listeners():
+    # create_app() may run more than once per process; never double-count
+    if event.contains(Inventory, 'after_insert', inventory_inserted):
+        return
+    event.listen(Inventory, 'after_insert', inventory_inserted)
+    event.listen(Inventory, 'after_update', inventory_updated)
+    event.listen(Inventory, 'after_delete', inventory_deleted)
+
+
+def _combo(values):
+    return {facet: values.get(facet) or '' for facet in FACETS}
+
+def _current(target):
+    return _combo({facet: getattr(target, facet) for facet in FACETS})
+
+def _previous(target):
+    state = inspect(target)
+    values = {}
+    for facet in FACETS:
+        history = state.attrs[facet].history
+        values[facet] = history.deleted[0] if history.deleted else getattr(target, facet)
+    return _combo(values)
+
+def _bump(connection, combo, delta):
+    # Upsert: item_count = item_count + delta, creating the combination if new
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        connection.execute(
+            insert(facet_table)
+            .values(**combo, item_count=delta)
+            .on_conflict_do_update(index_elements=FACETS,
+                                   set_={'item_count': facet_table.c.item_count + delta})
+        )
+        return
+
+    match = [facet_table.c[facet] == value for facet, value in combo.items()]
+    result = connection.execute(
+        facet_table.update().where(*match).values(item_count=facet_table.c.item_count + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(facet_table.insert().values(**combo, item_count=delta))
+
+
+def inventory_inserted(mapper, connection, target):
+    _bump(connection, _current(target), 1)
+
+def inventory_updated(mapper, connection, target):
+    before, after = _previous(target), _current(target)
+    if before != after:
+        _bump(connection, before, -1)
+        _bump(connection, after, 1)
+
+def inventory_deleted(mapper, connection, target):
+    _bump(connection, _previous(target), -1)
+
+
+# ── Read ───────────────────────────────────────────────────────────────────────
+def filter_inventory(query, selected):
+    """Applies the selected facet values ({facet: value}) to an Inventory query."""
+    for facet, value in selected.items():
+        query = query.filter(getattr(Inventory, facet) == value)
+    return query
+
+def facet_counts(selected):
+    """
+    {facet: [(value, label, count), ...]} where each facet is counted under the
+    other selected filters, so picking a brand still lists every other brand.
+    One query: a GROUP BY per facet over the combinations table, UNION ALL'd.
+    """
+    counts = []
+    for facet in FACETS:
+        column = facet_table.c[facet]
+        others = [facet_table.c[name] == value for name, value in selected.items() if name != facet]
+        counts.append(
+            select(literal(facet).label('facet'), column.label('value'),
+                   func.sum(facet_table.c.item_count).label('item_count'))
+            .where(facet_table.c.item_count > 0, column != '', *others)
+            .group_by(column)
+        )
+    values = {facet: {} for facet in FACETS}
+    for facet, value, count in db.session.execute(union_all(*counts)):
+        values[facet][value] = int(count)
+
+    result = {}
+    for facet in FACETS:
+        found = values[facet]
+        if facet == 'price_band':
+            keys = [key for key in PRICE_BAND_ORDER if key in found]
+            result[facet] = [(key, PRICE_BAND_LABELS[key], found[key]) for key in keys]
+        else:
+            keys = sorted(found, key=lambda v: (-found[v], v.lower()))
+            result[facet] = [(key, key, found[key]) for key in keys]
+    return result
+
+
+# ── Rebuild ────────────────────────────────────────────────────────────────────
+def rebuild_facets():
+    """Recomputes inventory_facet_counts from inventory. Returns the number of combinations."""
+    backfill_price_bands()
+    # Recreated when its columns changed (location was dropped from the key)
+    existing = {column['name'] for column in inspect(db.engine).get_columns(facet_table.name)}
+    if existing != set(facet_table.c.keys()):
+        db.session.commit()
+        facet_table.drop(db.engine, checkfirst=True)
+        facet_table.create(db.engine)
+    columns = [func.coalesce(getattr(Inventory, facet), '').label(facet) for facet in FACETS]
+    rows = db.session.query(*columns, func.count().label('item_count')).group_by(*columns).all()
+
+    db.session.execute(facet_table.delete())
+    if rows:
+        db.session.execute(facet_table.insert(), [row._asdict() for row in rows])
+    db.session.commit()
+    return len(rows)
+
+def backfill_price_bands(batch_size=1000):
+    """Sets price_band for inventory rows written before the column existed."""
+    updated = 0
+    while True:
+        rows = (db.session.query(Inventory.id, Inventory.selling_price)
+                .filter(Inventory.price_band.is_(None))
+                .limit(batch_size).all())
+        if not rows:
+            return updated
+        # Core UPDATE: a backfill shouldn't touch updated_at or write audit logs
+        db.session.execute(
+            Inventory.__table__.update()
+            .where(Inventory.__table__.c.id == bindparam('item_id'))
+            .values(price_band=bindparam('band')),
+            [{'item_id': item_id, 'band': price_band_for(price) or ''} for item_id, price in rows]
+        )
+        db.session.commit()
+        updated += len(rows)
@@ -0,0 +1,129 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+# Prescription images stored by content: the sha256 of the uploaded bytes
+# names the files, so uploading the same photo twice stores it once.
+#
+#   <PRESCRIPTION_IMAGE_DIR>/ab/abcdef...           original, as uploaded
+#   <PRESCRIPTION_IMAGE_DIR>/ab/abcdef....web.jpg   long side WEB_SIZE, for the view page
+#   <PRESCRIPTION_IMAGE_DIR>/ab/abcdef....thumb.jpg long side THUMB_SIZE, for lists
+#
+# The copies are made once at upload. Files never change under a name, so
+# prescription.image serves them with a strong ETag (the hash) and a one
+# year immutable cache lifetime. Prescriptions point at images through
+# Prescription.image_hash; files no prescription points at any more are
+# removed by `flask cleanup-prescription-images` once they are older than its
+# grace period. Deleting a prescription leaves its file to that sweep: an
+# upload of the same photo may be committing a new reference at that moment.
+#
+# Pillow makes the copies. Without it only the original is kept and served
+# for every size.
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+WEB_SIZE = 1600
+THUMB_SIZE = 320
+VARIANTS = {'original': '', 'web': '.web.jpg', 'thumb': '.thumb.jpg'}
+SIGNATURES = [(b'\xff\xd8\xff', 'image/jpeg'), (b'\x89PNG\r\n\x1a\n', 'image/png')]
+
+settings = {'root': 'uploads/prescriptions'}
+
+
+def configure(app):
+    settings['root'] = app.config.get('PRESCRIPTION_IMAGE_DIR') or settings['root']
+
+
+def _dir(digest):
+    return os.path.join(settings['root'], digest[:2])
+
+def path_for(digest, variant='original'):
+    """File for a stored image; falls back to the original if the copy wasn't made."""
+    path = os.path.join(_dir(digest), digest + VARIANTS[variant])
+    if variant != 'original' and not os.path.exists(path):
+        return path_for(digest)
+    return path
+
+def mimetype(path):
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    return next((mime for signature, mime in SIGNATURES if head.startswith(signature)), 'application/octet-stream')
+
+def _write(path, data):
+    # Write to a temp file and rename, so a reader never sees half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _resized(image, size):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def save_image(data):
+    """Stores uploaded image bytes; returns their hash. Known images aren't written again."""
+    digest = hashlib.sha256(data).hexdigest()
+    original = os.path.join(_dir(digest), digest)
+    if os.path.exists(original):
+        os.utime(original)  # fresh again, so cleanup's grace period covers the new prescription
+        return digest
+
+    os.makedirs(_dir(digest), exist_ok=True)
+    if PILLOW_AVAILABLE:
+        try:
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))  # phone photos: apply the rotation tag
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            _write(original + VARIANTS['web'], _resized(image, WEB_SIZE))
+            _write(original + VARIANTS['thumb'], _resized(image, THUMB_SIZE))
+        except (OSError, Image.DecompressionBombError):
+            pass  # not decodable: keep the file anyway, served as-is for every size
+    # Original last: its presence means the copies are done
+    _write(original, data)
+    return digest
+
+
+def remove_image(digest):
+    for suffix in VARIANTS.values():
+        path = os.path.join(_dir(digest), digest + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def stored_hashes():
+    """{hash: modified time of the original} for everything in the store."""
+    found = {}
+    if not os.path.isdir(settings['root']):
+        return found
+    for prefix in os.listdir(settings['root']):
+        folder = os.path.join(settings['root'], prefix)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if len(name) == 64 and '.' not in name:
+                found[name] = os.path.getmtime(os.path.join(folder, name))
+    return found
+
+
+def cleanup_orphans(referenced, grace_seconds=3600, dry_run=False):
+    """
+    Removes stored images not in `referenced` (a set of hashes). Images newer
+    than the grace period are kept: their prescription may not be committed yet.
+    Returns the hashes removed.
+    """
+    cutoff = time.time() - grace_seconds
+    orphans = [digest for digest, mtime in stored_hashes().items() if digest not in referenced and mtime < cutoff]
+    if not dry_run:
+        for digest in orphans:
+            remove_image(digest)
+    return orphans
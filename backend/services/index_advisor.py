@@ -0,0 +1,222 @@
+import json
+import re
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from extensions import db
+from services.query_stats import explain
+
+# Indexes for the hot query paths.
+#
+# The models declare them (see __table_args__ in models/), so new databases
+# and `flask db migrate` get them. `flask create-indexes` builds the ones an
+# existing database is missing; on Postgres with CONCURRENTLY, so writes
+# aren't blocked while it runs.
+#
+# `flask index-advisor WORKLOAD.json` replays a captured workload (the JSON
+# from `flask benchmark --sql-stats`, or /audit/queries.json with
+# SQL_STATS_PARAMETERS=1 so bind values are kept) and reports:
+#   - candidate indexes that would help: missing declared indexes, plus one
+#     guessed per table scan from the statement's equality, range and ORDER
+#     BY columns. Each candidate is created inside a transaction, the
+#     statements on its table replayed, and the index dropped again, so the
+#     gain is measured, not estimated;
+#   - indexes no replayed plan used (and on Postgres, with no scans since
+#     the last stats reset).
+# Run it against a seeded copy (`flask seed-synthetic`), not production:
+# building a candidate locks its table against writes for the duration.
+
+SQLITE_INDEX_USE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+POSTGRES_INDEX_USE = re.compile(r'(?:Index(?: Only)? Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*INDEX)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+ORDER_BY = re.compile(r'\bORDER BY (.*?)(?:\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|$)', re.IGNORECASE)
+WHERE = re.compile(r'\bWHERE (.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', re.IGNORECASE)
+
+
+# ── Shipped indexes ────────────────────────────────────────────────────────────
+def _existing_indexes(inspector, table):
+    return {index['name']: tuple(index['column_names']) for index in inspector.get_indexes(table)}
+
+def missing_indexes():
+    """Indexes declared on the models that the database doesn't have: [Index]."""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = _existing_indexes(inspector, table.name)
+        missing.extend(index for index in sorted(table.indexes, key=lambda i: i.name) if index.name not in existing)
+    return missing
+
+def _create_sql(index, dialect, concurrently=False):
+    sql = str(CreateIndex(index).compile(dialect=dialect))
+    keyword = 'CREATE UNIQUE INDEX' if index.unique else 'CREATE INDEX'
+    return sql.replace(keyword, f"{keyword}{' CONCURRENTLY' if concurrently else ''} IF NOT EXISTS", 1)
+
+def create_missing_indexes(dry_run=False):
+    """Creates the missing declared indexes; returns their CREATE statements."""
+    from services.audit_retention import is_partitioned
+    dialect = db.engine.dialect
+    statements = []
+    for index in missing_indexes():
+        # CONCURRENTLY needs autocommit, and isn't supported on a partitioned parent
+        concurrently = dialect.name == 'postgresql' and not (index.table.name == 'audit_logs' and is_partitioned())
+        statements.append(_create_sql(index, dialect, concurrently))
+    db.session.rollback()
+    if not dry_run:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for sql in statements:
+                connection.execute(text(sql))
+    return statements
+
+
+# ── Workload replay ────────────────────────────────────────────────────────────
+def load_workload(path):
+    """Replayable statements from a query_stats dump: [{fingerprint, statement, parameters, calls}]."""
+    with open(path) as f:
+        data = json.load(f)
+    workload = []
+    for entry in data.get('statements', []):
+        statement, parameters = entry.get('statement'), entry.get('parameters')
+        # Reads only: replaying a write would change the data being measured
+        if not statement or parameters is None or not statement.lstrip('( ').upper().startswith(('SELECT', 'WITH')):
+            continue
+        if isinstance(parameters, list):
+            parameters = tuple(parameters)
+        workload.append({'fingerprint': entry['fingerprint'], 'statement': statement,
+                         'parameters': parameters, 'calls': entry.get('calls', 1)})
+    return workload
+
+def _run(connection, entry, repeat):
+    # Best of `repeat`: the first run may still be reading pages from disk
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.exec_driver_sql(entry['statement'], entry['parameters']).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _indexes_used(plan, dialect):
+    pattern = SQLITE_INDEX_USE if dialect == 'sqlite' else POSTGRES_INDEX_USE
+    return {name for line in plan for name in pattern.findall(line)}
+
+def _scanned_tables(plan, dialect):
+    if dialect == 'sqlite':
+        return {m.group(1) for line in plan for m in [SQLITE_SCAN.match(line.strip())] if m}
+    return {name for line in plan for name in POSTGRES_SCAN.findall(line)}
+
+def _guess_columns(statement, table, columns):
+    """Equality columns, then one range column, then ORDER BY columns of `table` (at most 3)."""
+    where = WHERE.search(statement)
+    where = where.group(1) if where else ''
+    equal, ranged = [], []
+    for column, op in re.findall(rf'\b{table}\.(\w+)\s*(=|IN\b|IS\b|>=|<=|>|<)', where, re.IGNORECASE):
+        (equal if op.upper() in ('=', 'IN', 'IS') else ranged).append(column)
+    order = ORDER_BY.search(statement)
+    ordered = re.findall(rf'\b{table}\.(\w+)', order.group(1)) if order else []
+    picked = []
+    for column in equal + ranged[:1] + ordered:
+        if column in columns and column not in picked:
+            picked.append(column)
+    return tuple(picked[:3])
+
+
+def _candidates(workload, baseline, inspector, dialect):
+    """{(table, columns): name} to try: missing declared indexes and guesses from table scans."""
+    candidates = {}
+    for index in missing_indexes():
+        candidates[(index.table.name, tuple(c.name for c in index.columns))] = index.name
+    for entry in workload:
+        for table in _scanned_tables(baseline[entry['fingerprint']]['plan'], dialect):
+            if table not in db.metadata.tables:
+                continue
+            columns = _guess_columns(entry['statement'], table, db.metadata.tables[table].c.keys())
+            existing = _existing_indexes(inspector, table).values()
+            if columns and not any(index[:len(columns)] == columns for index in existing):
+                candidates.setdefault((table, columns), f"ix_{table}_{'_'.join(columns)}")
+    return candidates
+
+def _try_index(connection, name, table, columns, workload, repeat, dialect):
+    """Replays `workload` with the index in place; {fingerprint: (ms, plan)}."""
+    quoted = ', '.join(connection.dialect.identifier_preparer.quote(c) for c in columns)
+    results = {}
+    transaction = connection.begin()
+    try:
+        connection.exec_driver_sql(f'CREATE INDEX {name} ON {table} ({quoted})')
+        if dialect == 'postgresql':
+            connection.exec_driver_sql(f'ANALYZE {table}')
+        for entry in workload:
+            results[entry['fingerprint']] = (_run(connection, entry, repeat),
+                                             explain(connection, entry['statement'], entry['parameters']))
+    finally:
+        transaction.rollback()
+        # SQLite's driver commits DDL on its own, so the rollback may not have removed it
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+        if connection.in_transaction():
+            connection.commit()
+    return results
+
+
+def advise(workload, repeat=3, min_gain_pct=10):
+    """
+    {'statements': [...], 'helpful': [...], 'unused': [...]} for a workload
+    from load_workload (see the module comment).
+    """
+    dialect = db.engine.dialect.name
+    inspector = inspect(db.engine)
+    with db.engine.connect() as connection:
+        baseline = {}
+        for entry in workload:
+            ms = _run(connection, entry, repeat)
+            baseline[entry['fingerprint']] = {'ms': ms, 'plan': explain(connection, entry['statement'], entry['parameters'])}
+        connection.rollback()
+
+        helpful = []
+        for (table, columns), name in _candidates(workload, baseline, inspector, dialect).items():
+            affected = [entry for entry in workload if f'{table}.' in entry['statement'] or f' {table} ' in entry['statement']]
+            if not affected:
+                continue
+            after = _try_index(connection, name, table, columns, affected, repeat, dialect)
+            gains = []
+            for entry in affected:
+                before_ms = baseline[entry['fingerprint']]['ms']
+                after_ms, plan = after[entry['fingerprint']]
+                if name in _indexes_used(plan, dialect) and before_ms > 0:
+                    gain = 100 * (before_ms - after_ms) / before_ms
+                    if gain >= min_gain_pct:
+                        gains.append({'fingerprint': entry['fingerprint'], 'before_ms': round(before_ms, 2),
+                                      'after_ms': round(after_ms, 2), 'gain_pct': round(gain),
+                                      'saved_ms': round((before_ms - after_ms) * entry['calls'], 1)})
+            if gains:
+                helpful.append({'name': name, 'table': table, 'columns': list(columns),
+                                'saved_ms': round(sum(g['saved_ms'] for g in gains), 1),
+                                'statements': gains})
+    helpful.sort(key=lambda candidate: candidate['saved_ms'], reverse=True)
+
+    used = set()
+    for result in baseline.values():
+        used |= _indexes_used(result['plan'], dialect)
+    scans = _index_scans() if dialect == 'postgresql' else {}
+    unused = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in inspector.get_table_names():
+            continue
+        for index in inspector.get_indexes(table.name):
+            if index['name'] not in used and not index.get('unique'):
+                unused.append({'name': index['name'], 'table': table.name, 'columns': index['column_names'],
+                               'scans': scans.get(index['name'])})
+
+    statements = [{'fingerprint': entry['fingerprint'], 'calls': entry['calls'],
+                   'ms': round(baseline[entry['fingerprint']]['ms'], 2), 'plan': baseline[entry['fingerprint']]['plan']}
+                  for entry in workload]
+    return {'statements': statements, 'helpful': helpful, 'unused': unused}
+
+
+def _index_scans():
+    """Postgres: {index: scans since the last stats reset} from pg_stat_user_indexes."""
+    rows = db.session.execute(text('SELECT indexrelname, idx_scan FROM pg_stat_user_indexes')).all()
+    db.session.rollback()
+    return {name: scans for name, scans in rows}
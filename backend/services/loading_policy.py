@@ -0,0 +1,35 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models.audit_log import AuditLog
+from models.inventory import Inventory
+from models.order import Order, OrderItem
+from models.prescription import Prescription
+
+# Relationships each view's template touches, loaded up front so a page of rows
+# costs one SELECT instead of one per row.
+#   - many-to-one (order.customer, log.user): joinedload, same round trip
+#   - one-to-many (order.items): selectinload, one extra IN (...) query
+LOADING_POLICIES = {
+    'order.index': lambda: [joinedload(Order.customer)],
+    'order.view': lambda: [
+        joinedload(Order.customer),
+        joinedload(Order.prescription),
+        selectinload(Order.items).joinedload(OrderItem.inventory),
+    ],
+    'order.edit': lambda: [
+        joinedload(Order.customer),
+        selectinload(Order.items),
+    ],
+    'audit.index': lambda: [joinedload(AuditLog.user)],
+    'inventory.index': lambda: [selectinload(Inventory.colors)],
+    'inventory.reorder': lambda: [selectinload(Inventory.colors)],
+    'inventory.lookup': lambda: [selectinload(Inventory.colors)],
+    'dashboard.recent_activity': lambda: [joinedload(AuditLog.user)],
+    'dashboard.recent_orders': lambda: [joinedload(Order.customer)],
+    'prescription.history': lambda: [joinedload(Prescription.creator)],
+    'prescription.view': lambda: [joinedload(Prescription.customer)],
+}
+
+
+def with_loading_policy(query, name):
+    """Applies the eager-loading options registered for `name` to `query`."""
+    return query.options(*LOADING_POLICIES[name]())
@@ -0,0 +1,186 @@
+import logging
+from decimal import Decimal
+from sqlalchemy import event, inspect, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from models.dashboard_metric import DashboardMetric
+from models.customer import Customer
+from models.inventory import Inventory
+from models.order import Order
+
+# Counters shown on the dashboard. Kept in sync by the mapper events below,
+# rebuilt from scratch by `flask rebuild-metrics`. Missing counter rows are
+# seeded at startup (seed_metrics); the dashboard itself never writes.
+log = logging.getLogger(__name__)
+
+METRIC_NAMES = ['total_customers', 'total_orders', 'pending_orders', 'low_stock_items', 'total_revenue']
+COUNT_METRICS = {'total_customers', 'total_orders', 'pending_orders', 'low_stock_items'}
+
+metrics_table = DashboardMetric.__table__
+
+
+def register_metrics_listeners():
+    # create_app() may run more than once per process; never double-count
+    if event.contains(Customer, 'after_insert', customer_inserted):
+        return
+    event.listen(Customer, 'after_insert', customer_inserted)
+    event.listen(Customer, 'after_delete', customer_deleted)
+    event.listen(Order, 'after_insert', order_inserted)
+    event.listen(Order, 'after_update', order_updated)
+    event.listen(Order, 'after_delete', order_deleted)
+    event.listen(Inventory, 'after_insert', inventory_inserted)
+    event.listen(Inventory, 'after_update', inventory_updated)
+    event.listen(Inventory, 'after_delete', inventory_deleted)
+
+
+def _apply(connection, deltas):
+    # value = value + delta runs inside the flush, so counters commit or roll back
+    # together with the row change that caused them.
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        connection.execute(
+            metrics_table.update()
+            .where(metrics_table.c.name == name)
+            .values(value=metrics_table.c.value + delta)
+        )
+
+
+def _old(target, key):
+    # Value before this flush (falls back to current value if unchanged)
+    history = inspect(target).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, key)
+
+
+def _money(value):
+    # Routes assign floats to Numeric columns; normalise before doing arithmetic
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+# ── Customers ──────────────────────────────────────────────────────────────────
+def customer_inserted(mapper, connection, target):
+    _apply(connection, {'total_customers': 1})
+
+def customer_deleted(mapper, connection, target):
+    _apply(connection, {'total_customers': -1})
+
+
+# ── Orders ─────────────────────────────────────────────────────────────────────
+def order_inserted(mapper, connection, target):
+    _apply(connection, {
+        'total_orders': 1,
+        'pending_orders': 1 if target.status == 'Pending' else 0,
+        'total_revenue': _money(target.total_amount),
+    })
+
+def order_updated(mapper, connection, target):
+    was_pending = _old(target, 'status') == 'Pending'
+    is_pending = target.status == 'Pending'
+    _apply(connection, {
+        'pending_orders': int(is_pending) - int(was_pending),
+        'total_revenue': _money(target.total_amount) - _money(_old(target, 'total_amount')),
+    })
+
+def order_deleted(mapper, connection, target):
+    _apply(connection, {
+        'total_orders': -1,
+        'pending_orders': -1 if target.status == 'Pending' else 0,
+        'total_revenue': -_money(target.total_amount),
+    })
+
+
+# ── Inventory ──────────────────────────────────────────────────────────────────
+def inventory_inserted(mapper, connection, target):
+    if target.is_low_stock:
+        _apply(connection, {'low_stock_items': 1})
+
+def inventory_updated(mapper, connection, target):
+    # is_low_stock was brought up to date in before_update
+    _apply(connection, {'low_stock_items': int(bool(target.is_low_stock)) - int(bool(_old(target, 'is_low_stock')))})
+
+def inventory_deleted(mapper, connection, target):
+    if target.is_low_stock:
+        _apply(connection, {'low_stock_items': -1})
+
+def record_low_stock_change(connection, was_low, is_low):
+    # For SQL-side stock updates (services.stock_service), which bypass the events above
+    _apply(connection, {'low_stock_items': int(bool(is_low)) - int(bool(was_low))})
+
+
+# ── Read / Rebuild ─────────────────────────────────────────────────────────────
+def compute_metrics():
+    """Full-table aggregates. Only used to (re)build the counters."""
+    return {
+        'total_customers': Customer.query.count(),
+        'total_orders': Order.query.count(),
+        'pending_orders': Order.query.filter_by(status='Pending').count(),
+        'low_stock_items': Inventory.query.filter(Inventory.is_low_stock.is_(True)).count(),
+        'total_revenue': db.session.query(func.sum(Order.total_amount)).scalar() or 0,
+    }
+
+def rebuild_metrics():
+    """
+    Recomputes every counter from the source tables and overwrites the stored values.
+    Returns a dict of {name: (stored, actual)} for counters that had drifted.
+    """
+    actual = compute_metrics()
+    stored = {m.name: m for m in DashboardMetric.query.all()}
+    drift = {}
+
+    for name in METRIC_NAMES:
+        metric = stored.get(name)
+        if metric is None:
+            metric = DashboardMetric(name=name, value=0)
+            db.session.add(metric)
+            drift[name] = (None, actual[name])
+        elif metric.value != actual[name]:
+            drift[name] = (metric.value, actual[name])
+        metric.value = actual[name]
+
+    db.session.commit()
+    return drift
+
+def seed_metrics():
+    """
+    Creates the counter rows that don't exist yet, with their actual values.
+    Safe to run from every worker at once (ON CONFLICT DO NOTHING); returns the
+    names it seeded.
+    """
+    try:
+        if not inspect(db.engine).has_table(metrics_table.name):
+            return []  # before the tables are created
+        stored = {name for (name,) in db.session.query(DashboardMetric.name)}
+        missing = [name for name in METRIC_NAMES if name not in stored]
+        if missing:
+            actual = compute_metrics()
+            rows = [{'name': name, 'value': actual[name]} for name in missing]
+            dialect = db.engine.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                db.session.execute(insert(metrics_table).on_conflict_do_nothing(index_elements=['name']), rows)
+            else:
+                db.session.execute(metrics_table.insert(), rows)
+        db.session.commit()
+        return missing
+    except SQLAlchemyError as e:
+        # Don't keep the app from starting; the dashboard computes what's missing
+        db.session.rollback()
+        log.warning('Could not seed dashboard metrics: %s', e)
+        return []
+
+def get_dashboard_metrics():
+    """Reads the precomputed counters (one small PK-table SELECT)."""
+    rows = dict(db.session.query(DashboardMetric.name, DashboardMetric.value).all())
+    if any(name not in rows for name in METRIC_NAMES):
+        # Not seeded yet (table created after startup, or wiped): show the real
+        # values until `flask rebuild-metrics` or a restart stores them
+        actual = compute_metrics()
+        rows = {name: rows.get(name, actual[name]) for name in METRIC_NAMES}
+
+    return {
+        name: int(rows[name]) if name in COUNT_METRICS else rows[name]
+        for name in METRIC_NAMES
+    }
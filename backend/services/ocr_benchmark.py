@@ -0,0 +1,87 @@
+import csv
+import os
+import statistics
+import time
+from decimal import Decimal, InvalidOperation
+from services.ocr_preprocess import legacy_preprocess, preprocess
+from services.ocr_service import get_reader, parse_ocr_text
+
+# `flask ocr-benchmark DIR`: runs every image in DIR through the old and the
+# new preprocessing, then EasyOCR + parse_ocr_text, and reports latency and
+# how many RE/LE fields came out right. Expected values come from
+# DIR/labels.csv:
+#
+#   filename,re_sph,re_cyl,re_axis,le_sph,le_cyl,le_axis
+#   scan1.jpg,-1.25,-0.50,180,-1.00,,
+#
+# Blank cells are expected to be blank. Images without a labels row count for
+# latency only.
+
+FIELDS = ['re_sph', 're_cyl', 're_axis', 'le_sph', 'le_cyl', 'le_axis']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+PIPELINES = {'legacy': legacy_preprocess, 'pipeline': preprocess}
+
+
+def _same(expected, found):
+    if not expected:
+        return not found
+    try:
+        return Decimal(str(found)) == Decimal(expected)
+    except (InvalidOperation, TypeError):
+        return False
+
+def _labels(sample_dir):
+    path = os.path.join(sample_dir, 'labels.csv')
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return {row['filename']: row for row in csv.DictReader(f)}
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+def _summary(times):
+    if not times:
+        return None
+    return {'mean': round(statistics.mean(times)), 'p50': round(_percentile(times, 0.5)),
+            'p95': round(_percentile(times, 0.95)), 'max': round(max(times))}
+
+
+def run_ocr_benchmark(sample_dir, repeat=1):
+    """{pipeline: {'preprocess_ms', 'ocr_ms', 'total_ms' summaries, 'fields_correct', 'fields_total', 'failed'}}"""
+    images = sorted(name for name in os.listdir(sample_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise ValueError(f'No .png/.jpg images in {sample_dir}')
+    labels = _labels(sample_dir)
+    reader = get_reader()  # load the model before timing anything
+
+    report = {}
+    for name, prepare in PIPELINES.items():
+        pre_ms, ocr_ms, total_ms = [], [], []
+        correct = total = failed = 0
+        for image_name in images:
+            with open(os.path.join(sample_dir, image_name), 'rb') as f:
+                data = f.read()
+            for _ in range(repeat):
+                started = time.perf_counter()
+                image, info = prepare(data)
+                prepared = time.perf_counter()
+                if image is None:
+                    failed += 1
+                    break
+                extracted = parse_ocr_text(reader.readtext(image, detail=0))
+                finished = time.perf_counter()
+                pre_ms.append((prepared - started) * 1000)
+                ocr_ms.append((finished - prepared) * 1000)
+                total_ms.append((finished - started) * 1000)
+
+            expected = labels.get(image_name)
+            if expected and image is not None:
+                total += len(FIELDS)
+                correct += sum(_same((expected.get(field) or '').strip(), extracted.get(field)) for field in FIELDS)
+
+        report[name] = {'images': len(images), 'failed': failed,
+                        'preprocess_ms': _summary(pre_ms), 'ocr_ms': _summary(ocr_ms), 'total_ms': _summary(total_ms),
+                        'fields_correct': correct, 'fields_total': total}
+    return report
@@ -0,0 +1,131 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.ocr_cache import OcrCacheEntry
+from services.ocr_service import PIPELINE_VERSION
+
+# OCR results cached by the image's content hash, so a photo scanned again
+# (re-uploaded, or scanned twice from the add form) comes back at once.
+# Keys are (sha256 of the bytes, PIPELINE_VERSION): bumping the version in
+# ocr_service makes every older entry a miss.
+#
+#   memory    per-process LRU of the last OCR_CACHE_ENTRIES results
+#   database  ocr_cache table shared by all workers, capped at
+#             OCR_CACHE_MAX_MB of stored results; entries from old pipeline
+#             versions go first, then the least recently used
+#
+# Only successful scans are cached.
+
+entry_table = OcrCacheEntry.__table__
+
+
+class LRUCache:
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+memory = LRUCache()
+settings = {'max_bytes': 50 * 1024 * 1024}
+
+
+def configure(app):
+    memory.max_entries = app.config.get('OCR_CACHE_ENTRIES', 256)
+    settings['max_bytes'] = app.config.get('OCR_CACHE_MAX_MB', 50) * 1024 * 1024
+
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def lookup(digest):
+    """Cached result for an image hash, or None. The caller commits (the hit counter)."""
+    key = (digest, PIPELINE_VERSION)
+    result = memory.get(key)
+    if result is None:
+        row = db.session.execute(
+            entry_table.update()
+            .where(entry_table.c.image_hash == digest, entry_table.c.pipeline_version == PIPELINE_VERSION)
+            .values(hits=entry_table.c.hits + 1, last_used_at=datetime.utcnow())
+            .returning(entry_table.c.result)
+        ).first()
+        if row is None:
+            return None
+        result = row.result
+        memory.put(key, result)
+    return copy.deepcopy(result)
+
+
+def store(digest, result):
+    """Caches a successful result in both tiers and trims the table. The caller commits."""
+    key = (digest, PIPELINE_VERSION)
+    memory.put(key, copy.deepcopy(result))
+    if db.session.get(OcrCacheEntry, key) is not None:
+        return
+    try:
+        # Another worker may be caching the same image right now
+        with db.session.begin_nested():
+            db.session.add(OcrCacheEntry(image_hash=digest, pipeline_version=PIPELINE_VERSION, result=result,
+                                         size=len(json.dumps(result)), last_used_at=datetime.utcnow()))
+    except IntegrityError:
+        return
+    evict(settings['max_bytes'])
+
+
+def evict(max_bytes):
+    """Deletes entries until the stored results fit in max_bytes. Returns how many went."""
+    total = db.session.scalar(select(func.coalesce(func.sum(entry_table.c.size), 0)))
+    if total <= max_bytes:
+        return 0
+    # Old pipeline versions first (they can never hit again), then least recently used
+    victims = db.session.execute(
+        select(entry_table.c.image_hash, entry_table.c.pipeline_version, entry_table.c.size)
+        .order_by((entry_table.c.pipeline_version == PIPELINE_VERSION), entry_table.c.last_used_at)
+    )
+    doomed = []
+    for row in victims:
+        if total <= max_bytes:
+            break
+        doomed.append((row.image_hash, row.pipeline_version))
+        total -= row.size
+    for digest, version in doomed:
+        db.session.execute(entry_table.delete().where(entry_table.c.image_hash == digest,
+                                                      entry_table.c.pipeline_version == version))
+    return len(doomed)
+
+
+def clear():
+    """Empties both tiers (this process's memory tier only). The caller commits."""
+    memory.clear()
+    return db.session.execute(entry_table.delete()).rowcount
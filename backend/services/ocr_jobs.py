@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from extensions import db
+from models.ocr_job import OcrJob
+from services import ocr_cache
+from services.ocr_service import process_prescription_image, process_prescription_images
+
+log = logging.getLogger(__name__)
+
+# Prescription scans run off the request thread. ocr_scan (one image) and
+# ocr_scan_batch (several pages of one prescription) insert an OcrJob row and
+# return the job id at once; a small per-process pool does the OCR on the
+# image bytes, in memory, and stores the result on the row. The
+# add-prescription form polls /prescriptions/ocr_jobs/<id> until it is done. The row lives in
+# the database, so any gunicorn worker can answer the poll.
+#
+# Limits, so scans can't starve page traffic:
+#   OCR_WORKERS      scans running at once per process (default 1)
+#   OCR_MAX_PENDING  scans accepted per process, running + waiting; beyond
+#                    that ocr_scan answers 503 and the user retries
+#   OCR_THREADS      CPU threads torch/OpenCV may use for one scan
+# Where the model itself lives (OCR_MODE) is up to services/ocr_service.py.
+# A job still running OCR_JOB_TIMEOUT seconds after it started (its worker
+# was restarted or killed) is reported as failed. A queued job may wait behind
+# up to OCR_MAX_PENDING others, so it gets that many timeouts before it is.
+#
+# An image scanned before (same bytes, see services/ocr_cache.py) doesn't go
+# to the pool at all: its job is created already done.
+
+runner = None
+
+
+class OcrJobRunner:
+
+    def __init__(self, app, workers=1, max_pending=4):
+        self.app = app
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Pools don't survive fork (gunicorn --preload), so (re)create per process
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+
+    def reserve(self):
+        """Takes a pending slot; False when this process already has max_pending scans."""
+        self._ensure_started()
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, job_id, images):
+        """Runs a reserved job (a list of image bytes) in the background."""
+        self._executor.submit(self._run, job_id, images)
+
+    def _run(self, job_id, images):
+        try:
+            with self.app.app_context():
+                job = db.session.get(OcrJob, job_id)
+                if job is None or job.finished:
+                    return
+                job.status = OcrJob.RUNNING
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+
+                if len(images) == 1:
+                    data = process_prescription_image(images[0])
+                else:
+                    data = process_prescription_images(images)
+
+                job = db.session.get(OcrJob, job_id, populate_existing=True)
+                if job is None or job.finished:
+                    return  # timed out in the meantime
+                if 'error' in data:
+                    job.status, job.error = OcrJob.FAILED, data['error']
+                else:
+                    job.status, job.result = OcrJob.DONE, data
+                    if job.image_hash:
+                        ocr_cache.store(job.image_hash, data)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        except Exception:
+            log.exception('OCR job %s failed', job_id)
+            _fail(job_id, 'Scan failed on the server. Please enter the values manually.')
+        finally:
+            self.release()
+
+
+def _fail(job_id, error):
+    try:
+        with runner.app.app_context():
+            db.session.query(OcrJob).filter(OcrJob.id == job_id).update(
+                {'status': OcrJob.FAILED, 'error': error, 'finished_at': datetime.utcnow()})
+            db.session.commit()
+    except Exception:
+        log.exception('Could not mark OCR job %s as failed', job_id)
+
+
+def init_ocr_jobs(app):
+    global runner
+    if runner is None:
+        runner = OcrJobRunner(
+            app,
+            workers=app.config.get('OCR_WORKERS', 1),
+            max_pending=app.config.get('OCR_MAX_PENDING', 4),
+        )
+
+
+class OcrBusy(Exception):
+    pass
+
+
+def submit_scan(images, user_id):
+    """Queues a scan of one or more images (bytes). Returns the OcrJob; raises OcrBusy when the queue is full."""
+    if len(images) == 1:
+        digest = ocr_cache.image_hash(images[0])
+    else:
+        # A batch is cached as a whole: its result merges all the pages
+        digest = ocr_cache.image_hash('batch:{}'.format(','.join(ocr_cache.image_hash(i) for i in images)).encode())
+    job_id = uuid.uuid4().hex
+
+    cached = ocr_cache.lookup(digest)
+    if cached is not None:
+        now = datetime.utcnow()
+        job = OcrJob(id=job_id, status=OcrJob.DONE, image_hash=digest, result=cached,
+                     created_by=user_id, started_at=now, finished_at=now)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    if not runner.reserve():
+        raise OcrBusy('The scanner is busy. Please try again in a few seconds.')
+    try:
+        job = OcrJob(id=job_id, status=OcrJob.QUEUED, image_hash=digest, created_by=user_id)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        runner.release()
+        raise
+    runner.submit(job_id, images)
+    return job
+
+
+def _deadline(job, timeout):
+    if job.started_at:
+        return job.started_at + timedelta(seconds=timeout)
+    if job.created_at:
+        return job.created_at + timedelta(seconds=timeout * runner.max_pending)
+    return None
+
+def get_job(job_id, timeout):
+    """The job, marked failed first if it has run (or waited) past its timeout; see the module comment."""
+    job = db.session.get(OcrJob, job_id)
+    deadline = _deadline(job, timeout) if job is not None and not job.finished else None
+    if deadline and deadline < datetime.utcnow():
+        job.status = OcrJob.FAILED
+        job.error = 'Scan timed out. Please try again or enter the values manually.'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
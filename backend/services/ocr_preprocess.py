@@ -0,0 +1,164 @@
+import time
+
+# Image preparation ahead of EasyOCR. Phone photos of a prescription are
+# 12 MP or more, while the text needs far less; most of the old scan time was
+# the detector walking the full frame. The pipeline:
+#
+#   1. decode straight to grayscale (no 3-channel copy)
+#   2. downsample (INTER_AREA) so the long side is TARGET_DPI on an A5 pad
+#   3. deskew by the median angle of the long straight lines (table rules)
+#   4. crop to the prescription table: the largest box outlined by
+#      horizontal + vertical rules, plus a margin; whole page if none
+#   5. Otsu threshold, as before
+#
+# Everything is whole-array OpenCV / NumPy work; no per-pixel Python. The
+# constants are fixed rather than configurable because they change what a
+# scan returns: bump ocr_service.PIPELINE_VERSION when editing them.
+#
+# cv2 and numpy are imported inside the functions, so importing this module
+# costs nothing in workers that never scan.
+
+TARGET_DPI = 200
+PAGE_LONG_SIDE_IN = 8.3      # A5 prescription pad
+MAX_SKEW_DEGREES = 15        # steeper lines are not table rules
+MIN_SKEW_DEGREES = 0.3       # below this, rotating costs more than it helps
+MIN_TABLE_AREA = 0.05        # of the page; smaller boxes are logos / stamps
+CROP_MARGIN = 0.03           # of the page, kept around the table for the RE/LE labels
+
+
+def decode(source):
+    """Grayscale image from a file path or raw bytes, or None if it can't be read."""
+    import cv2
+    import numpy as np
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_GRAYSCALE)
+    return cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+
+
+def downsample(gray, dpi=TARGET_DPI):
+    import cv2
+    target = int(dpi * PAGE_LONG_SIDE_IN)
+    scale = target / max(gray.shape)
+    if scale >= 1:
+        return gray, 1.0
+    size = (round(gray.shape[1] * scale), round(gray.shape[0] * scale))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+
+def skew_angle(gray):
+    """Median angle in degrees of the long, nearly horizontal lines; 0 if there are none."""
+    import cv2
+    import numpy as np
+    edges = cv2.Canny(gray, 50, 150)
+    width = gray.shape[1]
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 360, threshold=100, minLineLength=width // 4, maxLineGap=10)
+    if lines is None:
+        return 0.0
+    # (N, 1, 4) from OpenCV 4, (N, 4) from OpenCV 5
+    x1, y1, x2, y2 = lines.reshape(-1, 4).T.astype(np.float64)
+    angles = np.degrees(np.arctan2(y2 - y1, x2 - x1))
+    angles = (angles + 90) % 180 - 90  # a line drawn right-to-left is the same line
+    angles = angles[np.abs(angles) < MAX_SKEW_DEGREES]
+    return float(np.median(angles)) if angles.size else 0.0
+
+
+def deskew(gray, angle):
+    import cv2
+    if abs(angle) < MIN_SKEW_DEGREES:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def table_region(gray):
+    """(x, y, w, h) of the ruled prescription table, or None."""
+    import cv2
+    h, w = gray.shape
+    ink = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    # Opening with long thin kernels keeps only the ruled lines
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 20, 1), 1)))
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(h // 20, 1))))
+    grid = cv2.dilate(cv2.bitwise_or(horizontal, vertical), cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    contours, _ = cv2.findContours(grid, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(c) for c in contours]
+    boxes = [b for b in boxes if b[2] * b[3] >= MIN_TABLE_AREA * w * h]
+    if not boxes:
+        return None
+    return max(boxes, key=lambda b: b[2] * b[3])
+
+
+def crop(gray, box):
+    if box is None:
+        return gray
+    h, w = gray.shape
+    x, y, bw, bh = box
+    mx, my = int(w * CROP_MARGIN), int(h * CROP_MARGIN)
+    return gray[max(y - my, 0):min(y + bh + my, h), max(x - mx, 0):min(x + bw + mx, w)]
+
+
+def threshold(gray):
+    import cv2
+    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def preprocess(source):
+    """
+    Runs the pipeline. Returns (image for OCR, info) where info has the scale,
+    skew angle, crop box and per-step milliseconds; (None, info) if unreadable.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(step):
+        nonlocal started
+        now = time.perf_counter()
+        timings[step] = round((now - started) * 1000, 1)
+        started = now
+
+    gray = decode(source)
+    lap('decode')
+    if gray is None:
+        return None, {'ms': timings}
+    original = gray.shape
+    gray, scale = downsample(gray)
+    lap('downsample')
+    angle = skew_angle(gray)
+    gray = deskew(gray, angle)
+    lap('deskew')
+    box = table_region(gray)
+    gray = crop(gray, box)
+    lap('crop')
+    image = threshold(gray)
+    lap('threshold')
+    return image, {'original': original, 'size': image.shape, 'scale': round(scale, 3),
+                   'angle': round(angle, 2), 'table': box, 'ms': timings}
+
+
+def legacy_preprocess(source):
+    """The pre-pipeline behaviour (full-size colour decode, grayscale, Otsu), kept for the benchmark."""
+    import cv2
+    import numpy as np
+    started = time.perf_counter()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+    else:
+        img = cv2.imread(source)
+    if img is None:
+        return None, {}
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    image = threshold(gray)
+    return image, {'original': gray.shape, 'size': image.shape,
+                   'ms': {'total': round((time.perf_counter() - started) * 1000, 1)}}
+
+
+def pad_batch(images):
+    """Pads images with white to one common size, for EasyOCR's batched calls."""
+    import numpy as np
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    batch = np.full((len(images), height, width), 255, dtype=np.uint8)
+    for i, image in enumerate(images):
+        batch[i, :image.shape[0], :image.shape[1]] = image
+    return list(batch)
@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+# `flask ocr-model-report`: boots the app in a fresh interpreter once per
+# OCR_MODE and reports what a web worker costs at startup and what the model
+# costs on top, so the modes can be compared on the actual server.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child. Prints one JSON object.
+PROBE = r'''
+import json, os, sys, time
+started = time.perf_counter()
+from app import app
+from services import ocr_service
+report = {'startup_seconds': round(time.perf_counter() - started, 2), 'rss_mb': ocr_service.rss_mb(),
+          'torch_imported': 'torch' in sys.modules}
+mode = ocr_service.settings['mode']
+
+if mode == 'lazy' and ocr_service.OCR_AVAILABLE:
+    # What the first scan in each worker pays
+    ocr_service.get_reader()
+    report['first_scan_load_seconds'] = ocr_service.model_stats['load_seconds']
+    report['rss_after_load_mb'] = ocr_service.rss_mb()
+
+elif mode == 'preload' and ocr_service.OCR_AVAILABLE:
+    ocr_service.preload_model()
+    report['master_load_seconds'] = ocr_service.model_stats['load_seconds']
+    report['rss_after_load_mb'] = ocr_service.rss_mb()
+    # A forked worker's own share of memory: its proportional set size
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        pss = None
+        try:
+            with open('/proc/self/smaps_rollup') as f:
+                pss = next(round(int(l.split()[1]) / 1024, 1) for l in f if l.startswith('Pss:'))
+        except (OSError, StopIteration):
+            pass
+        os.write(write_end, json.dumps({'rss_mb': ocr_service.rss_mb(), 'pss_mb': pss}).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    report['forked_worker'] = json.loads(os.read(read_end, 4096))
+
+print(json.dumps(report))
+'''
+
+
+def _probe(mode):
+    env = {**os.environ, 'OCR_MODE': mode}
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, timeout=600)
+    if out.returncode != 0:
+        return {'error': out.stderr.strip().splitlines()[-1] if out.stderr.strip() else 'probe failed'}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _probe_server(socket_path):
+    """Starts `flask ocr-server` and times it until the socket accepts scans."""
+    env = {**os.environ, 'OCR_MODE': 'service', 'OCR_SOCKET': socket_path}
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'ocr-server'], cwd=BACKEND_DIR,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        while not os.path.exists(socket_path):
+            if server.poll() is not None:
+                return {'error': (server.stderr.read().strip().splitlines() or ['exited'])[-1]}
+            if time.perf_counter() - started > 600:
+                return {'error': 'not ready after 600s'}
+            time.sleep(0.2)
+        return {'ready_seconds': round(time.perf_counter() - started, 2), 'rss_mb': _rss(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _rss(pid):
+    from services.ocr_service import rss_mb
+    return rss_mb(pid)
+
+
+def ocr_model_report(modes=('lazy', 'preload', 'service'), socket_path='/tmp/everest-ocr-report.sock'):
+    """{mode: measurements}; service mode also has an 'ocr_server' entry."""
+    report = {}
+    for mode in modes:
+        report[mode] = _probe(mode)
+        if mode == 'service':
+            report[mode]['ocr_server'] = _probe_server(socket_path)
+    return report
@@ -1,52 +1,211 @@
-import re
+import importlib.util
+import logging
 import os
+import re
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+log = logging.getLogger(__name__)
 
 # OCR dependencies are optional — not installed on Render free tier
 # (easyocr + opencv are too large for free tier memory limits)
-OCR_AVAILABLE = False
-reader = None
+OCR_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('easyocr', 'cv2', 'numpy'))
+
+# Part of every OCR cache key (services/ocr_cache.py). Bump it whenever the
+# preprocessing or the parsers change what a scan returns, so results
+# cached by the old code are no longer served.
+PIPELINE_VERSION = '3'  # 2: services/ocr_preprocess.py pipeline, 3: labelled RE/LE per page
+
+# The EasyOCR model costs seconds and a few hundred MB to load, so nothing is
+# imported or loaded until it's needed. Where the model lives (OCR_MODE):
+#   lazy     each gunicorn worker loads it on its first scan (default)
+#   preload  loaded once in the gunicorn master before forking (see
+#            gunicorn.conf.py); workers share its pages copy-on-write
+#   service  only `flask ocr-server` loads it; web workers send it scans over
+#            the OCR_SOCKET unix socket and never import torch at all
+# `flask ocr-model-report` measures startup time and memory of each mode.
+settings = {'mode': 'lazy', 'socket': '/tmp/everest-ocr.sock', 'threads': 1, 'authkey': b''}
+
+_reader = None
+_reader_lock = threading.Lock()
+model_stats = {'loaded': False, 'load_seconds': None, 'rss_before_mb': None, 'rss_after_mb': None, 'pid': None}
+
+
+def configure(app):
+    settings.update(
+        mode=app.config.get('OCR_MODE', 'lazy'),
+        socket=app.config.get('OCR_SOCKET', settings['socket']),
+        threads=app.config.get('OCR_THREADS', 1),
+        authkey=app.config['SECRET_KEY'].encode(),
+    )
+
+def preload_model():
+    """Called in the gunicorn master (gunicorn.conf.py) when OCR_MODE = 'preload'."""
+    if OCR_AVAILABLE:
+        get_reader()
+
+
+def ocr_available():
+    # In service mode the OCR server answers with an error if it can't scan
+    return settings['mode'] == 'service' or OCR_AVAILABLE
+
 
-try:
-    import easyocr
-    import cv2
-    import numpy as np
-    reader = easyocr.Reader(['en'], gpu=False)
-    OCR_AVAILABLE = True
-except ImportError:
-    pass
+def rss_mb(pid='self'):
+    """Resident memory of a process in MB (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid != 'self':
+        return None
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def get_reader():
+    """The process's EasyOCR reader, loaded on first call."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                started = time.perf_counter()
+                rss_before = rss_mb()
+                import cv2
+                import easyocr
+                import torch
+                # By default torch and OpenCV spread one scan over every core
+                cv2.setNumThreads(settings['threads'])
+                torch.set_num_threads(settings['threads'])
+                _reader = easyocr.Reader(['en'], gpu=False)
+                model_stats.update(loaded=True, load_seconds=round(time.perf_counter() - started, 2),
+                                   rss_before_mb=rss_before, rss_after_mb=rss_mb(), pid=os.getpid())
+                log.info('EasyOCR model loaded in %ss (pid %s)', model_stats['load_seconds'], os.getpid())
+    return _reader
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg'}
 
-def process_prescription_image(image_path):
+def process_prescription_image(image):
     """
     Reads image, preprocesses it, runs OCR, and extracts optical details.
-    Returns an error dict if OCR libraries are not installed.
+    `image` is the raw file bytes (or a path). Returns an error dict if OCR
+    libraries are not installed.
     """
-    if not OCR_AVAILABLE:
+    if settings['mode'] == 'service':
+        return _ask_ocr_server({'image': _as_bytes(image)})
+    if not ocr_available():
+        return {"error": "OCR not available on this server. Please enter prescription details manually."}
+    return _scan(image)
+
+def process_prescription_images(images):
+    """
+    Several images of one prescription (pages, front/back) as raw bytes, OCR'd
+    in one batch. Returns the merged values plus 'confidence' and 'source'
+    (which image each value came from) per field; see merge_readings.
+    """
+    if settings['mode'] == 'service':
+        return _ask_ocr_server({'images': [_as_bytes(image) for image in images]})
+    if not ocr_available():
         return {"error": "OCR not available on this server. Please enter prescription details manually."}
+    return _scan_batch(images)
+
+def _as_bytes(image):
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, 'rb') as f:
+        return f.read()
 
+def _scan(image):
     try:
-        # 1. Read Image
-        img = cv2.imread(image_path)
-        if img is None:
-            return {"error": "Could not read image"}
+        from services.ocr_preprocess import preprocess
+        reader = get_reader()
 
-        # 2. Preprocessing (Grayscale + Thresholding)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # 1. Read + preprocess (downsample, deskew, crop to the table, threshold)
+        image, info = preprocess(image)
+        if image is None:
+            return {"error": "Could not read image"}
 
-        # 3. Run EasyOCR
-        results = reader.readtext(thresh, detail=0)
+        # 2. Run EasyOCR
+        results = reader.readtext(image, detail=0)
 
-        # 4. Parse Text
+        # 3. Parse Text
         extracted_data = parse_ocr_text(results)
 
         return extracted_data
     except Exception as e:
         return {"error": str(e)}
 
+def _scan_batch(images):
+    try:
+        from services.ocr_preprocess import pad_batch, preprocess
+        reader = get_reader()
+
+        prepared = []
+        for number, data in enumerate(images, start=1):
+            image, info = preprocess(data)
+            if image is None:
+                return {"error": f"Could not read image {number}"}
+            prepared.append(image)
+
+        # One detector/recognizer pass over the whole batch (same-size frames)
+        results = reader.readtext_batched(pad_batch(prepared), detail=1)
+        detections = [[(text, conf) for _, text, conf in found] for found in results]
+        readings = [parse_ocr_detections(page) for page in detections]
+        if not any(any(values.values()) for values, conf in readings):
+            # No page had labels or six numbers of its own (e.g. RE on the
+            # front, LE on the back): read the pages in order as one, each
+            # detection tagged with its page so values trace back to it
+            used = {}
+            merged = merge_readings([parse_ocr_detections(
+                [(text, conf, index) for index, page in enumerate(detections) for text, conf in page], used)])
+            source = {field: detection[2] for field, detection in used.items()}
+            return {**merged, 'source': source, 'images': len(detections)}
+        return merge_readings(readings)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ── Dedicated OCR process (OCR_MODE = 'service') ───────────────────────────────
+def _ask_ocr_server(request):
+    try:
+        with Client(settings['socket'], family='AF_UNIX', authkey=settings['authkey']) as conn:
+            conn.send(request)
+            return conn.recv()
+    except (OSError, EOFError, AuthenticationError) as e:
+        log.warning('OCR server unreachable at %s: %s', settings['socket'], e)
+        return {"error": "OCR service is not running. Please enter prescription details manually."}
+
+def run_ocr_server(ready=None):
+    """
+    Serves scans over the unix socket, one at a time, with the model loaded
+    up front. Runs until killed (`flask ocr-server`).
+    """
+    if not OCR_AVAILABLE:
+        raise RuntimeError('easyocr / opencv are not installed')
+    get_reader()
+    if os.path.exists(settings['socket']):
+        os.remove(settings['socket'])  # left over from a previous run
+    with Listener(settings['socket'], family='AF_UNIX', authkey=settings['authkey']) as listener:
+        os.chmod(settings['socket'], 0o600)
+        if ready:
+            ready()
+        while True:
+            try:
+                with listener.accept() as conn:
+                    request = conn.recv()
+                    if 'images' in request:
+                        conn.send(_scan_batch(request['images']))
+                    else:
+                        conn.send(_scan(request['image']))
+            except Exception:
+                log.exception('OCR server request failed')
+
 def parse_ocr_text(text_list):
     """
     Heuristic parser to find Right Eye (OD/RE) and Left Eye (OS/LE) values.
@@ -93,3 +252,64 @@ def parse_ocr_text(text_list):
         data["le_axis"] = numbers[5]
     
     return data
+
+
+FIELDS = ["re_sph", "re_cyl", "re_axis", "le_sph", "le_cyl", "le_axis"]
+EYE_LABELS = {'RE': 're', 'OD': 're', 'R': 're', 'RIGHT': 're', 'LE': 'le', 'OS': 'le', 'L': 'le', 'LEFT': 'le'}
+NUMBER = re.compile(r'^[+-]?\d+(\.\d+)?$')
+
+def parse_ocr_detections(detections, used=None):
+    """
+    parse_ocr_text for [(text, confidence, ...)] detections: returns
+    (values, {field: confidence of the text the value was read from}).
+    If `used` is a dict it also gets {field: detection the value was read
+    from}, so callers can tag detections (e.g. with their page) and trace them.
+
+    Numbers after an eye label (RE/OD/R, LE/OS/L) are that eye's SPH, CYL and
+    AXIS, so a page holding only one eye still yields its half. Without any
+    label, six or more numbers get the same sequence guess as parse_ocr_text.
+    """
+    tokens = [(token, detection[1], detection) for detection in detections for token in detection[0].upper().split()]
+    values = dict.fromkeys(FIELDS)
+    confidence = {}
+    used = {} if used is None else used
+
+    eye, filled, labelled = None, 0, False
+    for token, conf, detection in tokens:
+        label = EYE_LABELS.get(re.sub(r'[^A-Z]', '', token))
+        if label and not NUMBER.match(token):
+            eye, filled, labelled = label, 0, True
+        elif eye and filled < 3 and NUMBER.match(token):
+            field = f"{eye}_{('sph', 'cyl', 'axis')[filled]}"
+            values[field], confidence[field], used[field] = token, round(float(conf), 3), detection
+            filled += 1
+    if labelled:
+        return values, confidence
+
+    numbers = [(token, conf, detection) for token, conf, detection in tokens if NUMBER.match(token)]
+    if len(numbers) >= 6:
+        for field, (token, conf, detection) in zip(FIELDS, numbers):
+            values[field] = token
+            confidence[field] = round(float(conf), 3)
+            used[field] = detection
+    return values, confidence
+
+def merge_readings(readings):
+    """
+    Combines (values, confidence) from several images of one prescription:
+    each field takes the most confident reading. Fields read differently on
+    different images are listed in 'conflicts' for the user to check.
+    """
+    merged = dict.fromkeys(FIELDS)
+    confidence, source, conflicts = {}, {}, []
+    for field in FIELDS:
+        found = [(conf.get(field, 0), index, values[field])
+                 for index, (values, conf) in enumerate(readings) if values.get(field)]
+        if not found:
+            continue
+        conf, index, value = max(found, key=lambda reading: reading[0])
+        merged[field], confidence[field], source[field] = value, conf, index
+        if len({reading[2] for reading in found}) > 1:
+            conflicts.append(field)
+    return {**merged, 'confidence': confidence, 'source': source, 'conflicts': conflicts,
+            'images': len(readings)}
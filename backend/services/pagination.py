@@ -0,0 +1,199 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import func, literal, select, text, tuple_
+from extensions import Timestamp, db
+
+# Keyset (cursor) pagination: pages continue from the sort key of the last row
+# seen (WHERE (created_at, id) < (:last_created_at, :last_id)) instead of
+# OFFSET, so page 500 costs the same index range scan as page 1. Cursors are
+# opaque url-safe tokens carrying the key values and the direction.
+#
+# Totals are optional (PAGINATION_COUNT): 'exact' runs COUNT(*), 'approximate'
+# uses the planner estimate on Postgres and a capped count elsewhere, 'none'
+# skips counting.
+#
+# Pages order and compare on the bare sort columns, so their indexes serve
+# both. That needs sort keys that are never NULL (a row-value comparison
+# drops NULL rows) and, on SQLite, datetimes all stored in one text format
+# (extensions.Timestamp). `flask backfill-sort-keys` brings an existing
+# database there.
+
+COUNT_CAP = 1000
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['n', str(value)]
+    return ['v', value]
+
+def _decode_value(pair):
+    kind, value = pair
+    if kind == 'dt':
+        return datetime.fromisoformat(value)
+    if kind == 'd':
+        return date.fromisoformat(value)
+    if kind == 'n':
+        return Decimal(value)
+    return value
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'k': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Returns (values, direction), or (None, 'next') for a missing or mangled token."""
+    if not token:
+        return None, 'next'
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        direction = 'prev' if payload['d'] == 'prev' else 'next'
+        return [_decode_value(pair) for pair in payload['k']], direction
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None, 'next'
+
+
+class KeysetPage:
+    def __init__(self, items, columns, per_page, has_next, has_prev, total=None, total_exact=True):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+        self.total_exact = total_exact
+        self._columns = columns
+
+    def _keys(self, item):
+        return [getattr(item, column.key) for column in self._columns]
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self._keys(self.items[-1]), 'next') if self.has_next and self.items else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self._keys(self.items[0]), 'prev') if self.has_prev and self.items else None
+
+    @property
+    def total_label(self):
+        if self.total is None:
+            return None
+        if self.total_exact:
+            return f'{self.total:,}'
+        if self.total >= COUNT_CAP and db.engine.dialect.name != 'postgresql':
+            return f'{COUNT_CAP:,}+'
+        return f'~{self.total:,}'
+
+
+def count_rows(query, mode):
+    """Returns (count, exact) for `query` according to PAGINATION_COUNT mode."""
+    if mode == 'none':
+        return None, True
+    query = query.order_by(None).enable_eagerloads(False)
+    if mode == 'exact':
+        return query.count(), True
+
+    if db.engine.dialect.name == 'postgresql':
+        # Planner row estimate: reads statistics, never touches the table
+        compiled = query.statement.compile(dialect=db.engine.dialect)
+        plan = db.session.connection().exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+
+    # No estimator on SQLite: count at most COUNT_CAP rows
+    capped = query.limit(COUNT_CAP).subquery()
+    count = db.session.execute(select(func.count()).select_from(capped)).scalar()
+    return count, count < COUNT_CAP
+
+
+def keyset_paginate(query, columns, descending=False, cursor=None, per_page=20, count=None):
+    """
+    Paginates `query` ordered by `columns` (sort column(s) first, unique id last),
+    all ascending or all descending. `cursor` is a token from a previous page.
+    """
+    values, direction = decode_cursor(cursor)
+    if values is not None and len(values) != len(columns):
+        values, direction = None, 'next'
+
+    # Walking backwards: flip the comparison and ordering, then reverse the rows
+    reverse = direction == 'prev'
+    scan_desc = descending != reverse
+
+    page_query = query
+    if values is not None:
+        key = tuple_(*columns)
+        # Bind with the column types so datetimes compare the way they're stored
+        last = tuple_(*[literal(value, column.type) for value, column in zip(values, columns)])
+        page_query = page_query.filter(key < last if scan_desc else key > last)
+    page_query = page_query.order_by(*[c.desc() if scan_desc else c.asc() for c in columns])
+
+    rows = page_query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if reverse:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, values is not None
+
+    mode = count or current_app.config.get('PAGINATION_COUNT', 'approximate')
+    total, exact = count_rows(query, mode)
+    return KeysetPage(rows, columns, per_page, has_next, has_prev, total, exact)
+
+
+def backfill_sort_keys():
+    """
+    Fills NULL sort keys of older rows, rewrites SQLite datetimes stored with
+    microseconds to the Timestamp format and, on Postgres, makes the sort
+    columns NOT NULL. Returns {"table.column": rows changed}.
+    """
+    from models.audit_log import AuditLog
+    from models.customer import Customer
+    from models.inventory import Inventory
+    from models.order import Order
+    from models.user import User
+    now = func.now()
+    fills = [
+        (Customer.__table__.c.updated_at, func.coalesce(Customer.__table__.c.created_at, now)),
+        (Order.__table__.c.created_at, func.coalesce(Order.__table__.c.updated_at, now)),
+        (User.__table__.c.created_at, now),
+        (AuditLog.__table__.c.timestamp, now),
+        (Inventory.__table__.c.quantity, 0),
+    ]
+    def update(column, value):
+        # Leave onupdate columns (updated_at) as they are: no row really changed
+        keep = {c.name: c for c in column.table.c if c.onupdate is not None and c is not column}
+        return column.table.update().values({**keep, column.name: value})
+
+    changed = {}
+    for column, fill in fills:
+        result = db.session.execute(update(column, fill).where(column.is_(None)))
+        changed[f'{column.table.name}.{column.name}'] = result.rowcount
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Written by the ORM before Timestamp: 'YYYY-MM-DD HH:MM:SS.ffffff'
+        for table in db.metadata.sorted_tables:
+            for column in table.c:
+                if column.type is Timestamp:
+                    result = db.session.execute(update(column, func.substr(column, 1, 19))
+                                                .where(func.length(column) > 19))
+                    key = f'{table.name}.{column.name}'
+                    changed[key] = changed.get(key, 0) + result.rowcount
+    elif dialect == 'postgresql':
+        for column, fill in fills:
+            db.session.execute(text(f'ALTER TABLE {column.table.name} ALTER COLUMN "{column.name}" SET NOT NULL'))
+        db.session.execute(text('ALTER TABLE inventory ALTER COLUMN quantity SET DEFAULT 0'))
+    db.session.commit()
+    return {key: count for key, count in changed.items() if count}
@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt as _bcrypt
+from services.request_timing import timed
+
+# Password hashing in a small shared pool, with a cap on how much CPU it
+# gets. A bcrypt hash is ~250 ms of one core at cost 12; a burst of logins at
+# shift start used to run them all at once and stall every other request.
+#
+#   BCRYPT_LOG_ROUNDS         work factor for new hashes (also what
+#                             Flask-Bcrypt reads, e.g. in seed_admin.py)
+#   PASSWORD_HASH_WORKERS     hashes running at once per process (default:
+#                             half the host's CPUs split over the
+#                             WEB_CONCURRENCY gunicorn workers, at least 1)
+#   PASSWORD_HASH_MAX_PENDING hashes accepted per process, running + waiting;
+#                             beyond that the request gets a 503 "try again"
+#                             instead of queueing behind the others
+#   PASSWORD_HASH_TIMEOUT     seconds a request waits for its hash
+#
+# The request still waits for its hash; what the pool buys is that only a
+# few run at once. That needs gunicorn's threaded workers (gunicorn.conf.py):
+# the other threads keep serving pages while bcrypt (which releases the GIL)
+# runs. Keep MAX_PENDING below GUNICORN_THREADS so a login burst can't hold
+# every thread. A hash made with a different cost than the configured one is
+# replaced at the next successful login (rehash-on-login), so changing
+# BCRYPT_LOG_ROUNDS needs no migration.
+
+HASH_COST = re.compile(r'^\$2[aby]?\$(\d{2})\$')
+MAX_BYTES = 72  # bcrypt only reads this much; longer passwords are cut the same way
+
+# Per process, so the host-wide share is divided between gunicorn's workers
+DEFAULT_WORKERS = max((os.cpu_count() or 2) // 2 // max(int(os.environ.get('WEB_CONCURRENCY') or 1), 1), 1)
+
+settings = {'rounds': 12, 'workers': DEFAULT_WORKERS, 'max_pending': 4, 'timeout': 10}
+
+_executor = None
+_slots = None
+_pid = None
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def configure(app):
+    global _executor
+    settings['rounds'] = app.config.get('BCRYPT_LOG_ROUNDS', settings['rounds'])
+    settings['workers'] = app.config.get('PASSWORD_HASH_WORKERS') or settings['workers']
+    settings['max_pending'] = max(app.config.get('PASSWORD_HASH_MAX_PENDING', settings['max_pending']),
+                                  settings['workers'])
+    settings['timeout'] = app.config.get('PASSWORD_HASH_TIMEOUT', settings['timeout'])
+    _executor = None  # picked up on next use
+
+
+def _pool():
+    global _executor, _slots, _pid
+    # Pools don't survive fork (gunicorn --preload), so (re)create per process
+    if _executor is not None and _pid == os.getpid():
+        return _executor, _slots
+    with _lock:
+        if _executor is None or _pid != os.getpid():
+            _pid = os.getpid()
+            _slots = threading.BoundedSemaphore(settings['max_pending'])
+            _executor = ThreadPoolExecutor(max_workers=settings['workers'], thread_name_prefix='bcrypt')
+    return _executor, _slots
+
+
+def _offload(fn, *args):
+    """Runs fn in the hashing pool and waits for it; HashingBusy when the pool is full."""
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    with timed('bcrypt'):
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=settings['timeout'])
+        except TimeoutError:
+            raise HashingBusy()
+
+
+def _encode(password):
+    return password.encode('utf-8')[:MAX_BYTES]
+
+
+def hash_password(password):
+    """A bcrypt hash of password at the configured cost, as stored in User.password_hash."""
+    rounds = settings['rounds']
+    return _offload(lambda: _bcrypt.hashpw(_encode(password), _bcrypt.gensalt(rounds)).decode('utf-8'))
+
+
+def check_password(password_hash, password):
+    if not password_hash:
+        return False
+    try:
+        return _offload(_bcrypt.checkpw, _encode(password), password_hash.encode('utf-8'))
+    except ValueError:
+        return False  # not a bcrypt hash
+
+
+def needs_rehash(password_hash):
+    match = HASH_COST.match(password_hash or '')
+    return match is None or int(match.group(1)) != settings['rounds']
@@ -0,0 +1,45 @@
+from flask import g, has_request_context, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Views declare the max number of SQL statements a request may issue
+# (including the Flask-Login user load). Going over is logged, or raised
+# when QUERY_BUDGET_STRICT is on — the `flask check-query-budgets` harness
+# uses the same counter to fail on regressions.
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def register_query_budget(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.before_request
+    def reset_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        view = current_app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        count = g.get('query_count', 0)
+        if limit is not None and count > limit:
+            message = f'{request.endpoint} issued {count} SQL statements (budget {limit})'
+            if current_app.config.get('QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+        return response
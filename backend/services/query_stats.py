@@ -0,0 +1,173 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# pg_stat_statements, in process and for any database. Every statement is
+# reduced to a fingerprint (literals and bind markers -> ?, IN lists -> (...),
+# whitespace collapsed) and per fingerprint we keep calls, total / max time
+# and rows (as the driver reports them; SQLite reports none for SELECT), plus
+# the endpoints that ran it. A statement slower than SLOW_QUERY_MS is logged,
+# kept in a short slow-query list, and its plan captured once per fingerprint
+# with EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on the same connection and
+# parameters.
+#
+# Numbers are per worker process, since startup or the last reset. Admins see
+# them at /audit/queries (and as JSON at /audit/queries.json);
+# `flask benchmark --sql-stats FILE` dumps the stats of a benchmark run.
+#
+# Bind values are not kept: they include password hashes, OTPs and customer
+# details. With SQL_STATS_PARAMETERS=1 (and always for `flask benchmark
+# --sql-stats`, which runs against seeded data) each fingerprint keeps the
+# values of its slowest call, which `flask index-advisor` needs to replay it.
+
+log = logging.getLogger(__name__)
+
+settings = {'enabled': True, 'slow_ms': 100, 'max_fingerprints': 1000, 'parameters': False}
+
+_stats = {}
+_slow = deque(maxlen=100)
+_lock = threading.Lock()
+_since = datetime.utcnow()
+
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+def configure(app):
+    settings['enabled'] = app.config.get('SQL_STATS', settings['enabled'])
+    settings['slow_ms'] = app.config.get('SLOW_QUERY_MS', settings['slow_ms'])
+    settings['max_fingerprints'] = app.config.get('SQL_STATS_MAX', settings['max_fingerprints'])
+    settings['parameters'] = app.config.get('SQL_STATS_PARAMETERS', settings['parameters'])
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_BIND = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """The statement with its values taken out, so calls with different values group together."""
+    text = _STRING.sub('?', statement)
+    text = _BIND.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    # SQLAlchemy's expanding IN renders one bind per value: (?, ?, ?) -> (...)
+    text = _IN_LIST.sub('IN (...)', text)
+    return _SPACE.sub(' ', text).strip()
+
+
+def explain(conn, statement, parameters):
+    """The plan as a list of lines, from a raw cursor so the statement isn't counted itself."""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    raw = conn.connection.dbapi_connection
+    cursor = raw.cursor()
+    # Postgres: a failed EXPLAIN would abort the caller's transaction
+    guarded = dialect == 'postgresql' and not getattr(raw, 'autocommit', False)
+    try:
+        if guarded:
+            cursor.execute('SAVEPOINT query_stats_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if guarded:
+                cursor.execute('ROLLBACK TO SAVEPOINT query_stats_explain')
+            return [f'EXPLAIN failed: {e}']
+        if guarded:
+            cursor.execute('RELEASE SAVEPOINT query_stats_explain')
+    finally:
+        cursor.close()
+    if dialect == 'sqlite':
+        return [str(row[-1]) for row in rows]  # (id, parent, notused, detail)
+    return [row[0] for row in rows]
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings['enabled']:
+        conn.info.setdefault('stats_started', []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('stats_started')
+    if not started:
+        return  # stats turned on mid-statement
+    ms = (time.perf_counter() - started.pop()) * 1000
+    key = fingerprint(statement)
+    rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else 0
+    slow = ms >= settings['slow_ms']
+
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            if len(_stats) >= settings['max_fingerprints']:
+                return
+            entry = _stats[key] = {'fingerprint': key, 'statement': statement, 'calls': 0, 'total_ms': 0.0,
+                                   'max_ms': 0.0, 'rows': 0, 'slow_calls': 0, 'parameters': None,
+                                   'plan': None, 'endpoints': set()}
+        entry['calls'] += 1
+        entry['total_ms'] += ms
+        entry['rows'] += rows
+        if has_request_context() and request.endpoint:
+            entry['endpoints'].add(request.endpoint)
+        if ms > entry['max_ms']:
+            # Keep the slowest call's values: those are the ones worth replaying
+            entry['max_ms'] = ms
+            entry['statement'] = statement
+            entry['parameters'] = parameters if settings['parameters'] and not executemany else None
+        need_plan = slow and entry['plan'] is None
+        if slow:
+            entry['slow_calls'] += 1
+            _slow.append({'fingerprint': key, 'ms': round(ms, 1), 'at': datetime.utcnow(),
+                          'endpoint': request.endpoint if has_request_context() else None})
+        if need_plan:
+            entry['plan'] = []  # claimed: other threads won't EXPLAIN it too
+
+    if slow:
+        log.warning('Slow query (%.0f ms): %s', ms, key)
+    if need_plan and not executemany and key.lstrip('( ').upper().startswith(EXPLAINABLE):
+        entry['plan'] = explain(conn, statement, parameters)
+
+
+def register_query_stats(app):
+    configure(app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_execute)
+
+
+def snapshot(order_by='total_ms', limit=None):
+    """Per-fingerprint stats, heaviest first, as plain dicts (mean_ms added)."""
+    with _lock:
+        entries = [dict(entry, endpoints=sorted(entry['endpoints'])) for entry in _stats.values()]
+        slow = list(_slow)
+    for entry in entries:
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+    entries.sort(key=lambda entry: entry[order_by], reverse=True)
+    return {'since': _since, 'slow_ms': settings['slow_ms'], 'statements': entries[:limit],
+            'slow': slow[::-1]}
+
+
+def reset():
+    global _since
+    with _lock:
+        _stats.clear()
+        _slow.clear()
+        _since = datetime.utcnow()
+
+
+def dump(stream, order_by='total_ms'):
+    """Writes the snapshot as JSON."""
+    json.dump(snapshot(order_by), stream, indent=2, default=str)
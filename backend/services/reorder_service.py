@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, or_, tuple_
+from extensions import db
+from models.inventory import Inventory
+from models.order import Order, OrderItem
+from services.loading_policy import with_loading_policy
+from services.pagination import keyset_paginate
+
+# Low-stock / reorder report. Everything starts from the is_low_stock flag and
+# its partial index, so it only ever reads low-stock rows.
+#
+# Suggested reorder quantity per item: top up to the larger of
+#   REORDER_TARGET_MULTIPLIER x low_stock_threshold, and
+#   what sold in the last REORDER_LOOKBACK_DAYS (order items linked to it),
+# minus what's on hand.
+
+brand_key = func.coalesce(Inventory.brand, '').label('brand_key')
+branch_key = func.coalesce(Inventory.shop_branch, '').label('branch_key')
+
+
+def refresh_low_stock_flags():
+    """Recomputes is_low_stock for every row (after adding the column). Returns rows changed."""
+    table = Inventory.__table__
+    low = and_(table.c.quantity.isnot(None),
+               table.c.low_stock_threshold.isnot(None),
+               table.c.quantity <= table.c.low_stock_threshold)
+    # Core UPDATE: no audit rows or updated_at bumps for a derived column
+    result = db.session.execute(
+        table.update().where(table.c.is_low_stock != low).values(is_low_stock=low)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def recent_sales(item_ids, days):
+    """{inventory_id: units sold in the last `days` days}, cancelled orders excluded."""
+    if not item_ids:
+        return {}
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (db.session.query(OrderItem.inventory_id, func.sum(OrderItem.quantity))
+            .join(Order, Order.id == OrderItem.order_id)
+            .filter(OrderItem.inventory_id.in_(item_ids),
+                    Order.created_at >= since,
+                    or_(Order.status.is_(None), Order.status != 'Cancelled'))
+            .group_by(OrderItem.inventory_id)
+            .all())
+    return {item_id: int(sold or 0) for item_id, sold in rows}
+
+
+def suggested_quantity(item, sold, multiplier):
+    target = max((item.low_stock_threshold or 0) * multiplier, sold)
+    return max(target - (item.quantity or 0), 0)
+
+
+def reorder_report(cursor=None, per_page=10):
+    """
+    One page of low-stock items grouped by (brand, branch). Pages by group so a
+    brand never splits across pages. Returns (page of groups, [group dict]).
+    """
+    config = current_app.config
+    multiplier = config.get('REORDER_TARGET_MULTIPLIER', 2)
+
+    groups = (db.session.query(brand_key, branch_key, func.count(Inventory.id).label('item_count'))
+              .filter(Inventory.is_low_stock.is_(True))
+              .group_by(brand_key, branch_key))
+    page = keyset_paginate(groups, [brand_key, branch_key], cursor=cursor, per_page=per_page)
+    if not page.items:
+        return page, []
+
+    keys = [(g.brand_key, g.branch_key) for g in page.items]
+    items = (with_loading_policy(Inventory.query, 'inventory.reorder')
+             .filter(Inventory.is_low_stock.is_(True),
+                     tuple_(func.coalesce(Inventory.brand, ''), func.coalesce(Inventory.shop_branch, '')).in_(keys))
+             .order_by(Inventory.quantity, Inventory.model_name, Inventory.id)
+             .all())
+    sold = recent_sales([item.id for item in items], config.get('REORDER_LOOKBACK_DAYS', 30))
+
+    report = {key: {'brand': key[0], 'shop_branch': key[1], 'lines': [], 'suggested_total': 0} for key in keys}
+    for item in items:
+        group = report[(item.brand or '', item.shop_branch or '')]
+        units_sold = sold.get(item.id, 0)
+        suggested = suggested_quantity(item, units_sold, multiplier)
+        group['lines'].append({'item': item, 'sold': units_sold, 'suggested': suggested})
+        group['suggested_total'] += suggested
+    return page, [report[key] for key in keys]
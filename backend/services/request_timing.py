@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Where a request's time went. With SERVER_TIMING_HEADER=1, responses to
+# logged-in admins get a Server-Timing header (shown under Network > Timing in
+# the browser dev tools):
+#
+#   Server-Timing: sql;dur=12.4;desc="5 queries", render;dur=8.1, bcrypt;dur=240.3, total;dur=265.0
+#
+# sql is time spent in cursor.execute (statement count from query_budget's
+# counter), render is Jinja time, and any block wrapped in timed('name') adds
+# its own entry (bcrypt, email, ...). The same numbers go into a fixed-size
+# ring buffer per worker process, which the admin perf page (audit.perf)
+# groups by endpoint to show the slowest recent requests.
+#
+# The header is off by default and never sent to anyone else: timings leak
+# what a request did (a login whose bcrypt took 0 ms had no such username).
+# For the same reason the login page never shows its bcrypt time.
+
+settings = {'buffer': 2000, 'header': False}
+HIDDEN_TIMINGS = {'auth.login': ('bcrypt',)}  # endpoint -> timings left out of the header
+
+_recent = deque(maxlen=settings['buffer'])
+_lock = threading.Lock()
+
+
+def configure(app):
+    global _recent
+    settings['buffer'] = app.config.get('PERF_BUFFER_SIZE', settings['buffer'])
+    settings['header'] = app.config.get('SERVER_TIMING_HEADER', settings['header'])
+    with _lock:
+        _recent = deque(_recent, maxlen=settings['buffer'])
+
+
+def _add(name, ms):
+    g.timings[name] = g.timings.get(name, 0) + ms
+
+
+@contextmanager
+def timed(name):
+    """Adds the time spent in the block to this request's `name` timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and 'timings' in g:
+            _add(name, (time.perf_counter() - started) * 1000)
+
+
+# SQL: a stack per connection, since a listener can run a statement of its own
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('timing_started', []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['timing_started'].pop()
+    if has_request_context() and 'timings' in g:
+        _add('sql', (time.perf_counter() - started) * 1000)
+
+
+def _before_render(sender, template, context, **extra):
+    if 'timings' in g:
+        g.render_started = time.perf_counter()
+
+def _rendered(sender, template, context, **extra):
+    if 'render_started' in g:
+        _add('render', (time.perf_counter() - g.pop('render_started')) * 1000)
+
+
+def _header(timings, queries):
+    parts = []
+    hidden = HIDDEN_TIMINGS.get(request.endpoint, ())
+    for name, ms in timings.items():
+        if name in hidden:
+            continue
+        part = f'{name};dur={ms:.1f}'
+        if name == 'sql':
+            part += f';desc="{queries} queries"'
+        parts.append(part)
+    return ', '.join(parts)
+
+
+def register_request_timing(app):
+    configure(app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_timing():
+        g.request_started = time.perf_counter()
+        g.timings = {'sql': 0}
+
+    @app.after_request
+    def finish_timing(response):
+        if 'request_started' not in g:
+            return response
+        timings = dict(g.timings, total=(time.perf_counter() - g.request_started) * 1000)
+        queries = g.get('query_count', 0)
+        if settings['header'] and current_user.is_authenticated and current_user.is_admin:
+            response.headers['Server-Timing'] = _header(timings, queries)
+        if request.endpoint and request.endpoint != 'static':
+            entry = {'endpoint': request.endpoint, 'method': request.method, 'path': request.full_path.rstrip('?'),
+                     'status': response.status_code, 'queries': queries, 'at': datetime.utcnow(),
+                     **{name: round(ms, 1) for name, ms in timings.items()}}
+            with _lock:
+                _recent.append(entry)
+        return response
+
+
+def slowest_by_endpoint(per_endpoint=5):
+    """
+    ([(endpoint, {'count', 'p50', 'max', 'sql', 'queries', 'slowest': [entries]})],
+    requests in the buffer), slowest endpoint first.
+    """
+    with _lock:
+        entries = list(_recent)
+    grouped = {}
+    for entry in entries:
+        grouped.setdefault(entry['endpoint'], []).append(entry)
+
+    report = []
+    for endpoint, requests in grouped.items():
+        totals = sorted(e['total'] for e in requests)
+        report.append((endpoint, {
+            'count': len(requests),
+            'p50': totals[len(totals) // 2],
+            'max': totals[-1],
+            'sql': round(sum(e['sql'] for e in requests) / len(requests), 1),
+            'queries': round(sum(e['queries'] for e in requests) / len(requests), 1),
+            'slowest': sorted(requests, key=lambda e: e['total'], reverse=True)[:per_endpoint],
+        }))
+    report.sort(key=lambda item: item[1]['max'], reverse=True)
+    return report, len(entries)
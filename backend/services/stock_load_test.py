@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+import uuid
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from extensions import db
+from models.audit_log import AuditLog
+from models.inventory import Inventory
+from services.stock_service import OutOfStock, change_stock, with_retry
+
+# Concurrent stock load test behind `flask stock-load-test`. Worker threads
+# (each with its own session and connection) hammer one throwaway inventory
+# item; at the end, stock on hand must equal the starting stock minus every
+# sale that reported success. Any lost update shows up as a mismatch.
+#
+# Modes:
+#   atomic      change_stock(): conditional SQL-side decrement (what orders use)
+#   optimistic  ORM read-modify-write guarded by the version column, retried
+#   naive       the same read-modify-write with the version check bypassed,
+#               i.e. the old inventory edit; expected to lose updates
+
+
+def _sell_atomic(item_id, n):
+    def attempt():
+        change_stock(db.session, item_id, -n)
+        db.session.commit()
+    with_retry(attempt, attempts=10)
+
+def _sell_optimistic(item_id, n):
+    def attempt():
+        item = db.session.get(Inventory, item_id, populate_existing=True)
+        if (item.quantity or 0) < n:
+            raise OutOfStock('sold out')
+        time.sleep(0.001)  # widen the read-modify-write window
+        item.quantity = item.quantity - n
+        db.session.commit()
+    with_retry(attempt, attempts=10)
+
+def _sell_naive(item_id, n):
+    def attempt():
+        quantity = db.session.query(Inventory.quantity).filter(Inventory.id == item_id).scalar() or 0
+        if quantity < n:
+            raise OutOfStock('sold out')
+        time.sleep(0.001)
+        db.session.execute(
+            Inventory.__table__.update().where(Inventory.__table__.c.id == item_id).values(quantity=quantity - n)
+        )
+        db.session.commit()
+    with_retry(attempt, attempts=10)
+
+SELLERS = {'atomic': _sell_atomic, 'optimistic': _sell_optimistic, 'naive': _sell_naive}
+
+
+def run_stock_load_test(app, mode='atomic', workers=8, sales=25, stock=100):
+    """Returns a dict of counters plus 'expected', 'final' and 'ok'."""
+    sell = SELLERS[mode]
+    with app.app_context():
+        item = Inventory(model_name=f'LOADTEST-{uuid.uuid4().hex[:8]}', location='load test',
+                         cost_price=0, selling_price=0, quantity=stock, low_stock_threshold=0)
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+
+    lock = threading.Lock()
+    totals = {'sold': 0, 'sales_ok': 0, 'out_of_stock': 0, 'errors': 0}
+    start = threading.Barrier(workers)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            start.wait()
+            for _ in range(sales):
+                n = rng.choice([1, 1, 1, 2, 3])
+                try:
+                    sell(item_id, n)
+                    result = {'sold': n, 'sales_ok': 1}
+                except OutOfStock:
+                    db.session.rollback()
+                    result = {'out_of_stock': 1}
+                except (OperationalError, StaleDataError):
+                    db.session.rollback()  # gave up after retries; nothing was sold
+                    result = {'errors': 1}
+                with lock:
+                    for key, value in result.items():
+                        totals[key] += value
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        item = db.session.get(Inventory, item_id)
+        final = item.quantity
+        db.session.delete(item)
+        db.session.commit()
+        # Leave no trace of the throwaway item in the audit trail
+        AuditLog.query.filter(AuditLog.table_name == 'inventory', AuditLog.record_id == item_id).delete()
+        db.session.commit()
+
+    expected = stock - totals['sold']
+    return {**totals, 'mode': mode, 'expected': expected, 'final': final,
+            'seconds': round(elapsed, 2), 'ok': final == expected and final >= 0}
@@ -0,0 +1,162 @@
+import random
+import time
+from collections import defaultdict
+from sqlalchemy import and_, case, exists, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.util import identity_key
+from extensions import db
+from models.inventory import Inventory, is_low
+from models.inventory_color import InventoryColor, normalize_color
+from services.audit_service import queue_audit
+from services.metrics_service import record_low_stock_change
+
+# Stock reservations for orders. Each one is a single conditional UPDATE
+#   UPDATE inventory SET quantity = quantity - :n ... WHERE id = :id AND quantity >= :n
+# so two counters selling the same frame can never both take the last piece,
+# and nothing is read into Python and written back. Releases add it back.
+# The row's version goes up with every change, which makes a concurrent
+# hand edit in inventory_routes.edit fail instead of overwriting it.
+#
+# An order holds stock for all its linked items while it isn't Cancelled.
+
+CANCELLED = 'Cancelled'
+RETRY_ATTEMPTS = 3
+
+inventory_table = Inventory.__table__
+color_table = InventoryColor.__table__
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def _has_colors(inventory_id):
+    return exists().where(color_table.c.inventory_id == inventory_id)
+
+def _expire_loaded(session, inventory_id):
+    # The UPDATE bypasses the ORM; make a loaded Inventory re-read its stock
+    item = session.identity_map.get(identity_key(Inventory, inventory_id))
+    if item is not None:
+        session.expire(item, ['quantity', 'is_low_stock', 'version', 'colors'])
+
+def _why_unavailable(connection, inventory_id, quantity, color):
+    item = connection.execute(
+        select(inventory_table.c.model_name, inventory_table.c.quantity).where(inventory_table.c.id == inventory_id)
+    ).first()
+    if item is None:
+        return f'Inventory item #{inventory_id} no longer exists.'
+    if color:
+        available = connection.execute(
+            select(color_table.c.quantity).where(color_table.c.inventory_id == inventory_id,
+                                                 color_table.c.color == color)
+        ).scalar()
+        if available is None:
+            return f'{item.model_name} has no {color} in stock.'
+        return f'Only {available} of {item.model_name} ({color}) left, {quantity} needed.'
+    if connection.execute(select(_has_colors(inventory_id))).scalar():
+        return f'Choose a colour for {item.model_name}; its stock is kept per colour.'
+    return f'Only {item.quantity or 0} of {item.model_name} left, {quantity} needed.'
+
+
+def change_stock(session, inventory_id, delta, color=None):
+    """
+    Adds `delta` (negative to take stock) to an item and, for per-colour items,
+    to the colour row, in SQL. Raises OutOfStock when taking more than is there.
+    """
+    if not delta:
+        return
+    connection = session.connection()
+    color = normalize_color(color) or None
+    quantity = func.coalesce(inventory_table.c.quantity, 0)
+    new_quantity = quantity + delta
+
+    where = [inventory_table.c.id == inventory_id]
+    if delta < 0:
+        where.append(quantity >= -delta)
+        if not color:
+            # Per-colour items must say which colour, or quantity drifts from the rows
+            where.append(~_has_colors(inventory_id))
+
+    # Parent row first, colour row second: the same order as an ORM flush of
+    # the inventory edit form, so the two can't deadlock each other
+    row = connection.execute(
+        inventory_table.update()
+        .where(*where)
+        .values(
+            quantity=new_quantity,
+            is_low_stock=case((and_(inventory_table.c.low_stock_threshold.isnot(None),
+                                    new_quantity <= inventory_table.c.low_stock_threshold), True), else_=False),
+            version=inventory_table.c.version + 1,
+        )
+        .returning(inventory_table.c.quantity, inventory_table.c.low_stock_threshold, inventory_table.c.is_low_stock)
+    ).first()
+    if row is None:
+        if delta > 0:
+            return  # releasing stock of an item deleted since; nothing to give back
+        raise OutOfStock(_why_unavailable(connection, inventory_id, -delta, color))
+
+    changes = {'quantity': [row.quantity - delta, row.quantity]}
+    if color:
+        color_where = [color_table.c.inventory_id == inventory_id, color_table.c.color == color]
+        if delta < 0:
+            color_where.append(color_table.c.quantity >= -delta)
+        color_row = connection.execute(
+            color_table.update().where(*color_where)
+            .values(quantity=color_table.c.quantity + delta)
+            .returning(color_table.c.id, color_table.c.quantity)
+        ).first()
+        if color_row is None:
+            if delta < 0:
+                # The item-level UPDATE above is rolled back with the order
+                raise OutOfStock(_why_unavailable(connection, inventory_id, -delta, color))
+            # Colour removed since the order took it: the stock goes back to
+            # the item's quantity only, and the colour stays removed
+        else:
+            queue_audit(session, 'inventory_colors', color_row.id, 'UPDATE',
+                        {'quantity': [color_row.quantity - delta, color_row.quantity]})
+
+    was_low = is_low(row.quantity - delta, row.low_stock_threshold)
+    if was_low != bool(row.is_low_stock):
+        changes['is_low_stock'] = [was_low, bool(row.is_low_stock)]
+    record_low_stock_change(connection, was_low, row.is_low_stock)
+    queue_audit(session, 'inventory', inventory_id, 'UPDATE', changes)
+    _expire_loaded(session, inventory_id)
+
+
+# ── Orders ─────────────────────────────────────────────────────────────────────
+def held_stock(items, status):
+    """{(inventory_id, color): qty} an order with these items and status holds."""
+    held = defaultdict(int)
+    if status == CANCELLED:
+        return held
+    for item in items:
+        if item.inventory_id and item.quantity:
+            held[(item.inventory_id, normalize_color(item.color) or None)] += item.quantity
+    return held
+
+def sync_reservations(session, before, after):
+    """
+    Applies the difference between two held_stock() results: reserves what the
+    order now needs on top of what it held, releases what it no longer needs.
+    """
+    deltas = {key: after.get(key, 0) - before.get(key, 0) for key in set(before) | set(after)}
+    # Fixed lock order (by inventory id) so two orders can't deadlock each other
+    for inventory_id, color in sorted(deltas, key=lambda key: (key[0], key[1] or '')):
+        change_stock(session, inventory_id, -deltas[(inventory_id, color)], color)
+
+
+def with_retry(fn, attempts=RETRY_ATTEMPTS):
+    """
+    Runs fn() (which commits), retrying with jittered backoff when the database
+    reports a conflict: a lock timeout or deadlock (OperationalError) or a row
+    changed underneath an ORM update (StaleDataError). fn must be safe to re-run.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except (OperationalError, StaleDataError):
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (2 ** attempt) * random.uniform(1, 2))
@@ -0,0 +1,215 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select, text
+from extensions import db
+from models.audit_log import AuditLog
+from models.customer import Customer, normalize_phone
+from models.inventory import Inventory, is_low, price_band_for
+from models.inventory_color import InventoryColor
+from models.order import Order, OrderItem
+from models.prescription import Prescription
+from models.user import User
+from services.bulk_io import bulk_insert
+
+# Synthetic data for `flask seed-synthetic`, at production-like volumes, for
+# the benchmark suite (services/benchmark.py) and the query tools. Rows go in
+# through bulk_io.bulk_insert (COPY on Postgres, executemany on SQLite) in
+# batches, so even the 2M audit rows take minutes, not hours. Values are
+# drawn from a seeded RNG: the same seed gives the same shop.
+#
+# Core inserts skip the ORM events, so derived columns are filled in here and
+# the dashboard counters and inventory facets are rebuilt at the end.
+# Nothing here touches stock or writes audit logs for the rows it creates.
+
+DEFAULT_VOLUMES = {
+    'customers': 100_000,
+    'prescriptions': 300_000,
+    'inventory': 2_000,
+    'orders': 500_000,
+    'audit_logs': 2_000_000,
+}
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Saanvi', 'Arjun',
+               'Priya', 'Rahul', 'Sneha', 'Vikram', 'Pooja', 'Amit', 'Neha', 'Suresh', 'Lakshmi', 'Ramesh',
+               'Pemba', 'Tashi', 'Sunita', 'Bikash', 'Anjali', 'Manoj', 'Deepak', 'Kiran', 'Meena', 'Gopal']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Patel', 'Shah', 'Reddy', 'Nair', 'Iyer',
+              'Das', 'Bose', 'Sherpa', 'Tamang', 'Rai', 'Thapa', 'Gurung', 'Joshi', 'Mehta', 'Pillai']
+BRANDS = ['Ray-Ban', 'Titan', 'Lenskart', 'Vogue', 'Oakley', 'Fastrack', 'Carrera', 'Police', 'Prada', None]
+FRAME_TYPES = ['Full Rim', 'Half Rim', 'Rimless', 'Aviator', 'Round', 'Cat Eye', None]
+BRANCHES = ['Main Road', 'Station Road', 'Mall', None]
+COLORS = ['Black', 'Brown', 'Gold', 'Silver', 'Blue', 'Tortoise', 'Red']
+STATUSES = [('Delivered', 60), ('Pending', 15), ('In Progress', 10), ('Ready', 10), ('Cancelled', 5)]
+DELIVERY_MODES = ['Self', 'Courier', 'Home']
+LENSES = [('Single Vision Lens', 800), ('Bifocal Lens', 1500), ('Progressive Lens', 4500),
+          ('Blue Cut Coating', 600), ('Anti-Glare Coating', 400), ('Contact Lens Box', 1200)]
+AUDITED_TABLES = ['customers', 'prescriptions', 'orders', 'order_items', 'inventory']
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+def _power(rng, low, high):
+    # Diopters come in 0.25 steps
+    return _money(rng.randint(int(low * 4), int(high * 4)) / 4)
+
+def _moment(rng, now, days):
+    return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(table, rows, batch_size, progress, name, return_ids=False):
+    ids, done = [], 0
+    for batch in _batches(rows, batch_size):
+        ids.extend(bulk_insert(db.session.connection(), table, batch, return_ids=return_ids))
+        db.session.commit()
+        done += len(batch)
+        progress(name, done)
+    return ids
+
+
+def _customers(rng, n, now):
+    for i in range(n):
+        phone = f'9{rng.randint(100000000, 999999999)}'
+        created = _moment(rng, now, 730)
+        yield {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+               'care_of': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' if rng.random() < 0.3 else None,
+               'phone': phone, 'phone_normalized': normalize_phone(phone),
+               'created_at': created, 'updated_at': created}
+
+def _prescriptions(rng, n, now, customer_ids, user_id):
+    for i in range(n):
+        reading = rng.random() < 0.3
+        yield {'customer_id': rng.choice(customer_ids),
+               're_sph': _power(rng, -8, 6), 're_cyl': _power(rng, -4, 0), 're_axis': rng.randint(0, 180),
+               'le_sph': _power(rng, -8, 6), 'le_cyl': _power(rng, -4, 0), 'le_axis': rng.randint(0, 180),
+               'addition': _power(rng, 0.75, 3) if reading else None,
+               'image_path': None, 'image_hash': None, 'notes': 'Synthetic' if rng.random() < 0.1 else None,
+               'created_by': user_id, 'created_at': _moment(rng, now, 730)}
+
+def _inventory(rng, n):
+    for i in range(n):
+        price = _money(rng.randrange(500, 15000, 50))
+        colors = rng.sample(COLORS, rng.randint(2, 4)) if rng.random() < 0.3 else []
+        stock = {color: rng.randint(0, 6) for color in colors}
+        quantity = sum(stock.values()) if colors else rng.randint(0, 30)
+        threshold = rng.choice([2, 3, 5, 5, 5, 10])
+        item = {'model_name': f'{rng.choice(["RB", "TT", "LK", "VG", "OK"])}-{1000 + i}',
+                'brand': rng.choice(BRANDS), 'frame_type': rng.choice(FRAME_TYPES),
+                'location': f'Rack {rng.randint(1, 40)}', 'shop_branch': rng.choice(BRANCHES),
+                'cost_price': _money(price * Decimal('0.55')), 'selling_price': price,
+                'price_band': price_band_for(price), 'quantity': quantity, 'low_stock_threshold': threshold,
+                'is_low_stock': is_low(quantity, threshold), 'version': 1}
+        yield item, stock
+
+def _orders(rng, n, now, customer_ids, user_id, run):
+    weights = [w for _, w in STATUSES]
+    statuses = [s for s, _ in STATUSES]
+    for i in range(n):
+        created = _moment(rng, now, 730)
+        yield {'order_no': f'SYN-{run}-{i:07d}', 'customer_id': rng.choice(customer_ids), 'prescription_id': None,
+               'status': rng.choices(statuses, weights)[0], 'delivery_mode': rng.choice(DELIVERY_MODES),
+               'issue_date': created.date(), 'delivery_date': (created + timedelta(days=rng.randint(2, 10))).date(),
+               'advance_amount': _money(0), 'discount': _money(rng.choice([0, 0, 0, 100, 200, 500])),
+               'total_amount': _money(0), 'created_by': user_id, 'created_at': created, 'updated_at': created}
+
+def _order_items(rng, items):
+    lines = []
+    for _ in range(rng.randint(1, 3)):
+        if items and rng.random() < 0.4:
+            item_id, model_name, price, colors = rng.choice(items)
+            lines.append({'inventory_id': item_id, 'color': rng.choice(colors) if colors else None,
+                          'description': model_name, 'quantity': 1, 'unit_price': price})
+        else:
+            description, price = rng.choice(LENSES)
+            lines.append({'inventory_id': None, 'color': None, 'description': description,
+                          'quantity': rng.choice([1, 1, 2]), 'unit_price': _money(price)})
+    return lines
+
+def _audit_logs(rng, n, now, user_id):
+    for i in range(n):
+        action = rng.choices(['INSERT', 'UPDATE', 'DELETE'], [30, 65, 5])[0]
+        if action == 'UPDATE':
+            changes = {'status': ['Pending', rng.choice(['In Progress', 'Ready', 'Delivered'])]}
+        else:
+            changes = {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'}
+        yield {'user_id': user_id, 'action': action, 'table_name': rng.choice(AUDITED_TABLES),
+               'record_id': rng.randint(1, 500_000), 'changes': changes,
+               'timestamp': _moment(rng, now, 365)}
+
+
+def seed_synthetic(volumes=None, seed=42, batch_size=5000, progress=None):
+    """
+    Adds synthetic rows on top of whatever is in the database. Returns the
+    number of rows inserted per table.
+    """
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    progress = progress or (lambda name, done: None)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    run = uuid.uuid4().hex[:6]  # order numbers must stay unique across runs
+    user = User.query.filter_by(role='admin').first() or User.query.first()
+    user_id = user.id if user else None
+    inserted = {}
+
+    ids = _insert(Customer.__table__, _customers(rng, volumes['customers'], now), batch_size, progress,
+                  'customers', return_ids=True)
+    inserted['customers'] = len(ids)
+    customer_ids = ids or db.session.scalars(select(Customer.id)).all()
+    if not customer_ids:
+        return inserted
+
+    inserted['prescriptions'] = volumes['prescriptions']
+    _insert(Prescription.__table__, _prescriptions(rng, volumes['prescriptions'], now, customer_ids, user_id),
+            batch_size, progress, 'prescriptions')
+
+    generated = list(_inventory(rng, volumes['inventory']))
+    item_ids = _insert(Inventory.__table__, (item for item, _ in generated), batch_size, progress,
+                       'inventory', return_ids=True)
+    color_rows = [{'inventory_id': item_id, 'color': color, 'quantity': qty}
+                  for item_id, (_, stock) in zip(item_ids, generated) for color, qty in stock.items()]
+    _insert(InventoryColor.__table__, color_rows, batch_size, progress, 'inventory_colors')
+    inserted['inventory'] = len(item_ids)
+    items = [(item_id, item['model_name'], item['selling_price'], list(stock))
+             for item_id, (item, stock) in zip(item_ids, generated)]
+
+    # Orders and their items together, batch by batch, so totals match the lines
+    inserted['orders'] = inserted['order_items'] = 0
+    for batch in _batches(_orders(rng, volumes['orders'], now, customer_ids, user_id, run), batch_size):
+        lines = [_order_items(rng, items) for _ in batch]
+        for order, order_lines in zip(batch, lines):
+            subtotal = sum(line['quantity'] * line['unit_price'] for line in order_lines)
+            order['total_amount'] = max(subtotal - order['discount'], _money(0))
+            order['advance_amount'] = _money(order['total_amount'] * rng.choice([0, Decimal('0.5'), 1]))
+        order_ids = bulk_insert(db.session.connection(), Order.__table__, batch, return_ids=True)
+        item_rows = [{**line, 'order_id': order_id} for order_id, order_lines in zip(order_ids, lines)
+                     for line in order_lines]
+        bulk_insert(db.session.connection(), OrderItem.__table__, item_rows)
+        db.session.commit()
+        inserted['orders'] += len(batch)
+        inserted['order_items'] += len(item_rows)
+        progress('orders', inserted['orders'])
+
+    inserted['audit_logs'] = volumes['audit_logs']
+    _insert(AuditLog.__table__, _audit_logs(rng, volumes['audit_logs'], now, user_id), batch_size, progress,
+            'audit_logs')
+
+    from services.facet_service import rebuild_facets
+    from services.metrics_service import rebuild_metrics
+    rebuild_facets()
+    rebuild_metrics()
+    if db.engine.dialect.name == 'postgresql':
+        # Fresh planner statistics, or the benchmark measures bad plans
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('ANALYZE'))
+    return inserted
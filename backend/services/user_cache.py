@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import session
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from extensions import db
+from models.user import User
+
+# Flask-Login's user_loader runs on every authenticated request. Instead of
+# reading the users row each time, each worker keeps a small LRU of staff
+# snapshots (id, username, email, role) for USER_CACHE_TTL seconds, so
+# current_user costs no query on most requests.
+#
+# Admins are never cached: their row is read on every request, so demoting or
+# deleting an admin takes effect at once in every worker.
+#
+# Staleness for staff:
+#   - in this worker, committing a change to a user (edit_user, delete_user,
+#     password reset, anything else through the ORM) drops its entry;
+#   - the same commit bumps users.auth_version. Every USER_CACHE_CHECK
+#     seconds each worker reads the versions of the users it has cached (one
+#     small query) and drops any that changed or were deleted, so a change
+#     reaches the other workers within that interval rather than the TTL.
+#     Writes that bypass the ORM don't bump the version and wait for the TTL.
+#     USER_CACHE_TTL=0 turns caching off.
+#
+# current_user is therefore a UserSnapshot, not a User: load the User
+# (db.session.get(User, current_user.id)) to change it.
+
+SESSION_KEY = 'user_stamp'
+PENDING_KEY = 'user_cache_invalidate'
+
+settings = {'ttl': 60, 'size': 1024, 'check': 2}
+
+_cache = OrderedDict()  # user id -> (snapshot, expires at)
+_lock = threading.Lock()
+_checked = {'at': 0.0}
+
+
+def configure(app):
+    settings['ttl'] = app.config.get('USER_CACHE_TTL', settings['ttl'])
+    settings['size'] = app.config.get('USER_CACHE_SIZE', settings['size'])
+    settings['check'] = app.config.get('USER_CACHE_CHECK', settings['check'])
+
+
+class UserSnapshot(UserMixin):
+    """The parts of a User that requests read through current_user."""
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.auth_version = user.auth_version
+        self.stamp = stamp_for(user)
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+
+def stamp_for(user):
+    fields = '\0'.join(str(value) for value in (user.username, user.email, user.role, user.password_hash))
+    return hashlib.sha1(fields.encode()).hexdigest()[:12]
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(int(user_id), None)
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+def _drop_changed(now):
+    # Other workers' commits: compare cached snapshots with users.auth_version
+    with _lock:
+        if now < _checked['at'] + settings['check'] or not _cache:
+            return
+        _checked['at'] = now
+        cached = {user_id: snapshot.auth_version for user_id, (snapshot, expires) in _cache.items()}
+    current = dict(db.session.execute(select(User.id, User.auth_version).where(User.id.in_(cached))).all())
+    with _lock:
+        for user_id, version in cached.items():
+            if current.get(user_id) != version:
+                _cache.pop(user_id, None)
+
+
+def load_user(user_id):
+    """user_loader for Flask-Login."""
+    user_id = int(user_id)
+    wanted = session.get(SESSION_KEY)
+    now = time.monotonic()
+    _drop_changed(now)
+    with _lock:
+        snapshot, expires = _cache.get(user_id, (None, 0))
+        if snapshot is not None:
+            _cache.move_to_end(user_id)
+    if snapshot is None or now >= expires or (wanted and wanted != snapshot.stamp):
+        user = db.session.get(User, user_id)
+        if user is None:
+            invalidate(user_id)
+            return None
+        snapshot = UserSnapshot(user)
+        if settings['ttl'] > 0 and not snapshot.is_admin:
+            with _lock:
+                _cache[user_id] = (snapshot, now + settings['ttl'])
+                _cache.move_to_end(user_id)
+                while len(_cache) > settings['size']:
+                    _cache.popitem(last=False)
+    if wanted != snapshot.stamp:
+        session[SESSION_KEY] = snapshot.stamp
+    return snapshot
+
+
+# Invalidate on commit, not on flush: a request reloading the row between the
+# two would otherwise cache the old values again
+def _track_changes(db_session, flush_context, instances):
+    for obj in db_session.dirty:
+        if isinstance(obj, User) and db_session.is_modified(obj):
+            obj.auth_version = (obj.auth_version or 0) + 1
+    changed = [obj.id for obj in list(db_session.dirty) + list(db_session.deleted) if isinstance(obj, User)]
+    if changed:
+        db_session.info.setdefault(PENDING_KEY, set()).update(changed)
+
+def _after_commit(db_session):
+    for user_id in db_session.info.pop(PENDING_KEY, ()):
+        invalidate(user_id)
+
+def _after_rollback(db_session):
+    db_session.info.pop(PENDING_KEY, None)
+
+
+def register_user_cache(app, login_manager):
+    configure(app)
+    login_manager.user_loader(load_user)
+    # create_app() may run more than once per process
+    if not event.contains(Session, 'before_flush', _track_changes):
+        event.listen(Session, 'before_flush', _track_changes)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)